@@ -0,0 +1,46 @@
+"""add inventory checkpoints
+
+Revision ID: 3673d1159960
+Revises: 51a59aa32fed
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3673d1159960"
+down_revision: Union[str, Sequence[str], None] = "51a59aa32fed"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "inventory_checkpoints",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("product_id", sa.UUID(), nullable=False),
+        sa.Column("period_end", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("balance_kg", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("product_id", "period_end", name="uq_inventory_checkpoints_product_period"),
+    )
+
+    # Ledger tail scans: rows for one product after a checkpoint boundary.
+    op.create_index(
+        "ix_inventory_transactions_product_created",
+        "inventory_transactions",
+        ["product_id", "created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inventory_transactions_product_created", table_name="inventory_transactions")
+    op.drop_table("inventory_checkpoints")
@@ -0,0 +1,63 @@
+"""add product_stock table
+
+Revision ID: 51a59aa32fed
+Revises: 8b3b7f2d2c11
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "51a59aa32fed"
+down_revision: Union[str, Sequence[str], None] = "8b3b7f2d2c11"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "product_stock",
+        sa.Column("product_id", sa.UUID(), nullable=False),
+        sa.Column("on_hand_kg", sa.Numeric(precision=12, scale=2), nullable=False, server_default="0"),
+        sa.Column("reserved_kg", sa.Numeric(precision=12, scale=2), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("product_id"),
+    )
+
+    # Backfill from the full ledger and current PENDING orders.
+    op.execute(
+        """
+        INSERT INTO product_stock (product_id, on_hand_kg, reserved_kg, created_at, updated_at)
+        SELECT
+            p.id,
+            COALESCE(s.on_hand, 0),
+            COALESCE(r.reserved, 0),
+            now(),
+            now()
+        FROM products p
+        LEFT JOIN (
+            SELECT product_id,
+                   SUM(CASE action WHEN 'ADD' THEN quantity_kg WHEN 'DEDUCT' THEN -quantity_kg ELSE 0 END) AS on_hand
+            FROM inventory_transactions
+            GROUP BY product_id
+        ) s ON s.product_id = p.id
+        LEFT JOIN (
+            SELECT oi.product_id, SUM(oi.quantity_kg) AS reserved
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE o.order_status = 'PENDING'
+            GROUP BY oi.product_id
+        ) r ON r.product_id = p.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("product_stock")
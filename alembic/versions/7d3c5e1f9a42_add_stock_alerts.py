@@ -0,0 +1,58 @@
+"""add stock alerts
+
+Revision ID: 7d3c5e1f9a42
+Revises: e2f6a8c3b914
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7d3c5e1f9a42"
+down_revision: Union[str, Sequence[str], None] = "e2f6a8c3b914"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stock_alerts",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("product_id", sa.UUID(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("previous_status", sa.String(length=20), nullable=True),
+        sa.Column("available_kg", sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column("min_stock_kg", sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_stock_alerts_product_id_id", "stock_alerts", ["product_id", "id"])
+
+    op.add_column("product_stock", sa.Column("alert_status", sa.String(length=20), nullable=True))
+
+    # Seed the current status so existing low stock does not raise alerts on first touch.
+    op.execute(
+        """
+        UPDATE product_stock s
+        SET alert_status = CASE
+            WHEN s.on_hand_kg - s.reserved_kg <= 0 THEN 'OUT_OF_STOCK'
+            WHEN s.on_hand_kg - s.reserved_kg <= p.min_stock_kg THEN 'LOW_STOCK'
+            ELSE 'OK'
+        END
+        FROM products p
+        WHERE p.id = s.product_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("product_stock", "alert_status")
+    op.drop_index("ix_stock_alerts_product_id_id", table_name="stock_alerts")
+    op.drop_table("stock_alerts")
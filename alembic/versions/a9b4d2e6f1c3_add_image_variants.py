@@ -0,0 +1,29 @@
+"""add image variants
+
+Revision ID: a9b4d2e6f1c3
+Revises: 7d3c5e1f9a42
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a9b4d2e6f1c3"
+down_revision: Union[str, Sequence[str], None] = "7d3c5e1f9a42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("products", sa.Column("product_image_variants", sa.JSON(), nullable=True))
+    op.add_column("users", sa.Column("profile_picture_variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "profile_picture_variants")
+    op.drop_column("products", "product_image_variants")
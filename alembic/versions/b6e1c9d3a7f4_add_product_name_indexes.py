@@ -0,0 +1,51 @@
+"""add product name indexes
+
+Revision ID: b6e1c9d3a7f4
+Revises: a9b4d2e6f1c3
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6e1c9d3a7f4"
+down_revision: Union[str, Sequence[str], None] = "a9b4d2e6f1c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text(
+        "SELECT lower(product_name) FROM products GROUP BY lower(product_name) HAVING count(*) > 1"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(
+            "Rename products whose names differ only by case before upgrading: " + ", ".join(duplicates)
+        )
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "uq_products_product_name_lower",
+        "products",
+        [sa.text("lower(product_name)")],
+        unique=True,
+    )
+    op.create_index(
+        "ix_products_name_trgm",
+        "products",
+        ["product_name"],
+        postgresql_using="gin",
+        postgresql_ops={"product_name": "gin_trgm_ops"},
+    )
+
+
+def downgrade() -> None:
+    # pg_trgm is left installed; other objects may depend on it.
+    op.drop_index("ix_products_name_trgm", table_name="products")
+    op.drop_index("uq_products_product_name_lower", table_name="products")
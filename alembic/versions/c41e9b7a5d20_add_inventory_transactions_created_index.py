@@ -0,0 +1,33 @@
+"""add inventory transactions created index
+
+Revision ID: c41e9b7a5d20
+Revises: 3673d1159960
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c41e9b7a5d20"
+down_revision: Union[str, Sequence[str], None] = "3673d1159960"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Ledger history across all products, newest first with (created_at, id) keyset paging.
+    # Per-product history uses ix_inventory_transactions_product_created.
+    op.create_index(
+        "ix_inventory_transactions_created",
+        "inventory_transactions",
+        ["created_at", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inventory_transactions_created", table_name="inventory_transactions")
@@ -0,0 +1,54 @@
+"""add product price history
+
+Revision ID: c8f2a4e7b1d6
+Revises: b6e1c9d3a7f4
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c8f2a4e7b1d6"
+down_revision: Union[str, Sequence[str], None] = "b6e1c9d3a7f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "product_price_history",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("product_id", sa.UUID(), nullable=False),
+        sa.Column("price_per_kg", sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column("cost_price_per_kg", sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column("effective_from", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("source", sa.String(length=20), nullable=False),
+        sa.Column("changed_by", sa.String(length=64), nullable=True),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_product_price_history_product_effective",
+        "product_price_history",
+        ["product_id", "effective_from", "id"],
+    )
+
+    # Earlier prices were overwritten in place, so the current ones are the best
+    # available; they are taken to hold since the product was created.
+    op.execute(
+        """
+        INSERT INTO product_price_history (product_id, price_per_kg, cost_price_per_kg, effective_from, source)
+        SELECT id, price_per_kg, cost_price_per_kg, created_at, 'backfill'
+        FROM products
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_product_price_history_product_effective", table_name="product_price_history")
+    op.drop_table("product_price_history")
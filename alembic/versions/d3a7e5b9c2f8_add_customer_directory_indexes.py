@@ -0,0 +1,50 @@
+"""add customer directory indexes
+
+Revision ID: d3a7e5b9c2f8
+Revises: c8f2a4e7b1d6
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d3a7e5b9c2f8"
+down_revision: Union[str, Sequence[str], None] = "c8f2a4e7b1d6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_customers_active_name_lower_id",
+        "customers",
+        [sa.text("lower(customer_name)"), "id"],
+        postgresql_where=sa.text("is_active = true"),
+    )
+    op.create_index(
+        "ix_customers_name_trgm",
+        "customers",
+        ["customer_name"],
+        postgresql_using="gin",
+        postgresql_ops={"customer_name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_customers_phone_prefix",
+        "customers",
+        ["customer_phone_number"],
+        postgresql_ops={"customer_phone_number": "varchar_pattern_ops"},
+    )
+    op.create_index("ix_customers_city_lower", "customers", [sa.text("lower(customer_city)")])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_customers_city_lower", table_name="customers")
+    op.drop_index("ix_customers_phone_prefix", table_name="customers")
+    op.drop_index("ix_customers_name_trgm", table_name="customers")
+    op.drop_index("ix_customers_active_name_lower_id", table_name="customers")
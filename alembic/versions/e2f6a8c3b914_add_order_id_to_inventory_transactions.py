@@ -0,0 +1,38 @@
+"""add order_id to inventory transactions
+
+Revision ID: e2f6a8c3b914
+Revises: c41e9b7a5d20
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2f6a8c3b914"
+down_revision: Union[str, Sequence[str], None] = "c41e9b7a5d20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("inventory_transactions", sa.Column("order_id", sa.UUID(), nullable=True))
+
+    # Fulfilment deductions were only identifiable by their note until now.
+    op.execute(
+        """
+        UPDATE inventory_transactions t
+        SET order_id = o.id
+        FROM orders o
+        WHERE t.action = 'DEDUCT'
+          AND t.notes = 'Deducted for Order ' || o.order_number
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("inventory_transactions", "order_id")
@@ -0,0 +1,96 @@
+"""add customer_stats table
+
+Revision ID: e7c1b4f8a2d5
+Revises: d3a7e5b9c2f8
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e7c1b4f8a2d5"
+down_revision: Union[str, Sequence[str], None] = "d3a7e5b9c2f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_orders_customer_created", "orders", ["customer_id", "created_at"])
+
+    op.create_table(
+        "customer_stats",
+        sa.Column("customer_id", sa.UUID(), nullable=False),
+        sa.Column("order_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("lifetime_revenue", sa.Numeric(precision=14, scale=2), nullable=False, server_default="0"),
+        sa.Column("lifetime_profit", sa.Numeric(precision=14, scale=2), nullable=False, server_default="0"),
+        sa.Column("outstanding_amount", sa.Numeric(precision=14, scale=2), nullable=False, server_default="0"),
+        sa.Column("last_order_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["customer_id"], ["customers.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("customer_id"),
+    )
+
+    # Backfill every customer (zeros when they have no orders); same definitions as
+    # utils.customer_stats.derived_customer_stats_query.
+    op.execute(
+        """
+        INSERT INTO customer_stats (
+            customer_id, order_count, lifetime_revenue, lifetime_profit,
+            outstanding_amount, last_order_at, created_at, updated_at
+        )
+        SELECT
+            c.id,
+            COALESCE(s.order_count, 0),
+            COALESCE(s.lifetime_revenue, 0),
+            COALESCE(s.lifetime_profit, 0),
+            COALESCE(s.outstanding_amount, 0),
+            s.last_order_at,
+            now(),
+            now()
+        FROM customers c
+        LEFT JOIN (
+            SELECT
+                o.customer_id,
+                SUM(CASE WHEN o.order_status <> 'CANCELLED' THEN 1 ELSE 0 END) AS order_count,
+                SUM(CASE WHEN o.order_status = 'FULFILLED' THEN o.total ELSE 0 END) AS lifetime_revenue,
+                SUM(CASE WHEN o.order_status = 'FULFILLED' THEN p.profit ELSE 0 END) AS lifetime_profit,
+                SUM(CASE WHEN o.order_status = 'FULFILLED' AND o.payment_status <> 'PAID'
+                         THEN o.total ELSE 0 END) AS outstanding_amount,
+                MAX(CASE WHEN o.order_status <> 'CANCELLED' THEN o.created_at END) AS last_order_at
+            FROM orders o
+            LEFT JOIN (
+                SELECT order_id, SUM(profit) AS profit
+                FROM order_items
+                GROUP BY order_id
+            ) p ON p.order_id = o.id
+            GROUP BY o.customer_id
+        ) s ON s.customer_id = c.id
+        """
+    )
+
+    op.create_index("ix_customer_stats_order_count", "customer_stats", ["order_count", "customer_id"])
+    op.create_index("ix_customer_stats_lifetime_revenue", "customer_stats", ["lifetime_revenue", "customer_id"])
+    op.create_index("ix_customer_stats_lifetime_profit", "customer_stats", ["lifetime_profit", "customer_id"])
+    op.create_index("ix_customer_stats_outstanding_amount", "customer_stats", ["outstanding_amount", "customer_id"])
+    op.create_index(
+        "ix_customer_stats_last_order_at",
+        "customer_stats",
+        ["last_order_at", "customer_id"],
+        postgresql_where=sa.text("last_order_at IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_customer_stats_last_order_at", table_name="customer_stats")
+    op.drop_index("ix_customer_stats_outstanding_amount", table_name="customer_stats")
+    op.drop_index("ix_customer_stats_lifetime_profit", table_name="customer_stats")
+    op.drop_index("ix_customer_stats_lifetime_revenue", table_name="customer_stats")
+    op.drop_index("ix_customer_stats_order_count", table_name="customer_stats")
+    op.drop_table("customer_stats")
+    op.drop_index("ix_orders_customer_created", table_name="orders")
@@ -0,0 +1,33 @@
+"""add receivables index on orders
+
+Revision ID: f4b8d2a6c1e3
+Revises: e7c1b4f8a2d5
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f4b8d2a6c1e3"
+down_revision: Union[str, Sequence[str], None] = "e7c1b4f8a2d5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_orders_receivable_customer_created",
+        "orders",
+        ["customer_id", "created_at"],
+        postgresql_include=["total"],
+        postgresql_where=sa.text("order_status = 'FULFILLED' AND payment_status <> 'PAID'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_receivable_customer_created", table_name="orders")
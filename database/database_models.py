@@ -2,7 +2,7 @@ import enum
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, String, Boolean, Enum, DateTime, Text, Numeric, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, JSON, String, Boolean, Enum, DateTime, Text, Numeric, ForeignKey, Index, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
@@ -37,6 +37,8 @@ class Users(TimeStamp, Base):
     phone_number = Column(String(20), unique=True, index=True, nullable=False)
     password = Column(String(512), nullable=False)
     profile_picture = Column(String(512), nullable=True)
+    # {variant: url} from utils.image_pipeline; profile_picture is the "full" variant
+    profile_picture_variants = Column(JSON, nullable=True)
     role = Column(Enum(UserRole, name='user_role'), nullable=False, default=UserRole.USER)
     is_active = Column(Boolean, nullable=False, default=True)
 
@@ -66,9 +68,41 @@ class Products(TimeStamp, Base):
     # Cost price (current). OrderItems snapshots the cost used for profit.
     cost_price_per_kg = Column(Numeric(10, 2), nullable=True)
     product_image = Column(String(512), nullable=True)
+    # {variant: url} from utils.image_pipeline; product_image is the "full" variant
+    product_image_variants = Column(JSON, nullable=True)
     min_stock_kg = Column(Numeric(10, 2), nullable=False, default=0)
     is_active = Column(Boolean, nullable=False, default=True)
 
+    __table_args__ = (
+        # Names are unique regardless of case; also serves the duplicate-name checks.
+        Index("uq_products_product_name_lower", func.lower(product_name), unique=True),
+        # pg_trgm: ILIKE '%term%' and fuzzy search (utils.product_search)
+        Index(
+            "ix_products_name_trgm",
+            product_name,
+            postgresql_using="gin",
+            postgresql_ops={"product_name": "gin_trgm_ops"},
+        ),
+    )
+
+
+class ProductPriceHistory(Base):
+    """Append-only log of product price/cost; each row holds from effective_from until the next"""
+    __tablename__ = "product_price_history"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    price_per_kg = Column(Numeric(10, 2), nullable=False)
+    cost_price_per_kg = Column(Numeric(10, 2), nullable=True)
+    effective_from = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    # create / edit / bulk / backfill
+    source = Column(String(20), nullable=False)
+    changed_by = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        # "As of t" per product: latest row with effective_from <= t (utils.price_history).
+        Index("ix_product_price_history_product_effective", "product_id", "effective_from", "id"),
+    )
+
 
 class OrderStatus(enum.Enum):
     PENDING = 'pending'
@@ -97,6 +131,20 @@ class Orders(TimeStamp, Base):
     total = Column(Numeric(12, 2), nullable=False)
     notes = Column(Text, nullable=True)
 
+    __table_args__ = (
+        # Per-customer lookups (customer_stats last_order_at recompute and rebuild)
+        Index("ix_orders_customer_created", "customer_id", "created_at"),
+        # Receivables ageing (GET /orders/receivables/ageing): fulfilled orders not yet paid,
+        # with total included so the aggregate can run as an index-only scan
+        Index(
+            "ix_orders_receivable_customer_created",
+            "customer_id",
+            "created_at",
+            postgresql_include=["total"],
+            postgresql_where=(order_status == OrderStatus.FULFILLED) & (payment_status != PaymentStatus.PAID),
+        ),
+    )
+
 
 class OrderItems(TimeStamp, Base):
     """Order items table"""
@@ -127,6 +175,55 @@ class InventoryTransactions(TimeStamp, Base):
     action = Column(Enum(InventoryActions, name='inventory_actions'), nullable=False)
     quantity_kg = Column(Numeric(10, 2), nullable=False)
     notes = Column(Text, nullable=True)
+    # Set on fulfilment deductions. Deliberately not a foreign key: the ledger keeps
+    # the reference after an order is deleted.
+    order_id = Column(UUID(as_uuid=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_inventory_transactions_product_created", "product_id", "created_at", "id"),
+        Index("ix_inventory_transactions_created", "created_at", "id"),
+    )
+
+
+class InventoryCheckpoints(TimeStamp, Base):
+    """Closing ledger balance per product at a period boundary (IST month start)"""
+    __tablename__ = "inventory_checkpoints"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    # Exclusive upper bound: balance of every ledger row with created_at < period_end
+    period_end = Column(DateTime(timezone=True), nullable=False)
+    balance_kg = Column(Numeric(12, 2), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("product_id", "period_end", name="uq_inventory_checkpoints_product_period"),
+    )
+
+
+class ProductStock(TimeStamp, Base):
+    """Materialised stock balance per product, kept in step with inventory_transactions"""
+    __tablename__ = "product_stock"
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    # Ledger balance: SUM(ADD) - SUM(DEDUCT)
+    on_hand_kg = Column(Numeric(12, 2), nullable=False, default=0)
+    # Quantity held by PENDING orders
+    reserved_kg = Column(Numeric(12, 2), nullable=False, default=0)
+    # Last status seen by the stock alert evaluator (OUT_OF_STOCK / LOW_STOCK / OK)
+    alert_status = Column(String(20), nullable=True)
+
+
+class StockAlerts(TimeStamp, Base):
+    """Low-stock threshold crossings, polled by id"""
+    __tablename__ = "stock_alerts"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(20), nullable=False)
+    previous_status = Column(String(20), nullable=True)
+    available_kg = Column(Numeric(12, 2), nullable=False)
+    min_stock_kg = Column(Numeric(10, 2), nullable=False)
+
+    __table_args__ = (
+        Index("ix_stock_alerts_product_id_id", "product_id", "id"),
+    )
 
 
 class Customers(TimeStamp, Base):
@@ -138,3 +235,47 @@ class Customers(TimeStamp, Base):
     customer_address = Column(String(512), nullable=True)
     customer_city = Column(String(100), nullable=True)
     is_active = Column(Boolean, nullable=False, default=True)
+
+    __table_args__ = (
+        # Directory order (GET /customers/): lower(name), id keyset over active customers
+        Index("ix_customers_active_name_lower_id", func.lower(customer_name), "id",
+              postgresql_where=(is_active == True)),
+        # Name search (ILIKE '%term%'), pg_trgm
+        Index(
+            "ix_customers_name_trgm",
+            customer_name,
+            postgresql_using="gin",
+            postgresql_ops={"customer_name": "gin_trgm_ops"},
+        ),
+        # Phone prefix search (LIKE 'digits%') regardless of the database collation
+        Index(
+            "ix_customers_phone_prefix",
+            customer_phone_number,
+            postgresql_ops={"customer_phone_number": "varchar_pattern_ops"},
+        ),
+        Index("ix_customers_city_lower", func.lower(customer_city)),
+    )
+
+
+class CustomerStats(TimeStamp, Base):
+    """Lifetime order totals per customer, kept in step with orders (utils.customer_stats)"""
+    __tablename__ = "customer_stats"
+    customer_id = Column(UUID(as_uuid=True), ForeignKey("customers.id", ondelete="CASCADE"), primary_key=True)
+    # Orders that are not cancelled
+    order_count = Column(Integer, nullable=False, default=0)
+    # Orders.total / item profit of FULFILLED orders
+    lifetime_revenue = Column(Numeric(14, 2), nullable=False, default=0)
+    lifetime_profit = Column(Numeric(14, 2), nullable=False, default=0)
+    # Orders.total of FULFILLED orders that are not PAID
+    outstanding_amount = Column(Numeric(14, 2), nullable=False, default=0)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Directory sorts (GET /customers/?sort_by=...): (metric, customer_id) keysets
+        Index("ix_customer_stats_order_count", "order_count", "customer_id"),
+        Index("ix_customer_stats_lifetime_revenue", "lifetime_revenue", "customer_id"),
+        Index("ix_customer_stats_lifetime_profit", "lifetime_profit", "customer_id"),
+        Index("ix_customer_stats_outstanding_amount", "outstanding_amount", "customer_id"),
+        Index("ix_customer_stats_last_order_at", "last_order_at", "customer_id",
+              postgresql_where=(last_order_at.isnot(None))),
+    )
@@ -1,11 +1,24 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import RedirectResponse
 from starlette.middleware.cors import CORSMiddleware
 
-from routers import auth, users, customers, business, products, orders, inventory, dashboard, profit
+from routers import auth, users, customers, business, products, orders, inventory, dashboard, profit, files
 from settings import settings
+from database.database import engine
+from utils.customer_index import customer_index
+from utils.storage import storage
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    customer_index.warm(engine)
+    yield
+    await storage.aclose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -16,6 +29,7 @@ app.include_router(orders.router)
 app.include_router(inventory.router)
 app.include_router(dashboard.router)
 app.include_router(profit.router)
+app.include_router(files.router)
 
 
 @app.get("/")
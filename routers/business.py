@@ -12,7 +12,7 @@ from database.database import get_db
 from database.database_models import BusinessSettings
 from dependencies.auth import get_current_user
 from dependencies.roles import admin_required
-from utils.storage import upload_image_to_supabase
+from utils.image_pipeline import ingest_image
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/business", tags=["Business"])
@@ -74,8 +74,8 @@ def create_business(
     if upi_qr_image.content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Invalid image type")
 
-    # Saving QR Code Image to Supabase
-    qr_url = upload_image_to_supabase(upi_qr_image, folder="qr-codes")
+    # Saving QR Code Image to Supabase (lossless WebP so it stays scannable)
+    qr_url = ingest_image(upi_qr_image, folder="qr-codes", lossless=True, thumbnails=False)["full"]
 
     business = BusinessSettings(
         business_name=business_name,
@@ -157,7 +157,9 @@ def update_business(
                 )
 
             # Save QR to Supabase
-            business.upi_qr_image = upload_image_to_supabase(upi_qr_image, folder="qr-codes")
+            business.upi_qr_image = ingest_image(
+                upi_qr_image, folder="qr-codes", lossless=True, thumbnails=False
+            )["full"]
 
     if tax_rate is not None:
         business.tax_rate = tax_rate
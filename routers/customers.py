@@ -1,44 +1,223 @@
-from fastapi import APIRouter, HTTPException, status
+import re
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, status
 from fastapi.params import Depends
-from sqlalchemy import or_
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 
 from core.logger import get_logger
 from database.database import get_db
-from database.database_models import Customers
+from database.database_models import Customers, CustomerStats
 from dependencies.auth import get_current_user
 from dependencies.roles import admin_required
-from schemas.pydantic_models import CreateCustomerModel, EditCustomerModel
+from schemas.pydantic_models import CreateCustomerModel, CustomerAutocompleteResponse, EditCustomerModel
+from utils.customer_index import customer_index
+from utils.customer_stats import init_customer_stats
+from utils.pagination import decode_cursor, keyset_page
+from utils.product_search import escape_like
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/customers", tags=["Customers"])
 
 
+CUSTOMER_FIELDS = {
+    "id": Customers.id,
+    "customer_name": Customers.customer_name,
+    "customer_phone_number": Customers.customer_phone_number,
+    "customer_address": Customers.customer_address,
+    "customer_city": Customers.customer_city,
+    "is_active": Customers.is_active,
+    # customer_stats (utils.customer_stats)
+    "order_count": CustomerStats.order_count,
+    "lifetime_revenue": CustomerStats.lifetime_revenue,
+    "lifetime_profit": CustomerStats.lifetime_profit,
+    "outstanding_amount": CustomerStats.outstanding_amount,
+    "last_order_at": CustomerStats.last_order_at,
+}
+_STATS_FIELDS = ("order_count", "lifetime_revenue", "lifetime_profit", "outstanding_amount", "last_order_at")
+# Profit reveals cost, which only admins see (as in the product list).
+ADMIN_ONLY_FIELDS = ("lifetime_profit",)
+# Sort key -> (column, cursor value parser)
+CUSTOMER_SORTS = {
+    "name": (func.lower(Customers.customer_name), str),
+    "order_count": (CustomerStats.order_count, int),
+    "lifetime_revenue": (CustomerStats.lifetime_revenue, Decimal),
+    "lifetime_profit": (CustomerStats.lifetime_profit, Decimal),
+    "outstanding_amount": (CustomerStats.outstanding_amount, Decimal),
+    "last_order_at": (CustomerStats.last_order_at, datetime.fromisoformat),
+}
+# Needs a digit: "+" or "-" alone would otherwise become an empty (match-all) prefix.
+_PHONE_SEARCH = re.compile(r"^\+?[\s-]*\d[\d\s-]*$")
+MAX_AUTOCOMPLETE_LIMIT = 20
+
+
+def _field_value(name: str, value):
+    if value is None:
+        return None
+    if name == "id":
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _customer_stats(db: Session, customer_id) -> dict:
+    row = db.query(*(CUSTOMER_FIELDS[f].label(f) for f in _STATS_FIELDS)).filter(
+        CustomerStats.customer_id == customer_id
+    ).first()
+    if row is None:
+        return {"order_count": 0, "lifetime_revenue": 0.0, "lifetime_profit": 0.0,
+                "outstanding_amount": 0.0, "last_order_at": None}
+    return {f: _field_value(f, getattr(row, f)) for f in _STATS_FIELDS}
+
+
+def _require_admin(is_admin: bool, what: str) -> None:
+    if not is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Admin access required for {what}")
+
+
+def _parse_fields(raw: str | None, is_admin: bool) -> list[str]:
+    if not raw:
+        return [f for f in CUSTOMER_FIELDS if is_admin or f not in ADMIN_ONLY_FIELDS]
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in CUSTOMER_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(CUSTOMER_FIELDS)}",
+        )
+    restricted = [f for f in fields if f in ADMIN_ONLY_FIELDS]
+    if restricted:
+        _require_admin(is_admin, f"fields: {', '.join(restricted)}")
+    # id is always returned: clients need it to select a customer.
+    return ["id"] + [f for f in dict.fromkeys(fields) if f != "id"]
+
+
 @router.get('/')
 def get_customers(
+        search: str | None = Query(None, max_length=100),
+        city: str | None = Query(None, max_length=100),
+        fields: str | None = Query(None, description="Comma-separated subset of customer fields"),
+        sort_by: Literal["name", "order_count", "lifetime_revenue", "lifetime_profit",
+                         "outstanding_amount", "last_order_at"] = Query("name"),
+        order: Literal["asc", "desc"] = Query("asc"),
+        min_order_count: int | None = Query(None, ge=0),
+        min_lifetime_revenue: Decimal | None = Query(None, ge=0),
+        min_lifetime_profit: Decimal | None = Query(None),
+        min_outstanding_amount: Decimal | None = Query(None, ge=0),
+        last_order_after: datetime | None = Query(None),
+        last_order_before: datetime | None = Query(None),
+        limit: int = Query(50, ge=1, le=500),
+        cursor: str | None = Query(None),
+        include_total: bool = True,
         db: Session = Depends(get_db),
         current_user=Depends(get_current_user)
 ):
+    """
+    Active customers with their lifetime order totals (customer_stats), keyset-paginated
+    via next_cursor. Sorted by name (case-insensitive) unless sort_by names a metric;
+    each sort walks its own (value, id) index. Sorting by last_order_at leaves out
+    customers who have never ordered.
+    `search` matches a phone number prefix when it looks like a number, otherwise any
+    part of the name (trigram index); `city` filters by exact city, ignoring case; the
+    min_* and last_order_* parameters filter on the metrics. lifetime_profit (field,
+    sort and filter) is admin-only. `total` counts every matching customer; pass
+    include_total=false to skip that count when only the page is needed.
+    """
     logger.info(f"Fetching Customers list | requested_by={current_user['sub']}")
+    is_admin = current_user.get("role") == "admin"
+    selected = _parse_fields(fields, is_admin)
+    if sort_by in ADMIN_ONLY_FIELDS:
+        _require_admin(is_admin, f"sort_by={sort_by}")
+    if min_lifetime_profit is not None:
+        _require_admin(is_admin, "min_lifetime_profit")
+
+    sort_col, parse_sort_value = CUSTOMER_SORTS[sort_by]
+    query = (
+        db.query(*(CUSTOMER_FIELDS[f].label(f) for f in selected), sort_col.label("sort_value"))
+        .outerjoin(CustomerStats, CustomerStats.customer_id == Customers.id)
+        .filter(Customers.is_active == True)
+    )
+    if sort_by != "name":
+        query = query.filter(CustomerStats.customer_id.isnot(None))
+    if sort_by == "last_order_at":
+        query = query.filter(CustomerStats.last_order_at.isnot(None))
+
+    term = (search or "").strip()
+    if term:
+        if _PHONE_SEARCH.match(term):
+            digits = re.sub(r"[\s-]", "", term)
+            query = query.filter(Customers.customer_phone_number.like(f"{escape_like(digits)}%", escape="\\"))
+        else:
+            query = query.filter(Customers.customer_name.ilike(f"%{escape_like(term)}%", escape="\\"))
+    if city and city.strip():
+        query = query.filter(func.lower(Customers.customer_city) == city.strip().lower())
+
+    if min_order_count is not None:
+        query = query.filter(CustomerStats.order_count >= min_order_count)
+    if min_lifetime_revenue is not None:
+        query = query.filter(CustomerStats.lifetime_revenue >= min_lifetime_revenue)
+    if min_lifetime_profit is not None:
+        query = query.filter(CustomerStats.lifetime_profit >= min_lifetime_profit)
+    if min_outstanding_amount is not None:
+        query = query.filter(CustomerStats.outstanding_amount >= min_outstanding_amount)
+    if last_order_after is not None:
+        query = query.filter(CustomerStats.last_order_at >= last_order_after)
+    if last_order_before is not None:
+        query = query.filter(CustomerStats.last_order_at < last_order_before)
+
+    total = query.with_entities(func.count(Customers.id)).scalar() if include_total else None
+
+    after = decode_cursor(cursor, 2)
+    if after is not None:
+        try:
+            after = (parse_sort_value(after[0]), uuid.UUID(after[1]))
+        except (TypeError, ValueError, ArithmeticError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    # Stats sorts page on customer_stats.customer_id so (metric, id) matches the index.
+    id_col = Customers.id if sort_by == "name" else CustomerStats.customer_id
+    rows, next_cursor = keyset_page(
+        query.add_columns(id_col.label("row_id")), sort_col, id_col, order, after, limit,
+        lambda r: [r.sort_value.isoformat() if isinstance(r.sort_value, datetime) else str(r.sort_value),
+                   str(r.row_id)],
+    )
 
-    customers = db.query(Customers).filter(Customers.is_active == True).all()
-
-    response = [
-        {
-            'id': str(customer.id),
-            'customer_name': customer.customer_name,
-            'customer_phone_number': customer.customer_phone_number,
-            'customer_address': customer.customer_address,
-            'customer_city': customer.customer_city,
-            'is_active': customer.is_active,
-        } for customer in customers
-    ]
+    response = [{f: _field_value(f, getattr(r, f)) for f in selected} for r in rows]
     logger.info(f"Fetched Customers list successfully | count={len(response)}")
 
     return {
         "customers": response,
-        "total": len(response),
+        "count": len(response),
+        "total": total,
+        "next_cursor": next_cursor,
+    }
+
+
+@router.get('/autocomplete', response_model=CustomerAutocompleteResponse)
+def autocomplete_customers(
+        q: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(8, ge=1, le=MAX_AUTOCOMPLETE_LIMIT),
+        db: Session = Depends(get_db),
+        current_user=Depends(get_current_user)
+):
+    """
+    Type-ahead over active customers from the in-process index (utils.customer_index):
+    phone-number prefixes, whole-name prefixes, then any word of the name.
+    """
+    customer_index.ensure_current(db)
+    matches = customer_index.search(q, limit=limit)
+    return {
+        "query": q,
+        "count": len(matches),
+        "data": [{**entry._asdict(), "match": match} for entry, match in matches],
     }
 
 
@@ -61,8 +240,11 @@ def create_customer(data: CreateCustomerModel, db: Session = Depends(get_db), cu
     )
 
     db.add(new_customer)
+    db.flush()
+    init_customer_stats(db, new_customer.id)
     db.commit()
     db.refresh(new_customer)
+    customer_index.upsert(new_customer)
     logger.info(f"Customer created successfully | customer_id={new_customer.id}")
 
     return {
@@ -98,6 +280,8 @@ def get_customer(customer_id: str, db: Session = Depends(get_db), current_user=D
         "customer_address": customer.customer_address,
         "customer_city": customer.customer_city,
         "is_active": customer.is_active,
+        **{f: v for f, v in _customer_stats(db, customer.id).items()
+           if current_user.get("role") == "admin" or f not in ADMIN_ONLY_FIELDS},
     }
 
 
@@ -115,6 +299,7 @@ def delete_customer(customer_id: str, db: Session = Depends(get_db), current_use
         }
     customer.is_active = False
     db.commit()
+    customer_index.remove(customer.id)
     logger.warning(f"Customer soft deleted | customer_id={customer.id} | by_user={current_user['sub']}")
 
     return {
@@ -166,6 +351,7 @@ def edit_customer(customer_id: str, data: EditCustomerModel, db: Session = Depen
 
     db.commit()
     db.refresh(customer)
+    customer_index.upsert(customer)
 
     logger.info(f"Customer updated successfully | customer_id={customer.id}")
     return {
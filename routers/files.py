@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from starlette import status
+
+from core.logger import get_logger
+from utils.storage import LocalStorage, storage
+
+logger = get_logger(__name__)
+
+router = APIRouter(prefix="/files", tags=["files"])
+
+# Invoices are only handed out through the authenticated /orders/{id}/invoice.pdf route.
+PRIVATE_FOLDERS = ("invoices",)
+
+
+@router.get("/{path:path}", include_in_schema=False)
+def serve_file(path: str):
+    """
+    Serves objects of the local storage backend. FileResponse streams straight from
+    disk (sendfile when the server supports it) and answers Range requests.
+    """
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    target = storage.resolve(path)
+    if target is None or not target.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    # Checked on the resolved path: "./invoices/..." or "x/../invoices/..." land in the same folder.
+    if target.relative_to(storage.root).parts[0] in PRIVATE_FOLDERS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    # Object paths are never reused for different content, so browsers may cache for good.
+    return FileResponse(target, headers={"Cache-Control": "public, max-age=31536000, immutable"})
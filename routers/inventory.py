@@ -1,80 +1,88 @@
-from fastapi import APIRouter, Depends, status, HTTPException
+import csv
+import io
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import ROUND_CEILING, Decimal, InvalidOperation
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query, Request, status, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from core.logger import get_logger
 from database.database import get_db
-from database.database_models import InventoryTransactions, InventoryActions, OrderItems, Orders, Products, OrderStatus
+from database.database_models import InventoryActions, InventoryTransactions, Products, ProductStock, StockAlerts
 from dependencies.auth import get_current_user
 from dependencies.roles import admin_required
 
-from sqlalchemy import func, case
+from sqlalchemy import case, func, or_
 
 from schemas.pydantic_models import (
     InventorySummaryResponse,
+    InventoryHistoryResponse,
     InventoryItemsListResponse,
     InventoryTransactionRequest,
-    InventoryTransactionResponse
+    InventoryTransactionResponse,
+    InventoryValuationResponse,
+    StockAlertsResponse,
+    StockAsOfResponse,
+    StockForecastResponse,
+    StockTakeResponse,
 )
+from utils.consumption import MAX_WINDOW_DAYS, get_consumption
+from utils.inventory_checkpoints import ledger_history_subquery, schedule_checkpoints, stock_as_of_query
+from utils.pagination import decode_cursor, keyset_page
+from utils.timezone import ist_date_range_bounds, ist_day_bounds, now_ist
+from utils.stock import lock_stock_rows, record_inventory_batch, record_inventory_transaction
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/inventory", tags=["inventory"])
 
 
+def _available_expr():
+    """Available stock = on-hand minus reserved for PENDING orders."""
+    return func.coalesce(ProductStock.on_hand_kg, 0) - func.coalesce(ProductStock.reserved_kg, 0)
+
+
+def _status_expr(available):
+    return case(
+        (available <= 0, "OUT_OF_STOCK"),
+        (available <= Products.min_stock_kg, "LOW_STOCK"),
+        else_="OK",
+    )
+
+
+def _status_rank_expr(available):
+    # Sort key for status: most urgent first when ascending.
+    return case(
+        (available <= 0, 0),
+        (available <= Products.min_stock_kg, 1),
+        else_=2,
+    )
+
+
 @router.get("/summary", response_model=InventorySummaryResponse)
 def get_inventory_summary(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     logger.info("Fetching inventory summary")
 
     try:
-        stock_subq = (
-            db.query(
-                InventoryTransactions.product_id,
-                func.sum(
-                    case(
-                        (InventoryTransactions.action == InventoryActions.ADD, InventoryTransactions.quantity_kg),
-                        (InventoryTransactions.action == InventoryActions.DEDUCT, -InventoryTransactions.quantity_kg),
-                        else_=0
-                    )
-                ).label("stock")
-            )
-            .group_by(InventoryTransactions.product_id)
-            .subquery()
-        )
+        stock_status = _status_expr(_available_expr())
 
-        reserved_subq = (
+        result = (
             db.query(
-                OrderItems.product_id,
-                func.sum(OrderItems.quantity_kg).label("reserved")
+                func.count(Products.id).label("total"),
+                func.count(Products.id).filter(stock_status == "LOW_STOCK").label("low"),
+                func.count(Products.id).filter(stock_status == "OUT_OF_STOCK").label("out"),
             )
-            .join(Orders, Orders.id == OrderItems.order_id)
-            .filter(Orders.order_status == OrderStatus.PENDING)
-            .group_by(OrderItems.product_id)
-            .subquery()
+            .outerjoin(ProductStock, ProductStock.product_id == Products.id)
+            .one()
         )
 
-        results = (
-            db.query(
-                Products.id,
-                Products.min_stock_kg,
-                func.coalesce(stock_subq.c.stock, 0).label("stock"),
-                func.coalesce(reserved_subq.c.reserved, 0).label("reserved"),
-            )
-            .outerjoin(stock_subq, Products.id == stock_subq.c.product_id)
-            .outerjoin(reserved_subq, Products.id == reserved_subq.c.product_id)
-            .all()
-        )
-
-        total_products = len(results)
-        low_stock = 0
-        out_of_stock = 0
-
-        for r in results:
-            available_stock = float(r.stock) - float(r.reserved)
-
-            if available_stock == 0:
-                out_of_stock += 1
-            elif available_stock <= float(r.min_stock_kg):
-                low_stock += 1
+        total_products = int(result.total or 0)
+        low_stock = int(result.low or 0)
+        out_of_stock = int(result.out or 0)
 
         logger.info(
             f"Inventory summary computed | total={total_products}, low={low_stock}, out={out_of_stock}"
@@ -83,7 +91,8 @@ def get_inventory_summary(db: Session = Depends(get_db), current_user=Depends(ge
         return {
             "total_products": total_products,
             "low_stock_products": low_stock,
-            "out_of_stock_products": out_of_stock
+            "out_of_stock_products": out_of_stock,
+            "ok_products": total_products - low_stock - out_of_stock,
         }
 
     except Exception as e:
@@ -94,7 +103,11 @@ def get_inventory_summary(db: Session = Depends(get_db), current_user=Depends(ge
 @router.get("/items", response_model=InventoryItemsListResponse)
 def get_inventory_items(
     search: str = None,
-    status: str = None,
+    stock_status: Literal["OUT_OF_STOCK", "LOW_STOCK", "OK"] | None = Query(None, alias="status"),
+    sort_by: Literal["name", "stock", "status"] = Query("name"),
+    order: Literal["asc", "desc"] = Query("asc"),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = Query(None),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
@@ -103,33 +116,8 @@ def get_inventory_items(
     try:
         is_admin = current_user.get("role") == "admin"
 
-        # --- Stock (ADD - DEDUCT) ---
-        stock_subq = (
-            db.query(
-                InventoryTransactions.product_id,
-                func.sum(
-                    case(
-                        (InventoryTransactions.action == InventoryActions.ADD, InventoryTransactions.quantity_kg),
-                        (InventoryTransactions.action == InventoryActions.DEDUCT, -InventoryTransactions.quantity_kg),
-                        else_=0
-                    )
-                ).label("stock")
-            )
-            .group_by(InventoryTransactions.product_id)
-            .subquery()
-        )
-
-        # --- Reserved (PENDING orders) ---
-        reserved_subq = (
-            db.query(
-                OrderItems.product_id,
-                func.sum(OrderItems.quantity_kg).label("reserved")  # ⚠️ using quantity (your DB)
-            )
-            .join(Orders, Orders.id == OrderItems.order_id)
-            .filter(Orders.order_status == OrderStatus.PENDING)
-            .group_by(OrderItems.product_id)
-            .subquery()
-        )
+        available = _available_expr()
+        status_col = _status_expr(available)
 
         # --- Main Query ---
         query = (
@@ -140,11 +128,10 @@ def get_inventory_items(
                 Products.cost_price_per_kg,
                 Products.product_image,
                 Products.min_stock_kg,
-                func.coalesce(stock_subq.c.stock, 0).label("stock"),
-                func.coalesce(reserved_subq.c.reserved, 0).label("reserved"),
+                available.label("available"),
+                status_col.label("status"),
             )
-            .outerjoin(stock_subq, Products.id == stock_subq.c.product_id)
-            .outerjoin(reserved_subq, Products.id == reserved_subq.c.product_id)
+            .outerjoin(ProductStock, ProductStock.product_id == Products.id)
             .filter(Products.is_active == True)
         )
 
@@ -152,45 +139,455 @@ def get_inventory_items(
         if search:
             query = query.filter(Products.product_name.ilike(f"%{search}%"))
 
-        results = query.all()
-
-        data = []
-
-        for r in results:
-            available_stock = float(r.stock) - float(r.reserved)
-
-            # --- Status logic ---
-            if available_stock == 0:
-                stock_status = "OUT_OF_STOCK"
-            elif available_stock <= float(r.min_stock_kg):
-                stock_status = "LOW_STOCK"
-            else:
-                stock_status = "OK"
-
-            # --- Status filter ---
-            if status and stock_status != status:
-                continue
+        # --- Status filter ---
+        if stock_status:
+            query = query.filter(status_col == stock_status)
+
+        total = query.with_entities(func.count(Products.id)).scalar() or 0
+
+        # --- Sorting + keyset pagination ---
+        sort_col = {
+            "name": Products.product_name,
+            "stock": available,
+            "status": _status_rank_expr(available),
+        }[sort_by]
+
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            try:
+                sort_value = {"name": str, "stock": Decimal, "status": int}[sort_by](after[0])
+                after = (sort_value, uuid.UUID(after[1]))
+            except (TypeError, ValueError, ArithmeticError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+        query = query.add_columns(sort_col.label("sort_value"))
+        results, next_cursor = keyset_page(
+            query, sort_col, Products.id, order, after, limit,
+            lambda r: [str(r.sort_value), str(r.id)],
+        )
 
-            data.append({
+        data = [
+            {
                 "product_id": str(r.id),
                 "product_name": r.product_name,
                 "price_per_kg": float(r.price_per_kg),
                 "has_cost_price": r.cost_price_per_kg is not None,
                 "cost_price_per_kg": float(r.cost_price_per_kg) if (is_admin and r.cost_price_per_kg is not None) else None,
-                "stock_kg": round(available_stock, 2),
+                "stock_kg": round(float(r.available), 2),
                 "min_stock_kg": float(r.min_stock_kg),
-                "status": stock_status,
+                "status": r.status,
                 "image": r.product_image
-            })
+            }
+            for r in results
+        ]
 
-        logger.info(f"Inventory items fetched: {len(data)} records")
+        logger.info(f"Inventory items fetched: {len(data)} of {total} records")
 
-        return {"message": "Inventory Items","count": len(data),"data": data}
+        return {"message": "Inventory Items", "count": total, "data": data, "next_cursor": next_cursor}
+
+    except HTTPException:
+        raise
 
     except Exception:
         logger.error("Error while fetching inventory items", exc_info=True)
         raise
 
+def _parse_windows(raw: str) -> list[int]:
+    try:
+        windows = sorted({int(part) for part in raw.split(",") if part.strip()})
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="windows must be comma-separated day counts")
+    if not windows or windows[0] < 1 or windows[-1] > MAX_WINDOW_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"windows must be between 1 and {MAX_WINDOW_DAYS} days",
+        )
+    return windows
+
+
+@router.get("/forecast", response_model=StockForecastResponse)
+def get_stock_forecast(
+    windows: str = Query("7,30,90", description="Comma-separated consumption windows in days"),
+    basis_window: int = Query(30, description="Window used for days of cover and reorder quantity"),
+    target_cover_days: int = Query(14, ge=1, le=MAX_WINDOW_DAYS),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Days of cover and a suggested reorder quantity per active product, from average
+    daily fulfilment consumption. The suggestion brings available stock up to
+    min_stock_kg plus target_cover_days of consumption at the basis-window rate.
+    """
+    logger.info(f"Fetching stock forecast | windows={windows} | basis={basis_window}")
+
+    window_list = _parse_windows(windows)
+    if basis_window not in window_list:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="basis_window must be one of windows")
+    basis_index = window_list.index(basis_window)
+
+    try:
+        totals = get_consumption(db).window_totals(window_list, now_ist().date())
+        available = _available_expr()
+
+        products = (
+            db.query(Products.id, Products.product_name, Products.min_stock_kg, available.label("available"))
+            .outerjoin(ProductStock, ProductStock.product_id == Products.id)
+            .filter(Products.is_active == True)
+            .all()
+        )
+
+        no_consumption = [Decimal("0")] * len(window_list)
+        data = []
+        for p in products:
+            averages = [total / w for total, w in zip(totals.get(p.id, no_consumption), window_list)]
+            rate = averages[basis_index]
+            stock = Decimal(str(p.available))
+            min_stock = Decimal(str(p.min_stock_kg))
+            reorder = max(min_stock + rate * target_cover_days - stock, Decimal("0"))
+            data.append({
+                "product_id": str(p.id),
+                "product_name": p.product_name,
+                "available_kg": float(stock),
+                "min_stock_kg": float(min_stock),
+                "avg_daily_kg": {str(w): round(float(avg), 3) for w, avg in zip(window_list, averages)},
+                "days_of_cover": round(float(max(stock, Decimal("0")) / rate), 1) if rate > 0 else None,
+                "suggested_reorder_kg": float(reorder.quantize(Decimal("0.01"), rounding=ROUND_CEILING)),
+            })
+
+        # Least cover first; products with no consumption last.
+        data.sort(key=lambda d: (d["days_of_cover"] is None, d["days_of_cover"] or 0, d["product_name"]))
+
+        return {
+            "message": "Stock forecast",
+            "windows": window_list,
+            "basis_window": basis_window,
+            "target_cover_days": target_cover_days,
+            "count": len(data),
+            "data": data,
+        }
+
+    except Exception:
+        logger.error("Error while computing stock forecast", exc_info=True)
+        raise
+
+
+@router.get("/alerts", response_model=StockAlertsResponse)
+def get_stock_alerts(
+    since: int = Query(0, ge=0, description="Return alerts with id greater than this"),
+    product_id: uuid.UUID | None = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Low-stock threshold crossings recorded after `since`, oldest first."""
+    try:
+        query = (
+            db.query(StockAlerts, Products.product_name)
+            .join(Products, Products.id == StockAlerts.product_id)
+            .filter(StockAlerts.id > since)
+        )
+        if product_id:
+            query = query.filter(StockAlerts.product_id == product_id)
+
+        results = query.order_by(StockAlerts.id.asc()).limit(limit).all()
+
+        data = [
+            {
+                "id": alert.id,
+                "product_id": str(alert.product_id),
+                "product_name": product_name,
+                "status": alert.status,
+                "previous_status": alert.previous_status,
+                "available_kg": float(alert.available_kg),
+                "min_stock_kg": float(alert.min_stock_kg),
+                "created_at": alert.created_at,
+            }
+            for alert, product_name in results
+        ]
+
+        return {
+            "message": "Stock alerts",
+            "count": len(data),
+            "data": data,
+            "next_since": data[-1]["id"] if data else since,
+        }
+
+    except Exception:
+        logger.error("Error while fetching stock alerts", exc_info=True)
+        raise
+
+
+@router.get("/stock-as-of", response_model=StockAsOfResponse)
+def get_stock_as_of(
+    as_of: date = Query(..., description="IST date; stock at the end of that day"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Historical on-hand stock per product at the end of an IST day,
+    answered from the latest monthly checkpoint plus the ledger tail after it.
+    """
+    logger.info(f"Fetching stock as of {as_of.isoformat()}")
+
+    try:
+        _, end_utc = ist_day_bounds(as_of)
+        schedule_checkpoints(db)
+        stock_subq = stock_as_of_query(db, end_utc).subquery()
+
+        results = (
+            db.query(Products.id, Products.product_name, Products.is_active, stock_subq.c.stock)
+            .join(stock_subq, stock_subq.c.product_id == Products.id)
+            .filter(Products.created_at < end_utc)
+            .order_by(Products.product_name)
+            .all()
+        )
+
+        data = [
+            {
+                "product_id": str(r.id),
+                "product_name": r.product_name,
+                "is_active": r.is_active,
+                "stock_kg": round(float(r.stock), 2),
+            }
+            for r in results
+        ]
+
+        return {
+            "message": "Stock as of date",
+            "as_of_date": as_of.isoformat(),
+            "count": len(data),
+            "data": data,
+        }
+
+    except Exception:
+        logger.error("Error while fetching historical stock", exc_info=True)
+        raise
+
+
+@router.get("/transactions", response_model=InventoryHistoryResponse)
+def get_inventory_transactions(
+    product_id: uuid.UUID | None = Query(None),
+    action: Literal["add", "deduct", "adjust"] | None = Query(None),
+    from_date: date | None = Query(None),
+    to_date: date | None = Query(None),
+    order: Literal["asc", "desc"] = Query("desc"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None),
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Ledger history with the on-hand balance after each row, newest first by default.
+    Dates are IST calendar days (inclusive).
+
+    The page is picked first with a plain keyset scan of the ledger indexes; balances are
+    then computed for that page only, starting from each product's latest checkpoint at or
+    before the page's oldest row. `total` is only computed when include_total=true.
+    """
+    logger.info(
+        f"Fetching inventory transactions | product_id={product_id} | action={action} | "
+        f"from={from_date} | to={to_date}"
+    )
+
+    if from_date and to_date and from_date > to_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from_date must be on or before to_date")
+
+    try:
+        schedule_checkpoints(db)
+        start_utc, end_utc = ist_date_range_bounds(from_date, to_date)
+
+        query = db.query(
+            InventoryTransactions.id, InventoryTransactions.product_id, InventoryTransactions.created_at
+        )
+        if product_id is not None:
+            query = query.filter(InventoryTransactions.product_id == product_id)
+        if start_utc is not None:
+            query = query.filter(InventoryTransactions.created_at >= start_utc)
+        if end_utc is not None:
+            query = query.filter(InventoryTransactions.created_at < end_utc)
+        if action:
+            query = query.filter(InventoryTransactions.action == InventoryActions(action))
+
+        total = query.with_entities(func.count(InventoryTransactions.id)).scalar() if include_total else None
+
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            try:
+                after = (datetime.fromisoformat(after[0]), uuid.UUID(after[1]))
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+        page, next_cursor = keyset_page(
+            query, InventoryTransactions.created_at, InventoryTransactions.id, order, after, limit,
+            lambda r: [r.created_at.isoformat(), str(r.id)],
+        )
+
+        results = []
+        if page:
+            oldest = min(r.created_at for r in page)
+            newest = max(r.created_at for r in page)
+            ledger = ledger_history_subquery(
+                db, oldest, newest + timedelta(microseconds=1), {r.product_id for r in page}
+            )
+            by_id = {
+                r.id: r
+                for r in db.query(ledger, Products.product_name)
+                .join(Products, Products.id == ledger.c.product_id)
+                .filter(ledger.c.id.in_([r.id for r in page]))
+                .all()
+            }
+            results = [by_id[r.id] for r in page]
+
+        data = [
+            {
+                "transaction_id": str(r.id),
+                "product_id": str(r.product_id),
+                "product_name": r.product_name,
+                "action": r.action.value,
+                "quantity_kg": float(r.quantity_kg),
+                "delta_kg": float(r.delta_kg),
+                "balance_kg": round(float(r.balance_kg), 2),
+                "notes": r.notes,
+                "created_at": r.created_at,
+            }
+            for r in results
+        ]
+
+        logger.info(f"Inventory transactions fetched: {len(data)} records")
+
+        return {
+            "message": "Inventory transactions",
+            "period": {
+                "from": from_date.isoformat() if from_date else None,
+                "to": to_date.isoformat() if to_date else None,
+                "timezone": "Asia/Kolkata",
+            },
+            "count": len(data),
+            "total": total,
+            "data": data,
+            "next_cursor": next_cursor,
+        }
+
+    except HTTPException:
+        raise
+
+    except Exception:
+        logger.error("Error while fetching inventory transactions", exc_info=True)
+        raise
+
+
+def _valuation_csv(rows: list, totals: dict):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    writer.writerow(["product_id", "product_name", "is_active", "stock_kg", "cost_price_per_kg", "value"])
+    yield flush()
+    for r in rows:
+        writer.writerow([
+            r.id,
+            r.product_name,
+            r.is_active,
+            r.stock,
+            r.cost_price_per_kg if r.cost_price_per_kg is not None else "",
+            r.value if r.value is not None else "",
+        ])
+        if buffer.tell() > 64 * 1024:
+            yield flush()
+    writer.writerow(["", "TOTAL", "", totals["total_stock_kg"], "", totals["total_value"]])
+    yield flush()
+
+
+@router.get("/valuation", response_model=InventoryValuationResponse)
+def get_inventory_valuation(
+    as_of: date | None = Query(None, description="IST date; value at the end of that day. Omit for now."),
+    format: Literal["json", "csv"] = Query("json"),
+    db: Session = Depends(get_db),
+    current_user=Depends(admin_required),
+):
+    """
+    Stock value at cost (on-hand kg x cost_price_per_kg) per product and in total.
+    Current values come from product_stock; as-of values from the latest monthly
+    checkpoint plus the ledger tail, so month-ends a year back stay cheap.
+    """
+    logger.info(f"Fetching inventory valuation | as_of={as_of} | format={format}")
+
+    try:
+        if as_of is None:
+            stock = func.coalesce(ProductStock.on_hand_kg, 0)
+            query = db.query(Products).outerjoin(ProductStock, ProductStock.product_id == Products.id)
+        else:
+            _, end_utc = ist_day_bounds(as_of)
+            schedule_checkpoints(db)
+            stock_subq = stock_as_of_query(db, end_utc).subquery()
+            stock = stock_subq.c.stock
+            query = (
+                db.query(Products)
+                .join(stock_subq, stock_subq.c.product_id == Products.id)
+                .filter(Products.created_at < end_utc)
+            )
+
+        rows = (
+            query.with_entities(
+                Products.id,
+                Products.product_name,
+                Products.is_active,
+                Products.cost_price_per_kg,
+                stock.label("stock"),
+                func.round(stock * Products.cost_price_per_kg, 2).label("value"),
+            )
+            # Inactive products only matter while they still hold stock.
+            .filter(or_(Products.is_active == True, stock != 0))
+            .order_by(Products.product_name, Products.id)
+            .all()
+        )
+
+        total_stock = sum((Decimal(str(r.stock)) for r in rows), Decimal("0"))
+        total_value = sum((Decimal(str(r.value)) for r in rows if r.value is not None), Decimal("0"))
+        missing_cost = sum(1 for r in rows if r.cost_price_per_kg is None and r.stock != 0)
+        totals = {"total_stock_kg": total_stock, "total_value": total_value}
+
+        if format == "csv":
+            filename = f"inventory-valuation-{(as_of or now_ist().date()).isoformat()}.csv"
+            return StreamingResponse(
+                _valuation_csv(rows, totals),
+                media_type="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={filename}"},
+            )
+
+        data = [
+            {
+                "product_id": str(r.id),
+                "product_name": r.product_name,
+                "is_active": r.is_active,
+                "stock_kg": round(float(r.stock), 2),
+                "cost_price_per_kg": float(r.cost_price_per_kg) if r.cost_price_per_kg is not None else None,
+                "value": float(r.value) if r.value is not None else None,
+            }
+            for r in rows
+        ]
+
+        return {
+            "message": "Inventory valuation",
+            "as_of_date": as_of.isoformat() if as_of else None,
+            "count": len(data),
+            "total_stock_kg": float(total_stock),
+            "total_value": float(total_value),
+            "missing_cost_products": missing_cost,
+            "data": data,
+        }
+
+    except Exception:
+        logger.error("Error while computing inventory valuation", exc_info=True)
+        raise
+
+
 @router.post("/transactions", response_model=InventoryTransactionResponse, status_code=status.HTTP_201_CREATED)
 def add_stock(
     payload: InventoryTransactionRequest,
@@ -217,32 +614,11 @@ def add_stock(
                 detail="Product not found"
             )
 
-        # --- Current on-hand stock (ledger): ADD - DEDUCT ---
-        onhand = (
-            db.query(
-                func.coalesce(
-                    func.sum(
-                        case(
-                            (InventoryTransactions.action == InventoryActions.ADD, InventoryTransactions.quantity_kg),
-                            (InventoryTransactions.action == InventoryActions.DEDUCT, -InventoryTransactions.quantity_kg),
-                            else_=0,
-                        )
-                    ),
-                    0,
-                )
-            )
-            .filter(InventoryTransactions.product_id == product_id)
-            .scalar()
-        ) or 0
-
-        # --- Reserved stock (PENDING orders) ---
-        reserved = (
-            db.query(func.coalesce(func.sum(OrderItems.quantity_kg), 0))
-            .join(Orders, Orders.id == OrderItems.order_id)
-            .filter(OrderItems.product_id == product_id)
-            .filter(Orders.order_status == OrderStatus.PENDING)
-            .scalar()
-        ) or 0
+        # --- Lock the product's stock row for the rest of the transaction ---
+        # Concurrent deducts/adjusts on this product wait here and then validate against
+        # the balance left by the one before them; other products are unaffected.
+        # onhand: materialised ledger balance, reserved: held by PENDING orders.
+        onhand, reserved = lock_stock_rows(db, [product_id])[product_id]
 
         # Normalize action semantics:
         # - add: increase on-hand by requested_qty
@@ -281,14 +657,7 @@ def add_stock(
                     detail="Cannot deduct stock below reserved quantity for pending orders",
                 )
 
-        transaction = InventoryTransactions(
-            product_id=product_id,
-            action=action,
-            quantity_kg=quantity,
-            notes=notes,
-        )
-
-        db.add(transaction)
+        transaction = record_inventory_transaction(db, product_id, action, quantity, notes)
         db.commit()
         db.refresh(transaction)
 
@@ -313,3 +682,219 @@ def add_stock(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update inventory"
         )
+
+
+STOCK_TAKE_MAX_LINES = 5000
+
+
+def _read_stock_take_csv(text: str) -> list[tuple[int, dict]]:
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames is None:
+        return []
+    reader.fieldnames = [(name or "").strip().lower() for name in reader.fieldnames]
+    if "counted_kg" not in reader.fieldnames or not (
+        "product_id" in reader.fieldnames or "product_name" in reader.fieldnames
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CSV header must contain counted_kg and product_id or product_name",
+        )
+    # Line 1 is the header.
+    return [(index + 2, row) for index, row in enumerate(reader)]
+
+
+def _parse_stock_take_line(raw: dict, report: dict) -> tuple[uuid.UUID | None, str | None, Decimal | None]:
+    """Fills report["error"] and returns Nones if the line is unusable."""
+    raw_id = str(raw.get("product_id") or "").strip()
+    raw_name = str(raw.get("product_name") or "").strip()
+    raw_counted = str(raw.get("counted_kg") if raw.get("counted_kg") is not None else "").strip()
+
+    product_id = None
+    if raw_id:
+        try:
+            product_id = uuid.UUID(raw_id)
+        except ValueError:
+            report["error"] = "Invalid product_id"
+            return None, None, None
+    elif not raw_name:
+        report["error"] = "product_id or product_name is required"
+        return None, None, None
+
+    try:
+        counted = Decimal(raw_counted)
+    except (InvalidOperation, ValueError):
+        report["error"] = "Invalid counted_kg"
+        return None, None, None
+    if not counted.is_finite() or counted < 0:
+        report["error"] = "counted_kg must be 0 or more"
+        return None, None, None
+    if counted != counted.quantize(Decimal("0.01")):
+        report["error"] = "counted_kg supports at most 2 decimal places"
+        return None, None, None
+
+    return product_id, (raw_name or None), counted
+
+
+def _apply_stock_take(db: Session, lines: list[tuple[int, dict]], notes: str | None) -> list[dict]:
+    report = [{"line": line, "status": "ERROR", "error": None} for line, _ in lines]
+    parsed = [_parse_stock_take_line(raw, entry) for (_, raw), entry in zip(lines, report)]
+
+    # --- Resolve every referenced product in one query ---
+    ids = {product_id for product_id, _, _ in parsed if product_id}
+    names = {name.lower() for product_id, name, _ in parsed if name and not product_id}
+    conditions = []
+    if ids:
+        conditions.append(Products.id.in_(ids))
+    if names:
+        conditions.append(func.lower(Products.product_name).in_(names))
+    products = db.query(Products.id, Products.product_name).filter(or_(*conditions)).all() if conditions else []
+
+    by_id = {p.id: p for p in products}
+    by_name: dict = {}
+    for p in products:
+        by_name.setdefault(p.product_name.lower(), []).append(p)
+
+    resolved = []
+    seen: dict = {}
+    for (product_id, name, counted), entry in zip(parsed, report):
+        if entry["error"]:
+            resolved.append(None)
+            continue
+        if product_id:
+            product = by_id.get(product_id)
+        else:
+            matches = by_name.get(name.lower(), [])
+            if len(matches) > 1:
+                entry["error"] = "Product name matches more than one product; use product_id"
+                resolved.append(None)
+                continue
+            product = matches[0] if matches else None
+        if product is None:
+            entry["error"] = "Product not found"
+            resolved.append(None)
+            continue
+
+        entry["product_id"] = product.id
+        entry["product_name"] = product.product_name
+        entry["counted_kg"] = float(counted)
+        if product.id in seen:
+            entry["error"] = f"Duplicate of line {seen[product.id]}"
+            resolved.append(None)
+            continue
+        seen[product.id] = entry["line"]
+        resolved.append((product.id, counted))
+
+    # --- Current balances for all products in one locked, set-based read ---
+    balances = lock_stock_rows(db, seen.keys())
+
+    entries = []
+    for item, entry in zip(resolved, report):
+        if item is None:
+            continue
+        product_id, counted = item
+        onhand, reserved = balances[product_id]
+        delta = counted - onhand
+        entry["previous_kg"] = float(onhand)
+        entry["delta_kg"] = float(delta)
+        entry["reserved_kg"] = float(reserved)
+
+        if counted < reserved:
+            entry["error"] = "Counted stock is below the quantity reserved for pending orders"
+            continue
+
+        if delta == 0:
+            entry["status"] = "UNCHANGED"
+            continue
+
+        action = InventoryActions.ADD if delta > 0 else InventoryActions.DEDUCT
+        entry["status"] = action.value.upper()
+        entries.append((product_id, action, abs(delta), counted))
+
+    if any(entry["error"] for entry in report):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "code": "STOCK_TAKE_REJECTED",
+                "message": "Stock take not applied; fix the failing lines and resubmit",
+                "lines": [
+                    {**entry, "product_id": str(entry["product_id"]) if entry.get("product_id") else None}
+                    for entry in report
+                    if entry["error"]
+                ],
+            },
+        )
+
+    record_inventory_batch(db, entries, notes=notes or "Stock take")
+    db.commit()
+    return report
+
+
+@router.post("/stock-take", response_model=StockTakeResponse)
+async def stock_take(request: Request, db: Session = Depends(get_db), current_user=Depends(admin_required)):
+    """
+    Applies a physical count: each line sets a product's on-hand stock to counted_kg.
+    Accepts JSON ({"items": [{"product_id" | "product_name", "counted_kg"}], "notes"}),
+    a text/csv body, or a multipart upload in field "file" (plus optional "notes").
+    All lines are applied in one transaction, or none are.
+    """
+    logger.info(f"Stock take initiated | by_admin={current_user.get('sub')}")
+
+    content_type = request.headers.get("content-type", "")
+    notes = None
+    if content_type.startswith("application/json"):
+        payload = await request.json()
+        if isinstance(payload, dict):
+            notes = payload.get("notes")
+            payload = payload.get("items")
+        if not isinstance(payload, list) or not all(isinstance(item, dict) for item in payload):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="items must be a list of objects")
+        lines = [(index + 1, item) for index, item in enumerate(payload)]
+    else:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV file is required")
+            notes = form.get("notes")
+            raw = await upload.read()
+        else:
+            raw = await request.body()
+        try:
+            text = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV must be UTF-8 encoded")
+        lines = _read_stock_take_csv(text)
+
+    if not lines:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Stock take has no lines")
+    if len(lines) > STOCK_TAKE_MAX_LINES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Stock take is limited to {STOCK_TAKE_MAX_LINES} lines",
+        )
+
+    try:
+        # Row locks and the commit block: keep them off the event loop.
+        report = await run_in_threadpool(_apply_stock_take, db, lines, notes)
+
+    except HTTPException:
+        raise
+
+    except Exception:
+        db.rollback()
+        logger.error("Error applying stock take", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to apply stock take"
+        )
+
+    changed = sum(1 for entry in report if entry["status"] != "UNCHANGED")
+    logger.info(f"Stock take applied | lines={len(report)} | changed={changed}")
+
+    return {
+        "message": "Stock take applied successfully",
+        "count": len(report),
+        "changed": changed,
+        "data": report,
+    }
@@ -1,43 +1,55 @@
 from fastapi import APIRouter, Query, Depends, HTTPException, status
 from decimal import Decimal
-from sqlalchemy import func, or_
+from sqlalchemy import case, func, or_
 from sqlalchemy.orm import Session
+import csv
+import io
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Literal
 
 from core.logger import get_logger
 from database.database import get_db
-from database.database_models import Orders, Customers, OrderItems, BusinessSettings, Products, InventoryTransactions, InventoryActions, OrderStatus, PaymentStatus
+from database.database_models import Orders, Customers, OrderItems, BusinessSettings, Products, InventoryActions, OrderStatus, PaymentStatus
 from dependencies.auth import get_current_user
-from schemas.pydantic_models import OrdersListResponse, InvoiceResponse, CreateOrderRequest
+from schemas.pydantic_models import OrdersListResponse, InvoiceResponse, CreateOrderRequest, ReceivablesAgeingResponse
 from utils.generate_order_number import generate_order_number
 from utils.generate_invoice_number import generate_invoice_number
 from utils.pdf_generator import generate_invoice_pdf_content, PDF_TEMPLATE_VERSION
-from utils.storage import upload_pdf_bytes, check_invoice_exists
+from utils.storage import upload_pdf_bytes, read_invoice
 from utils.money import money
-from utils.timezone import IST
-from fastapi.responses import Response, RedirectResponse
-import requests
+from utils.customer_stats import apply_order_stats_change, order_profit, order_stats
+from utils.product_snapshot import ProductRecord, get_product_records
+from utils.stock import adjust_reservations, lock_stock_rows, record_inventory_transaction, reservation_deltas
+from utils.timezone import IST, ist_day_bounds, now_ist
+from fastapi.responses import Response, RedirectResponse, StreamingResponse
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix='/orders', tags=["orders"])
 
 
-def _load_products_for_items(db: Session, items: list) -> dict[str, Products]:
-    product_ids = list({i.product_id for i in items})
+def _load_products_for_items(db: Session, items: list) -> dict[str, ProductRecord]:
+    product_ids = {i.product_id for i in items}
     if not product_ids:
         return {}
-    products = db.query(Products).filter(Products.id.in_(product_ids)).all()
-    return {str(p.id): p for p in products}
+    return get_product_records(db, product_ids)
 
 
-def _validate_cost_prices(items: list, products_by_id: dict[str, Products]) -> None:
+def _items_profit(items) -> Decimal:
+    return sum((Decimal(str(i.profit)) for i in items if i.profit is not None), Decimal("0"))
+
+
+def _validate_cost_prices(items: list, products_by_id: dict[str, ProductRecord], held_items=()) -> None:
+    # An edit may keep lines for a product deactivated since the order was placed.
+    held = {str(i.product_id) for i in held_items}
     missing = []
     for item in items:
         product = products_by_id.get(str(item.product_id))
         if not product:
             raise HTTPException(status_code=400, detail=f"Product {item.product_id} not found")
+        if not product.is_active and str(item.product_id) not in held:
+            raise HTTPException(status_code=400, detail=f"Product {item.product_id} is inactive")
         if product.cost_price_per_kg is None:
             missing.append({"product_id": str(product.id), "product_name": product.product_name})
 
@@ -52,6 +64,57 @@ def _validate_cost_prices(items: list, products_by_id: dict[str, Products]) -> N
         )
 
 
+def _check_stock_availability(
+    db: Session,
+    items: list,
+    products_by_id: dict[str, ProductRecord],
+    held_items: list | None = None,
+) -> None:
+    """
+    Rejects the write with 409 INSUFFICIENT_STOCK if available stock (on-hand minus
+    reserved) cannot cover the requested quantity of any product.
+
+    Reads every product's balance in one query and keeps the rows locked until commit,
+    so two orders cannot both claim the last stock. `held_items` are the order's current
+    items when editing: their reservation counts as available to this order, and a
+    product whose quantity is not increased is never rejected. Their products are locked
+    in the same sorted call, before any reservation is written, because the edit releases
+    their reservations too; locking only the new items would let two edits swapping
+    products take the rows in opposite orders and deadlock.
+    """
+    requested = reservation_deltas(items)
+    held = reservation_deltas(held_items or [])
+    backordered = {item.product_id for item in items if item.allow_backorder}
+
+    balances = lock_stock_rows(db, set(requested) | set(held))
+
+    shortfalls = []
+    for product_id, qty in requested.items():
+        if product_id in backordered or qty <= held.get(product_id, Decimal("0")):
+            continue
+        on_hand, reserved = balances[product_id]
+        available = on_hand - reserved + held.get(product_id, Decimal("0"))
+        if qty > available:
+            product = products_by_id[str(product_id)]
+            shortfalls.append({
+                "product_id": str(product_id),
+                "product_name": product.product_name,
+                "requested_kg": float(qty),
+                "available_kg": float(max(available, Decimal("0"))),
+                "shortfall_kg": float(qty - max(available, Decimal("0"))),
+            })
+
+    if shortfalls:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "code": "INSUFFICIENT_STOCK",
+                "message": "Not enough stock for some items. Reduce the quantity or set allow_backorder on the item.",
+                "shortfalls": shortfalls,
+            },
+        )
+
+
 @router.get('/', response_model=OrdersListResponse)
 def get_orders(
     search: str = Query(None),
@@ -126,6 +189,140 @@ def get_orders(
         logger.error("Error fetching orders", exc_info=True)
         raise
 
+AGEING_BUCKETS = ("days_0_30", "days_31_60", "days_61_90", "days_over_90")
+
+
+def _receivables_ageing_query(db: Session, as_of_date):
+    """
+    Outstanding Orders.total per customer, bucketed by IST days since the order date.
+
+    One GROUP BY over fulfilled orders that are not PAID (PARTIAL counts in full: part
+    payments are not recorded). The filter matches the partial index
+    ix_orders_receivable_customer_created, and the buckets compare created_at against
+    precomputed UTC bounds of IST days, so no per-row timezone conversion is needed.
+    """
+    # created_at >= start of the IST day N days back <=> at most N days old
+    start_30, start_60, start_90 = (ist_day_bounds(as_of_date - timedelta(days=n))[0] for n in (30, 60, 90))
+
+    def _bucket(condition):
+        return func.coalesce(func.sum(case((condition, Orders.total), else_=0)), 0)
+
+    ageing = (
+        db.query(
+            Orders.customer_id.label("customer_id"),
+            func.count().label("order_count"),
+            func.min(Orders.created_at).label("oldest_order_at"),
+            _bucket(Orders.created_at >= start_30).label("days_0_30"),
+            _bucket((Orders.created_at < start_30) & (Orders.created_at >= start_60)).label("days_31_60"),
+            _bucket((Orders.created_at < start_60) & (Orders.created_at >= start_90)).label("days_61_90"),
+            _bucket(Orders.created_at < start_90).label("days_over_90"),
+            func.sum(Orders.total).label("total"),
+        )
+        .filter(Orders.order_status == OrderStatus.FULFILLED)
+        .filter(Orders.payment_status != PaymentStatus.PAID)
+        .group_by(Orders.customer_id)
+        .subquery()
+    )
+    return (
+        db.query(ageing, Customers.customer_name, Customers.customer_phone_number)
+        .outerjoin(Customers, Customers.id == ageing.c.customer_id)
+        .order_by(ageing.c.total.desc(), ageing.c.customer_id)
+    )
+
+
+def _ageing_csv(rows: list, totals: dict):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    writer.writerow([
+        "customer_id", "customer_name", "customer_phone_number", "order_count", "oldest_order_date",
+        *AGEING_BUCKETS, "total",
+    ])
+    yield flush()
+    for r in rows:
+        writer.writerow([
+            r.customer_id,
+            r.customer_name or "",
+            r.customer_phone_number or "",
+            r.order_count,
+            r.oldest_order_at.astimezone(IST).date().isoformat(),
+            *(getattr(r, bucket) for bucket in AGEING_BUCKETS),
+            r.total,
+        ])
+        if buffer.tell() > 64 * 1024:
+            yield flush()
+    writer.writerow([
+        "", "TOTAL", "", totals["order_count"], "", *(totals[bucket] for bucket in AGEING_BUCKETS), totals["total"],
+    ])
+    yield flush()
+
+
+@router.get('/receivables/ageing', response_model=ReceivablesAgeingResponse)
+def get_receivables_ageing(
+    format: Literal["json", "csv"] = Query("json"),
+    limit: int = Query(100, ge=1, le=1000, description="Customers returned in JSON, largest balance first"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Receivables ageing as of today (IST): outstanding totals of fulfilled, unpaid or
+    partially paid orders per customer in 0-30 / 31-60 / 61-90 / over-90 day buckets.
+    JSON returns the book totals and the `limit` largest balances; format=csv streams
+    every customer.
+    """
+    as_of_date = now_ist().date()
+    logger.info(f"Fetching receivables ageing | as_of={as_of_date} | format={format}")
+
+    try:
+        rows = _receivables_ageing_query(db, as_of_date).all()
+
+        totals = {
+            "order_count": sum(r.order_count for r in rows),
+            **{
+                key: sum((Decimal(str(getattr(r, key))) for r in rows), Decimal("0"))
+                for key in (*AGEING_BUCKETS, "total")
+            },
+        }
+
+        if format == "csv":
+            return StreamingResponse(
+                _ageing_csv(rows, totals),
+                media_type="text/csv",
+                headers={"Content-Disposition": f"attachment; filename=receivables-ageing-{as_of_date.isoformat()}.csv"},
+            )
+
+        data = [
+            {
+                "customer_id": str(r.customer_id),
+                "customer_name": r.customer_name,
+                "customer_phone_number": r.customer_phone_number,
+                "order_count": r.order_count,
+                "oldest_order_date": r.oldest_order_at.astimezone(IST).date().isoformat(),
+                **{key: float(getattr(r, key)) for key in (*AGEING_BUCKETS, "total")},
+            }
+            for r in rows[:limit]
+        ]
+
+        logger.info(f"Receivables ageing computed | customers={len(rows)} | total={totals['total']}")
+        return {
+            "message": "Receivables ageing",
+            "as_of_date": as_of_date.isoformat(),
+            "count": len(rows),
+            "totals": {key: (value if key == "order_count" else float(value)) for key, value in totals.items()},
+            "data": data,
+        }
+
+    except Exception:
+        logger.error("Error computing receivables ageing", exc_info=True)
+        raise
+
+
 @router.get('/{order_id}/invoice', response_model=InvoiceResponse)
 def get_invoice(order_id: uuid.UUID, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     logger.info(f"Generating invoice data for order {order_id}")
@@ -230,6 +427,7 @@ def create_order(payload: CreateOrderRequest, db: Session = Depends(get_db), cur
 
         products_by_id = _load_products_for_items(db, payload.items)
         _validate_cost_prices(payload.items, products_by_id)
+        _check_stock_availability(db, payload.items, products_by_id)
 
         for item in payload.items:
             product = products_by_id[str(item.product_id)]
@@ -279,6 +477,11 @@ def create_order(payload: CreateOrderRequest, db: Session = Depends(get_db), cur
             )
             db.add(order_item)
 
+        adjust_reservations(db, reservation_deltas(payload.items))
+        apply_order_stats_change(
+            db, None, order_stats(new_order, sum((d["profit"] for d in order_items_data), Decimal("0")))
+        )
+
         db.commit()
         db.refresh(new_order)
 
@@ -293,7 +496,7 @@ def create_order(payload: CreateOrderRequest, db: Session = Depends(get_db), cur
 @router.patch('/{order_id}', response_model=dict)
 def update_order(order_id: str, payload: CreateOrderRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     logger.info(f"Updating order {order_id}")
-    order = db.query(Orders).filter(Orders.id == order_id).first()
+    order = db.query(Orders).filter(Orders.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
@@ -332,6 +535,7 @@ def update_order(order_id: str, payload: CreateOrderRequest, db: Session = Depen
             )
 
         existing_items = db.query(OrderItems).filter(OrderItems.order_id == order.id).all()
+        stats_before = order_stats(order, _items_profit(existing_items))
 
         if edit_mode in ("limited", "notes_only"):
             if str(payload.customer_id) != str(order.customer_id):
@@ -367,12 +571,19 @@ def update_order(order_id: str, payload: CreateOrderRequest, db: Session = Depen
         order.customer_phone_number = payload.customer_phone_number
         order.notes = payload.notes
 
+        # Net reservation change: release the old items, reserve the new ones.
+        deltas = reservation_deltas(existing_items, sign=-1)
+        for product_id, qty in reservation_deltas(payload.items).items():
+            deltas[product_id] = deltas.get(product_id, Decimal("0")) + qty
+
         db.query(OrderItems).filter(OrderItems.order_id == order.id).delete()
 
         subtotal = Decimal("0.00")
+        profit_total = Decimal("0.00")
 
         products_by_id = _load_products_for_items(db, payload.items)
-        _validate_cost_prices(payload.items, products_by_id)
+        _validate_cost_prices(payload.items, products_by_id, held_items=existing_items)
+        _check_stock_availability(db, payload.items, products_by_id, held_items=existing_items)
 
         for item in payload.items:
             product = products_by_id[str(item.product_id)]
@@ -381,6 +592,7 @@ def update_order(order_id: str, payload: CreateOrderRequest, db: Session = Depen
             line_total = money(item.quantity_kg * item.price_per_kg)
             profit = money((item.price_per_kg - cost_price) * item.quantity_kg)
             subtotal = money(subtotal + line_total)
+            profit_total += profit
             
             order_item = OrderItems(
                 order_id=order.id,
@@ -403,6 +615,9 @@ def update_order(order_id: str, payload: CreateOrderRequest, db: Session = Depen
         order.subtotal = subtotal
         order.total = money(subtotal + tax + shipping)
 
+        adjust_reservations(db, deltas)
+        apply_order_stats_change(db, stats_before, order_stats(order, profit_total))
+
         db.commit()
         logger.info(f"Order {order.order_number} updated successfully")
         return {"message": "Order updated successfully"}
@@ -415,13 +630,19 @@ def update_order(order_id: str, payload: CreateOrderRequest, db: Session = Depen
 @router.delete('/{order_id}', status_code=status.HTTP_204_NO_CONTENT)
 def delete_order(order_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     logger.info(f"Deleting order {order_id}")
-    order = db.query(Orders).filter(Orders.id == order_id).first()
+    order = db.query(Orders).filter(Orders.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     try:
+        if order.order_status == OrderStatus.PENDING:
+            existing_items = db.query(OrderItems).filter(OrderItems.order_id == order_id).all()
+            adjust_reservations(db, reservation_deltas(existing_items, sign=-1))
+
+        stats_before = order_stats(order, order_profit(db, order.id))
         db.query(OrderItems).filter(OrderItems.order_id == order_id).delete()
         db.delete(order)
+        apply_order_stats_change(db, stats_before, None)
         db.commit()
         return None
     except Exception:
@@ -431,7 +652,7 @@ def delete_order(order_id: str, db: Session = Depends(get_db), current_user=Depe
 
 @router.patch("/{order_id}/status/", response_model=dict)
 def update_order_status(order_id: str, payload: dict, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    order = db.query(Orders).filter(Orders.id == order_id).first()
+    order = db.query(Orders).filter(Orders.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -451,28 +672,40 @@ def update_order_status(order_id: str, payload: dict, db: Session = Depends(get_
             detail=f"Order status is locked ({order.order_status.value})"
         )
 
+    order_items = db.query(OrderItems).filter(OrderItems.order_id == order_id).all()
+    stats_before = order_stats(order, _items_profit(order_items))
+
+    # Take every stock row this order touches up front, in a stable order, so the
+    # per-item writes below cannot deadlock with another multi-product order.
+    lock_stock_rows(db, [item.product_id for item in order_items])
+
+    # Leaving PENDING (fulfilled or cancelled) releases the order's reservations.
+    adjust_reservations(db, reservation_deltas(order_items, sign=-1))
+
     if new_status == OrderStatus.FULFILLED:
         if not order.invoice_number:
             order.invoice_number = generate_invoice_number(db)
-        
-        order_items = db.query(OrderItems).filter(OrderItems.order_id == order_id).all()
+
         for item in order_items:
-            transaction = InventoryTransactions(
-                product_id=item.product_id,
-                action=InventoryActions.DEDUCT,
-                quantity_kg=item.quantity_kg,
-                notes=f"Deducted for Order {order.order_number}"
+            record_inventory_transaction(
+                db,
+                item.product_id,
+                InventoryActions.DEDUCT,
+                item.quantity_kg,
+                notes=f"Deducted for Order {order.order_number}",
+                order_id=order.id,
             )
-            db.add(transaction)
 
     order.order_status = new_status
+    apply_order_stats_change(db, stats_before, order_stats(order, _items_profit(order_items)))
     db.commit()
     logger.info(f"Order {order.order_number} status updated to {order.order_status}")
     return {"message": "Status updated successfully", "status": order.order_status}
 
 @router.patch("/{order_id}/payment-status/", response_model=dict)
 def update_payment_status(order_id: str, payload: dict, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    order = db.query(Orders).filter(Orders.id == order_id).first()
+    # Locked so concurrent payment updates apply their customer_stats changes one at a time.
+    order = db.query(Orders).filter(Orders.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
@@ -499,7 +732,10 @@ def update_payment_status(order_id: str, payload: dict, db: Session = Depends(ge
             detail="Payment status is locked (paid)"
         )
 
+    profit = order_profit(db, order.id)
+    stats_before = order_stats(order, profit)
     order.payment_status = new_status
+    apply_order_stats_change(db, stats_before, order_stats(order, profit))
     db.commit()
     logger.info(f"Order {order.order_number} payment status updated to {order.payment_status}")
     return {"message": "Payment status updated successfully", "status": order.payment_status}
@@ -519,11 +755,10 @@ def download_invoice(order_id: str, db: Session = Depends(get_db), current_user=
     download_filename = f"{order.invoice_number}.pdf"
     storage_filename = f"{order.invoice_number}.pdf"
     
-    existing_url = check_invoice_exists(storage_filename)
-    if existing_url:
-        logger.info(f"Found existing PDF in storage: {existing_url}")
-        resp = requests.get(existing_url)
-        return Response(content=resp.content, media_type="application/pdf", headers={
+    existing_pdf = read_invoice(storage_filename)
+    if existing_pdf is not None:
+        logger.info(f"Found existing PDF in storage: {storage_filename}")
+        return Response(content=existing_pdf, media_type="application/pdf", headers={
             "Content-Disposition": f"attachment; filename={download_filename}"
         })
 
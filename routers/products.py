@@ -1,7 +1,15 @@
+import csv
+import io
+import json
+import uuid
 from decimal import Decimal, InvalidOperation
 
-from fastapi import APIRouter, status, HTTPException, Request, UploadFile
+from fastapi import APIRouter, status, HTTPException, Query, Request, Response, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 from fastapi.params import Depends
+from sqlalchemy import Numeric, cast, column, func, literal_column, or_, update, values
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from starlette.datastructures import UploadFile as StarletteUploadFile
@@ -11,8 +19,12 @@ from database.database import get_db
 from database.database_models import Products
 from dependencies.auth import get_current_user
 from dependencies.roles import admin_required
-from schemas.pydantic_models import AddProductModel, EditProductModel
-from utils.storage import upload_image_to_supabase
+from schemas.pydantic_models import AddProductModel, EditProductModel, ProductBulkResponse, ProductSearchResponse
+from utils.catalogue_cache import catalogue_cache
+from utils.stock_alerts import mark_stock_touched
+from utils.image_pipeline import ingest_image_async
+from utils.price_history import record_price_change, record_price_changes
+from utils.product_search import MAX_SEARCH_LIMIT, search_products
 
 logger = get_logger(__name__)
 
@@ -77,7 +89,213 @@ def _validate_cost(cost: Decimal | None, required: bool) -> Decimal | None:
     return cost
 
 
-def _upload_image_if_present(upload: UploadFile | None) -> str | None:
+BULK_MAX_ROWS = 5000
+_PRICE_LIMIT = Decimal("100000000")  # Numeric(10, 2)
+
+
+def _read_bulk_csv(text: str) -> list[tuple[int, dict]]:
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames is None:
+        return []
+    reader.fieldnames = [(name or "").strip().lower() for name in reader.fieldnames]
+    if not ({"product_id", "product_name", "name"} & set(reader.fieldnames)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CSV header must contain product_id or product_name",
+        )
+    # Line 1 is the header.
+    return [(index + 2, row) for index, row in enumerate(reader)]
+
+
+def _bulk_field(raw: dict, *keys: str) -> str:
+    for key in keys:
+        value = raw.get(key)
+        if value is not None and str(value).strip() != "":
+            return str(value).strip()
+    return ""
+
+
+def _check_amount(value: Decimal | None, label: str) -> Decimal | None:
+    if value is None:
+        return None
+    if not value.is_finite() or value >= _PRICE_LIMIT:
+        raise HTTPException(status_code=422, detail=f"Invalid {label}")
+    if value != value.quantize(Decimal("0.01")):
+        raise HTTPException(status_code=422, detail=f"{label.capitalize()} supports at most 2 decimal places")
+    return value
+
+
+def _parse_bulk_row(raw: dict, report: dict):
+    """(product_id, name, price, cost, image); fills report["error"] and returns None if unusable."""
+    raw_id = _bulk_field(raw, "product_id", "id")
+    try:
+        product_id = uuid.UUID(raw_id) if raw_id else None
+        name = _validate_name(_bulk_field(raw, "product_name", "name") or None, required=product_id is None)
+        price = _check_amount(_parse_price(_bulk_field(raw, "product_price", "price", "price_per_kg") or None), "price")
+        price = _validate_price(price, required=False)
+        cost = _check_amount(_parse_cost(_bulk_field(raw, "cost_price_per_kg", "cost_price", "cost") or None), "cost price")
+        cost = _validate_cost(cost, required=False)
+    except ValueError:
+        report["error"] = "Invalid product_id"
+        return None
+    except HTTPException as e:
+        report["error"] = e.detail
+        return None
+
+    if price is None and cost is None:
+        report["error"] = "Nothing to update: price or cost_price_per_kg is required"
+        return None
+    return product_id, name, price, cost, _bulk_field(raw, "product_image", "image") or None
+
+
+def _apply_bulk_prices(db: Session, lines: list[tuple[int, dict]], changed_by: str | None = None) -> list[dict]:
+    report = [{"line": line, "status": "ERROR", "error": None} for line, _ in lines]
+    parsed = [_parse_bulk_row(raw, entry) for (_, raw), entry in zip(lines, report)]
+
+    # --- Resolve every referenced product in one query ---
+    ids = {row[0] for row in parsed if row and row[0]}
+    names = {row[1].lower() for row in parsed if row and not row[0]}
+    conditions = []
+    if ids:
+        conditions.append(Products.id.in_(ids))
+    if names:
+        conditions.append(func.lower(Products.product_name).in_(names))
+    products = (
+        db.query(Products.id, Products.product_name, Products.price_per_kg, Products.cost_price_per_kg,
+                 Products.is_active)
+        .filter(or_(*conditions))
+        .all()
+        if conditions else []
+    )
+    by_id = {p.id: p for p in products}
+    by_name = {p.product_name.lower(): p for p in products}
+
+    updates = []
+    creates = []
+    seen: dict = {}
+    for row, entry in zip(parsed, report):
+        if row is None:
+            continue
+        product_id, name, price, cost, image = row
+        product = by_id.get(product_id) if product_id else by_name.get(name.lower())
+        key = product.id if product else name.lower()
+        if key in seen:
+            entry["error"] = f"Duplicate of line {seen[key]}"
+            continue
+        seen[key] = entry["line"]
+
+        if product is None:
+            if product_id:
+                entry["error"] = "Product not found"
+                continue
+            # New product: same requirements as POST /products/ minus the image.
+            if price is None:
+                entry["error"] = "Product price is required"
+                continue
+            if cost is None:
+                entry["error"] = "Cost price is required"
+                continue
+            entry.update(product_name=name, price=float(price), cost_price_per_kg=float(cost), status="CREATED")
+            creates.append({"name": name, "price": price, "cost": cost, "image": image, "entry": entry})
+            continue
+
+        if not product.is_active:
+            entry["error"] = "Inactive product"
+            continue
+
+        new_price = price if price is not None else product.price_per_kg
+        new_cost = cost if cost is not None else product.cost_price_per_kg
+        entry.update(
+            product_id=product.id,
+            product_name=product.product_name,
+            previous_price=float(product.price_per_kg),
+            price=float(new_price),
+            previous_cost_price_per_kg=float(product.cost_price_per_kg) if product.cost_price_per_kg is not None else None,
+            cost_price_per_kg=float(new_cost) if new_cost is not None else None,
+        )
+        if new_price == product.price_per_kg and new_cost == product.cost_price_per_kg:
+            entry["status"] = "UNCHANGED"
+            continue
+        entry["status"] = "UPDATED"
+        updates.append((product.id, new_price, new_cost))
+
+    if any(entry["error"] for entry in report):
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                "code": "BULK_PRICE_REJECTED",
+                "message": "Price list not applied; fix the failing lines and resubmit",
+                "lines": [
+                    {**entry, "product_id": str(entry["product_id"]) if entry.get("product_id") else None}
+                    for entry in report
+                    if entry["error"]
+                ],
+            },
+        )
+
+    if updates:
+        # One UPDATE ... FROM (VALUES ...) for every changed product.
+        changes = (
+            values(
+                column("id", UUID(as_uuid=True)),
+                column("price", Numeric(10, 2)),
+                column("cost", Numeric(10, 2)),
+                name="changes",
+            )
+            .data(updates)
+        )
+        db.execute(
+            update(Products)
+            .where(Products.id == changes.c.id)
+            # VALUES parameters are untyped in Postgres; cast back to the column type.
+            .values(
+                price_per_kg=cast(changes.c.price, Numeric(10, 2)),
+                cost_price_per_kg=cast(changes.c.cost, Numeric(10, 2)),
+            ),
+            execution_options={"synchronize_session": False},
+        )
+        record_price_changes(db, updates, source="bulk", changed_by=changed_by)
+
+    if creates:
+        # A concurrent insert of the same name turns into an update instead of failing the batch.
+        stmt = pg_insert(Products).values([
+            {
+                "id": uuid.uuid4(),
+                "product_name": item["name"],
+                "price_per_kg": item["price"],
+                "cost_price_per_kg": item["cost"],
+                "product_image": item["image"],
+            }
+            for item in creates
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[func.lower(Products.product_name)],
+            set_={
+                "price_per_kg": stmt.excluded.price_per_kg,
+                "cost_price_per_kg": stmt.excluded.cost_price_per_kg,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ).returning(Products.id, Products.product_name, literal_column("xmax = 0"))
+        created = {name.lower(): (product_id, inserted) for product_id, name, inserted in db.execute(stmt)}
+        for item in creates:
+            product_id, inserted = created[item["name"].lower()]
+            item["entry"]["product_id"] = product_id
+            if not inserted:
+                item["entry"]["status"] = "UPDATED"
+        record_price_changes(
+            db,
+            [(item["entry"]["product_id"], item["price"], item["cost"]) for item in creates],
+            source="bulk",
+            changed_by=changed_by,
+        )
+
+    db.commit()
+    return report
+
+
+async def _upload_image_if_present(upload: UploadFile | None) -> dict[str, str] | None:
+    """{variant: url} for the processed upload; "full" is the main product image."""
     if not upload:
         return None
     if upload.content_type not in ALLOWED_IMAGE_TYPES:
@@ -85,33 +303,159 @@ def _upload_image_if_present(upload: UploadFile | None) -> str | None:
             status_code=400,
             detail="Invalid image type. Allowed: png, jpg, jpeg, webp",
         )
-    return upload_image_to_supabase(upload, folder="products")
+    return await ingest_image_async(upload, folder="products")
 
 
-@router.get('/')
-def get_products(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    logger.info(f"Fetching products list | requested_by={current_user['sub']}")
+def _catalogue_headers(etag: str) -> dict:
+    # Role-specific body (admins see cost), so shared caches must not store it;
+    # clients revalidate every time and normally get a 304.
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
 
+
+@router.get('/')
+def get_products(request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     is_admin = current_user.get("role") == "admin"
-    products = db.query(Products).filter(Products.is_active == True).all()
+    role = "admin" if is_admin else "user"
+
+    version = catalogue_cache.version(db)
+    etag = f'W/"{version}-{role}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_catalogue_headers(etag))
+
+    body = catalogue_cache.get_body(role, version)
+    if body is None:
+        logger.info(f"Building products list | requested_by={current_user['sub']} | role={role}")
+
+        products = db.query(Products).filter(Products.is_active == True).all()
+
+        response = [
+            {
+                "id": str(product.id),
+                "name": product.product_name,
+                "price": product.price_per_kg,
+                "has_cost_price": product.cost_price_per_kg is not None,
+                "cost_price_per_kg": float(product.cost_price_per_kg) if (is_admin and product.cost_price_per_kg is not None) else None,
+                # List views get the small thumbnail; image_full is for detail views.
+                "image": (product.product_image_variants or {}).get("small", product.product_image),
+                "image_full": product.product_image,
+                "is_active": product.is_active,
+            }
+            for product in products
+        ]
+        logger.info(f"Products list built | count={len(response)}")
+
+        body = json.dumps(
+            jsonable_encoder({"products": response, "total": len(response)}),
+            separators=(",", ":"),
+        ).encode("utf-8")
+        catalogue_cache.put_body(role, version, body)
+
+    return Response(content=body, media_type="application/json", headers=_catalogue_headers(etag))
+
+
+@router.get('/search', response_model=ProductSearchResponse)
+def product_search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=MAX_SEARCH_LIMIT),
+    include_inactive: bool = False,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Prefix matches first, then closest names; tolerates misspellings."""
+    include_inactive = include_inactive and current_user.get("role") == "admin"
+    try:
+        rows = search_products(db, q, limit=limit, include_inactive=include_inactive)
+    except Exception:
+        logger.error(f"Product search failed | q={q!r}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to search products")
 
-    response = [
+    data = [
         {
-            "id": str(product.id),
+            "id": product.id,
             "name": product.product_name,
             "price": product.price_per_kg,
-            "has_cost_price": product.cost_price_per_kg is not None,
-            "cost_price_per_kg": float(product.cost_price_per_kg) if (is_admin and product.cost_price_per_kg is not None) else None,
-            "image": product.product_image,
+            "image": (product.product_image_variants or {}).get("thumb", product.product_image),
             "is_active": product.is_active,
+            "is_prefix": bool(is_prefix),
+            "score": round(float(score or 0), 4),
         }
-        for product in products
+        for product, is_prefix, score in rows
     ]
-    logger.info(f"Products list fetched successfully | count={len(response)}")
+    return {"message": "Products fetched successfully", "query": q, "count": len(data), "data": data}
+
+
+@router.post('/bulk', response_model=ProductBulkResponse)
+async def bulk_update_products(request: Request, db: Session = Depends(get_db), current_user=Depends(admin_required)):
+    """
+    Price-list import. Each row names a product by product_id or product_name and sets
+    its price and/or cost_price_per_kg; a product_name that does not exist is created
+    (price and cost required, product_image optional).
+    Accepts JSON ({"items": [...]}), a text/csv body, or a multipart upload in field "file".
+    All rows are applied in one transaction, or none are.
+    """
+    logger.info(f"Bulk product update initiated | by_admin={current_user.get('sub')}")
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        payload = await request.json()
+        if isinstance(payload, dict):
+            payload = payload.get("items")
+        if not isinstance(payload, list) or not all(isinstance(item, dict) for item in payload):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="items must be a list of objects")
+        lines = [(index + 1, item) for index, item in enumerate(payload)]
+    else:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV file is required")
+            raw = await upload.read()
+        else:
+            raw = await request.body()
+        try:
+            text = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV must be UTF-8 encoded")
+        lines = _read_bulk_csv(text)
+
+    if not lines:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Price list has no rows")
+    if len(lines) > BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Price list is limited to {BULK_MAX_ROWS} rows",
+        )
+
+    try:
+        report = await run_in_threadpool(_apply_bulk_prices, db, lines, current_user.get("sub"))
+
+    except HTTPException:
+        raise
+
+    except Exception:
+        db.rollback()
+        logger.error("Error applying bulk product update", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to apply price list"
+        )
+
+    catalogue_cache.invalidate()
+    counts = {key: sum(1 for entry in report if entry["status"] == key) for key in ("CREATED", "UPDATED", "UNCHANGED")}
+    logger.info(
+        f"Bulk product update applied | rows={len(report)} | created={counts['CREATED']} | "
+        f"updated={counts['UPDATED']} | unchanged={counts['UNCHANGED']}"
+    )
 
     return {
-        "products": response,
-        "total": len(response),
+        "message": "Price list applied successfully",
+        "count": len(report),
+        "created": counts["CREATED"],
+        "updated": counts["UPDATED"],
+        "unchanged": counts["UNCHANGED"],
+        "data": report,
     }
 
 
@@ -119,6 +463,7 @@ def get_products(db: Session = Depends(get_db), current_user=Depends(get_current
 async def add_product(request: Request, db: Session = Depends(get_db), current_user=Depends(admin_required)):
     logger.info(f"Adding New Product | requested_by={current_user['sub']}")
 
+    image_variants = None
     content_type = request.headers.get("content-type", "")
     if content_type.startswith("application/json"):
         payload = await request.json()
@@ -141,14 +486,15 @@ async def add_product(request: Request, db: Session = Depends(get_db), current_u
 
         product_image = None
         if upload:
-            product_image = _upload_image_if_present(upload)
+            image_variants = await _upload_image_if_present(upload)
+            product_image = image_variants["full"]
         elif isinstance(raw_image, str) and raw_image.strip():
             product_image = raw_image.strip()
 
         if not product_image:
             raise HTTPException(status_code=422, detail="Product image is required")
 
-    existing_product = db.query(Products).filter(Products.product_name.ilike(product_name)).first()
+    existing_product = db.query(Products).filter(func.lower(Products.product_name) == product_name.lower()).first()
 
     if existing_product:
         logger.warning(f"Product already exists | name={product_name}")
@@ -158,12 +504,17 @@ async def add_product(request: Request, db: Session = Depends(get_db), current_u
         product_name=product_name,
         price_per_kg=product_price,
         cost_price_per_kg=cost_price,
-        product_image=product_image
+        product_image=product_image,
+        product_image_variants=image_variants,
     )
 
     try:
         db.add(product)
+        db.flush()
+        record_price_change(db, product.id, product_price, cost_price, source="create",
+                            changed_by=current_user.get("sub"))
         db.commit()
+        catalogue_cache.invalidate()
         db.refresh(product)
     except IntegrityError:
         db.rollback()
@@ -179,6 +530,7 @@ async def add_product(request: Request, db: Session = Depends(get_db), current_u
             "product_price": product.price_per_kg,
             "cost_price_per_kg": product.cost_price_per_kg,
             "product_image": product.product_image,
+            "product_image_variants": product.product_image_variants,
             "is_active": product.is_active,
         }
     }
@@ -198,6 +550,7 @@ async def edit_product(product_id: str, request: Request, db: Session = Depends(
         logger.warning(f"Product is not active | product_id={product_id}")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive product")
 
+    image_variants = None
     content_type = request.headers.get("content-type", "")
     if content_type.startswith("application/json"):
         payload = await request.json()
@@ -220,13 +573,14 @@ async def edit_product(product_id: str, request: Request, db: Session = Depends(
 
         product_image = None
         if upload:
-            product_image = _upload_image_if_present(upload)
+            image_variants = await _upload_image_if_present(upload)
+            product_image = image_variants["full"]
         elif isinstance(raw_image, str) and raw_image.strip():
             product_image = raw_image.strip()
 
     if product_name is not None:
         existing = db.query(Products).filter(
-            Products.product_name.ilike(product_name),
+            func.lower(Products.product_name) == product_name.lower(),
             Products.id != product.id
         ).first()
 
@@ -238,17 +592,26 @@ async def edit_product(product_id: str, request: Request, db: Session = Depends(
 
         product.product_name = product_name
 
+    previous_prices = (product.price_per_kg, product.cost_price_per_kg)
+
     if product_price is not None:
         product.price_per_kg = product_price
 
     if cost_price is not None:
         product.cost_price_per_kg = cost_price
 
+    if (product.price_per_kg, product.cost_price_per_kg) != previous_prices:
+        record_price_change(db, product.id, product.price_per_kg, product.cost_price_per_kg, source="edit",
+                            changed_by=current_user.get("sub"))
+
     if product_image is not None:
         product.product_image = product_image
+        # A plain URL has no processed variants; drop the old ones with the old image.
+        product.product_image_variants = image_variants
 
     try:
         db.commit()
+        catalogue_cache.invalidate()
         db.refresh(product)
     except IntegrityError:
         db.rollback()
@@ -283,6 +646,7 @@ def delete_product(product_id: str, db: Session = Depends(get_db), current_user=
     product.is_active = False
     try:
         db.commit()
+        catalogue_cache.invalidate()
         db.refresh(product)
     except IntegrityError:
         db.rollback()
@@ -322,8 +686,11 @@ def update_min_stock(product_id: str, payload: dict, db: Session = Depends(get_d
 
         old_value = product.min_stock_kg
         product.min_stock_kg = min_stock
+        # A new threshold can cross it without any stock movement.
+        mark_stock_touched(db, [product.id])
 
         db.commit()
+        catalogue_cache.invalidate()
         db.refresh(product)
 
         logger.info(
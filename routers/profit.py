@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import uuid
 from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Literal
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import Date, case, cast, func, true
 from sqlalchemy.orm import Session
 
 from core.logger import get_logger
@@ -11,10 +14,14 @@ from database.database import get_db
 from database.database_models import OrderItems, Orders, OrderStatus, PaymentStatus, Products
 from dependencies.roles import admin_required
 from schemas.pydantic_models import (
+    MarginTrendResponse,
     ProfitOrdersResponse,
     ProfitProductsResponse,
     ProfitSummaryResponse,
 )
+from utils import profit_snapshot
+from utils.pagination import decode_cursor, keyset_page
+from utils.price_history import price_as_of
 from utils.timezone import IST, ist_date_range_bounds, ist_day_bounds, ist_month_to_date_bounds, now_ist
 
 logger = get_logger(__name__)
@@ -80,6 +87,12 @@ def get_profit_summary(db: Session = Depends(get_db), current_user=Depends(admin
         q = db.query(func.count(base.c.order_id)).filter(base.c.profit.is_(None))
         return int(q.scalar() or 0)
 
+    snapshot = profit_snapshot.get_snapshot(db)
+    if snapshot is not None:
+        _sum_profit_between = snapshot.profit_between
+        _count_orders_between = snapshot.orders_between
+        _count_missing_profit_orders = snapshot.missing_profit_orders
+
     accrued_total = _sum_profit_between(None, None, paid_only=False)
     accrued_today = _sum_profit_between(today_utc_start, today_utc_end, paid_only=False)
     accrued_month = _sum_profit_between(month_utc_start, month_utc_end, paid_only=False)
@@ -119,113 +132,224 @@ def get_profit_summary(db: Session = Depends(get_db), current_user=Depends(admin
     }
 
 
+def _period(from_date: date | None, to_date: date | None) -> dict:
+    return {
+        "from": from_date.isoformat() if from_date else None,
+        "to": to_date.isoformat() if to_date else None,
+        "timezone": "Asia/Kolkata",
+    }
+
+
+def _margin_expr(revenue, profit):
+    # NULL margin only happens for zero revenue; it sorts as 0 so keyset comparisons stay total.
+    # Rounded so the value round-trips exactly through a cursor.
+    return case((revenue > 0, func.round(profit * 100 / revenue, 6)), else_=None)
+
+
+def _fulfilled_items_query(db: Session, start_utc: datetime | None, end_utc: datetime | None, *columns):
+    q = (
+        db.query(*columns)
+        .select_from(OrderItems)
+        .join(Orders, Orders.id == OrderItems.order_id)
+        .filter(Orders.order_status == OrderStatus.FULFILLED)
+        .filter(OrderItems.profit.isnot(None))
+    )
+    if start_utc is not None:
+        q = q.filter(Orders.created_at >= start_utc)
+    if end_utc is not None:
+        q = q.filter(Orders.created_at < end_utc)
+    return q
+
+
+def _period_totals(db: Session, start_utc: datetime | None, end_utc: datetime | None) -> dict:
+    row = _fulfilled_items_query(
+        db,
+        start_utc,
+        end_utc,
+        func.count(func.distinct(Orders.id)).label("order_count"),
+        func.count(func.distinct(OrderItems.product_id)).label("product_count"),
+        func.coalesce(func.sum(OrderItems.quantity_kg), 0).label("quantity_sold_kg"),
+        func.coalesce(func.sum(OrderItems.line_total), 0).label("revenue"),
+        func.coalesce(func.sum(OrderItems.profit), 0).label("profit"),
+    ).one()
+
+    revenue = float(row.revenue or 0)
+    profit = float(row.profit or 0)
+    margin = (profit / revenue * 100) if revenue > 0 else None
+    return {
+        "order_count": int(row.order_count or 0),
+        "product_count": int(row.product_count or 0),
+        "quantity_sold_kg": float(row.quantity_sold_kg or 0),
+        "revenue": round(revenue, 2),
+        "profit": round(profit, 2),
+        "margin_percent": round(margin, 2) if margin is not None else None,
+    }
+
+
+def _keyset_page(q, sort_col, id_col, sort_by: str, order: str, cursor: str | None, limit: int):
+    """(sort value, id) keyset pagination in SQL; rows must expose sort_value and row_id."""
+    after = decode_cursor(cursor, 2)
+    if after is not None:
+        try:
+            sort_value = datetime.fromisoformat(after[0]) if sort_by == "date" else Decimal(after[0])
+            after = (sort_value, uuid.UUID(after[1]))
+        except (TypeError, ValueError, ArithmeticError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    def _cursor_values(row):
+        value = row.sort_value
+        return [value.isoformat() if isinstance(value, datetime) else str(value), str(row.row_id)]
+
+    return keyset_page(q, sort_col, id_col, order, after, limit, _cursor_values)
+
+
 @router.get("/products", response_model=ProfitProductsResponse)
 def get_profit_by_product(
     from_date: date | None = Query(None),
     to_date: date | None = Query(None),
+    sort_by: Literal["profit", "revenue", "margin", "date"] = Query("profit"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None),
     db: Session = Depends(get_db),
     current_user=Depends(admin_required),
 ):
     """
     Aggregates profit by product for FULFILLED orders.
     Profit is computed from stored OrderItems snapshots and excluded if profit is NULL.
+    Sorting, keyset pagination (top-N via limit) and period totals are all computed in SQL
+    (or from the in-process profit snapshot when enabled); `date` sorts by each product's
+    most recent sale.
     """
     start_utc, end_utc = ist_date_range_bounds(from_date, to_date)
 
+    snapshot = profit_snapshot.get_snapshot(db)
+    if snapshot is not None:
+        items, next_cursor = snapshot.product_page(start_utc, end_utc, sort_by, order, cursor, limit)
+        totals = snapshot.totals(start_utc, end_utc)
+    else:
+        items, next_cursor = _profit_by_product_sql(db, start_utc, end_utc, sort_by, order, cursor, limit)
+        totals = _period_totals(db, start_utc, end_utc)
+
+    return {
+        "currency": "INR",
+        "period": _period(from_date, to_date),
+        "totals": totals,
+        "items": items,
+        "next_cursor": next_cursor,
+    }
+
+
+def _profit_by_product_sql(db: Session, start_utc, end_utc, sort_by: str, order: str, cursor: str | None, limit: int):
+    revenue = func.coalesce(func.sum(OrderItems.line_total), 0)
+    profit = func.coalesce(func.sum(OrderItems.profit), 0)
+    agg = _fulfilled_items_query(
+        db,
+        start_utc,
+        end_utc,
+        OrderItems.product_id.label("product_id"),
+        func.coalesce(func.sum(OrderItems.quantity_kg), 0).label("quantity_sold_kg"),
+        revenue.label("revenue"),
+        profit.label("profit"),
+        _margin_expr(revenue, profit).label("margin_percent"),
+        func.max(Orders.created_at).label("last_order_at"),
+    ).group_by(OrderItems.product_id).subquery()
+
+    sort_col = {
+        "profit": agg.c.profit,
+        "revenue": agg.c.revenue,
+        "margin": func.coalesce(agg.c.margin_percent, 0),
+        "date": agg.c.last_order_at,
+    }[sort_by]
+
     q = (
         db.query(
-            Products.id.label("product_id"),
+            agg,
             Products.product_name.label("product_name"),
-            func.coalesce(func.sum(OrderItems.quantity_kg), 0).label("quantity_sold_kg"),
-            func.coalesce(func.sum(OrderItems.line_total), 0).label("revenue"),
-            func.coalesce(func.sum(OrderItems.profit), 0).label("profit"),
+            sort_col.label("sort_value"),
+            agg.c.product_id.label("row_id"),
         )
-        .join(OrderItems, OrderItems.product_id == Products.id)
-        .join(Orders, Orders.id == OrderItems.order_id)
-        .filter(Orders.order_status == OrderStatus.FULFILLED)
-        .filter(OrderItems.profit.isnot(None))
-        .group_by(Products.id, Products.product_name)
+        .join(Products, Products.id == agg.c.product_id)
     )
+    rows, next_cursor = _keyset_page(q, sort_col, agg.c.product_id, sort_by, order, cursor, limit)
 
-    if start_utc is not None:
-        q = q.filter(Orders.created_at >= start_utc)
-    if end_utc is not None:
-        q = q.filter(Orders.created_at < end_utc)
-
-    rows = q.order_by(func.sum(OrderItems.profit).desc()).all()
-
-    items = []
-    for r in rows:
-        revenue = float(r.revenue or 0)
-        profit = float(r.profit or 0)
-        margin = (profit / revenue * 100) if revenue > 0 else None
-        items.append(
-            {
-                "product_id": r.product_id,
-                "product_name": r.product_name,
-                "quantity_sold_kg": float(r.quantity_sold_kg or 0),
-                "revenue": round(revenue, 2),
-                "profit": round(profit, 2),
-                "margin_percent": round(margin, 2) if margin is not None else None,
-            }
-        )
-
-    return {
-        "currency": "INR",
-        "period": {
-            "from": from_date.isoformat() if from_date else None,
-            "to": to_date.isoformat() if to_date else None,
-            "timezone": "Asia/Kolkata",
-        },
-        "items": items,
-    }
+    return [
+        {
+            "product_id": r.product_id,
+            "product_name": r.product_name,
+            "quantity_sold_kg": float(r.quantity_sold_kg or 0),
+            "revenue": round(float(r.revenue or 0), 2),
+            "profit": round(float(r.profit or 0), 2),
+            "margin_percent": round(float(r.margin_percent), 2) if r.margin_percent is not None else None,
+            "last_order_date": r.last_order_at.astimezone(IST).strftime("%Y-%m-%d") if r.last_order_at else None,
+        }
+        for r in rows
+    ], next_cursor
 
 
 @router.get("/orders", response_model=ProfitOrdersResponse)
 def get_profit_by_order(
     from_date: date | None = Query(None),
     to_date: date | None = Query(None),
+    sort_by: Literal["profit", "revenue", "margin", "date"] = Query("date"),
+    order: Literal["asc", "desc"] = Query("desc"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None),
     db: Session = Depends(get_db),
     current_user=Depends(admin_required),
 ):
     """
     Profit per order for FULFILLED orders.
     Excludes orders whose OrderItems profit is NULL (incomplete cost snapshot).
+    Sorting, keyset pagination (top-N via limit) and period totals are all computed in SQL
+    (or from the in-process profit snapshot when enabled).
     """
     start_utc, end_utc = ist_date_range_bounds(from_date, to_date)
 
-    order_profit_subq = (
-        db.query(
-            OrderItems.order_id.label("order_id"),
-            func.sum(OrderItems.line_total).label("revenue"),
-            func.sum(OrderItems.profit).label("profit"),
-        )
-        .filter(OrderItems.profit.isnot(None))
-        .group_by(OrderItems.order_id)
-        .subquery()
-    )
+    snapshot = profit_snapshot.get_snapshot(db)
+    if snapshot is not None:
+        orders, next_cursor = snapshot.order_page(start_utc, end_utc, sort_by, order, cursor, limit)
+        totals = snapshot.totals(start_utc, end_utc)
+    else:
+        orders, next_cursor = _profit_by_order_sql(db, start_utc, end_utc, sort_by, order, cursor, limit)
+        totals = _period_totals(db, start_utc, end_utc)
 
-    q = (
-        db.query(
-            Orders.id.label("order_id"),
-            Orders.order_number.label("order_number"),
-            Orders.created_at.label("created_at"),
-            Orders.payment_status.label("payment_status"),
-            order_profit_subq.c.revenue.label("revenue"),
-            order_profit_subq.c.profit.label("profit"),
-        )
-        .join(order_profit_subq, order_profit_subq.c.order_id == Orders.id)
-        .filter(Orders.order_status == OrderStatus.FULFILLED)
-    )
-
-    if start_utc is not None:
-        q = q.filter(Orders.created_at >= start_utc)
-    if end_utc is not None:
-        q = q.filter(Orders.created_at < end_utc)
+    return {
+        "currency": "INR",
+        "period": _period(from_date, to_date),
+        "totals": totals,
+        "orders": orders,
+        "next_cursor": next_cursor,
+    }
 
-    rows = q.order_by(Orders.created_at.desc()).all()
 
-    orders = [
+def _profit_by_order_sql(db: Session, start_utc, end_utc, sort_by: str, order: str, cursor: str | None, limit: int):
+    revenue = func.sum(OrderItems.line_total)
+    profit = func.sum(OrderItems.profit)
+    agg = _fulfilled_items_query(
+        db,
+        start_utc,
+        end_utc,
+        Orders.id.label("order_id"),
+        Orders.order_number.label("order_number"),
+        Orders.created_at.label("created_at"),
+        Orders.payment_status.label("payment_status"),
+        revenue.label("revenue"),
+        profit.label("profit"),
+        _margin_expr(revenue, profit).label("margin_percent"),
+    ).group_by(Orders.id, Orders.order_number, Orders.created_at, Orders.payment_status).subquery()
+
+    sort_col = {
+        "profit": agg.c.profit,
+        "revenue": agg.c.revenue,
+        "margin": func.coalesce(agg.c.margin_percent, 0),
+        "date": agg.c.created_at,
+    }[sort_by]
+
+    q = db.query(agg, sort_col.label("sort_value"), agg.c.order_id.label("row_id"))
+    rows, next_cursor = _keyset_page(q, sort_col, agg.c.order_id, sort_by, order, cursor, limit)
+
+    return [
         {
             "order_id": r.order_id,
             "order_number": r.order_number,
@@ -233,17 +357,88 @@ def get_profit_by_order(
             "payment_status": r.payment_status.name,
             "revenue": round(float(r.revenue or 0), 2),
             "profit": round(float(r.profit or 0), 2),
+            "margin_percent": round(float(r.margin_percent), 2) if r.margin_percent is not None else None,
+        }
+        for r in rows
+    ], next_cursor
+
+
+def _percent(numerator, denominator) -> float | None:
+    if not denominator:
+        return None
+    return round(float(numerator) / float(denominator) * 100, 2)
+
+
+@router.get("/margin-trend", response_model=MarginTrendResponse)
+def get_margin_trend(
+    from_date: date | None = Query(None),
+    to_date: date | None = Query(None),
+    bucket: Literal["day", "week", "month"] = Query("month"),
+    product_id: uuid.UUID | None = Query(None),
+    db: Session = Depends(get_db),
+    current_user=Depends(admin_required),
+):
+    """
+    Margin per IST day/week/month for FULFILLED orders, optionally for one product.
+    - realized: from the OrderItems price/cost snapshots (what was actually charged).
+    - list: the catalogue price and cost in effect when each order was placed, from
+      product_price_history (one LATERAL as-of lookup per line). The gap between the
+      two shows discounting and cost changes not yet passed on.
+    """
+    start_utc, end_utc = ist_date_range_bounds(from_date, to_date)
+    list_price = price_as_of(OrderItems.product_id, Orders.created_at)
+    period_start = cast(func.date_trunc(bucket, func.timezone("Asia/Kolkata", Orders.created_at)), Date)
+
+    try:
+        q = _fulfilled_items_query(
+            db,
+            start_utc,
+            end_utc,
+            period_start.label("period_start"),
+            func.count(func.distinct(Orders.id)).label("order_count"),
+            func.coalesce(func.sum(OrderItems.quantity_kg), 0).label("quantity_sold_kg"),
+            func.coalesce(func.sum(OrderItems.line_total), 0).label("revenue"),
+            func.coalesce(func.sum(OrderItems.profit), 0).label("profit"),
+            func.sum(list_price.c.price_per_kg * OrderItems.quantity_kg).label("list_revenue"),
+            func.sum(
+                (list_price.c.price_per_kg - list_price.c.cost_price_per_kg) * OrderItems.quantity_kg
+            ).label("list_profit"),
+            # Revenue of the lines whose list cost is known (the base for list margin)
+            func.sum(
+                case((list_price.c.cost_price_per_kg.isnot(None), list_price.c.price_per_kg * OrderItems.quantity_kg))
+            ).label("list_costed_revenue"),
+        ).outerjoin(list_price, true())
+        if product_id is not None:
+            q = q.filter(OrderItems.product_id == product_id)
+        rows = q.group_by(period_start).order_by(period_start).all()
+
+    except Exception:
+        logger.error("Error building margin trend", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to build margin trend"
+        )
+
+    data = [
+        {
+            "period_start": r.period_start.isoformat(),
+            "order_count": int(r.order_count or 0),
+            "quantity_sold_kg": float(r.quantity_sold_kg or 0),
+            "revenue": round(float(r.revenue or 0), 2),
+            "profit": round(float(r.profit or 0), 2),
+            "margin_percent": _percent(r.profit or 0, r.revenue),
+            "list_revenue": round(float(r.list_revenue), 2) if r.list_revenue is not None else None,
+            "list_margin_percent": _percent(r.list_profit or 0, r.list_costed_revenue),
+            "price_realisation_percent": _percent(r.revenue or 0, r.list_revenue),
         }
         for r in rows
     ]
 
     return {
         "currency": "INR",
-        "period": {
-            "from": from_date.isoformat() if from_date else None,
-            "to": to_date.isoformat() if to_date else None,
-            "timezone": "Asia/Kolkata",
-        },
-        "orders": orders,
+        "period": _period(from_date, to_date),
+        "bucket": bucket,
+        "product_id": product_id,
+        "count": len(data),
+        "data": data,
     }
-
@@ -15,7 +15,7 @@ from dependencies.auth import get_current_user
 from dependencies.roles import admin_required
 from schemas.pydantic_models import CreateUserModel, UpdateUserRoleModel, ChangePasswordModel, EditUserProfileModel
 from utils.security import hash_password
-from utils.storage import upload_image_to_supabase
+from utils.image_pipeline import ingest_image
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -163,8 +163,10 @@ def edit_profile(name: str | None = Form(None),
                 detail="Invalid image type. Allowed: png, jpg, jpeg, webp",
             )
 
-        # Upload to Supabase
-        user.profile_picture = upload_image_to_supabase(profile_picture, folder="profile-pictures")
+        # Resize, strip metadata and upload the WebP variants to Supabase
+        variants = ingest_image(profile_picture, folder="profile-pictures")
+        user.profile_picture = variants["full"]
+        user.profile_picture_variants = variants
 
     db.commit()
     db.refresh(user)
@@ -179,6 +181,7 @@ def edit_profile(name: str | None = Form(None),
             "phone_number": user.phone_number,
             "email": user.email,
             "profile_picture": user.profile_picture,
+            "profile_picture_variants": user.profile_picture_variants,
             "role": user.role.value,
         }
     }
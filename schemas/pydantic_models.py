@@ -52,6 +52,19 @@ class EditCustomerModel(BaseModel):
     customer_address: Optional[str] = Field(None, max_length=512)
     customer_city: Optional[str] = Field(None, max_length=100)
 
+class CustomerAutocompleteItem(BaseModel):
+    id: uuid.UUID
+    customer_name: str
+    customer_phone_number: str
+    customer_city: Optional[str] = None
+    # phone / name (whole-name prefix) / token (prefix of a word in the name)
+    match: str
+
+class CustomerAutocompleteResponse(BaseModel):
+    query: str
+    count: int
+    data: list[CustomerAutocompleteItem]
+
 class CreateBusinessModel(BaseModel):
     business_name: str = Field(..., min_length=2, max_length=100)
     business_address: str = Field(..., min_length=2, max_length=512)
@@ -86,12 +99,50 @@ class EditProductModel(BaseModel):
     cost_price_per_kg: Optional[Decimal] = Field(None, ge=0, max_digits=18, decimal_places=2)
     product_image: Optional[str] = Field(None)
 
+class ProductSearchItem(BaseModel):
+    id: uuid.UUID
+    name: str
+    price: float
+    image: Optional[str] = None
+    is_active: bool
+    # Name starts with the search term (ranked first)
+    is_prefix: bool
+    # pg_trgm word similarity of the term to the name, 0..1
+    score: float
+
+class ProductSearchResponse(BaseModel):
+    message: str
+    query: str
+    count: int
+    data: list[ProductSearchItem]
+
+class ProductBulkLineReport(BaseModel):
+    line: int
+    product_id: Optional[uuid.UUID] = None
+    product_name: Optional[str] = None
+    previous_price: Optional[float] = None
+    price: Optional[float] = None
+    previous_cost_price_per_kg: Optional[float] = None
+    cost_price_per_kg: Optional[float] = None
+    # CREATED / UPDATED / UNCHANGED, or ERROR with the reason in `error`
+    status: str
+    error: Optional[str] = None
+
+class ProductBulkResponse(BaseModel):
+    message: str
+    count: int
+    created: int
+    updated: int
+    unchanged: int
+    data: list[ProductBulkLineReport]
+
 # --- Inventory Models ---
 
 class InventorySummaryResponse(BaseModel):
     total_products: int
     low_stock_products: int
     out_of_stock_products: int
+    ok_products: int
 
 class InventoryItemResponse(BaseModel):
     product_id: uuid.UUID
@@ -108,6 +159,7 @@ class InventoryItemsListResponse(BaseModel):
     message: str
     count: int
     data: list[InventoryItemResponse]
+    next_cursor: Optional[str] = None
 
 class InventoryTransactionRequest(BaseModel):
     product_id: uuid.UUID
@@ -121,6 +173,115 @@ class InventoryTransactionResponse(BaseModel):
     product_id: uuid.UUID
     quantity_kg: float
 
+class StockAsOfItem(BaseModel):
+    product_id: uuid.UUID
+    product_name: str
+    is_active: bool
+    stock_kg: float
+
+class StockAsOfResponse(BaseModel):
+    message: str
+    as_of_date: str
+    timezone: str = "Asia/Kolkata"
+    count: int
+    data: list[StockAsOfItem]
+
+class InventoryHistoryRow(BaseModel):
+    transaction_id: uuid.UUID
+    product_id: uuid.UUID
+    product_name: str
+    action: str
+    quantity_kg: float
+    # Signed movement of on-hand stock (0 for adjust rows)
+    delta_kg: float
+    # On-hand stock after this row
+    balance_kg: float
+    notes: Optional[str] = None
+    created_at: datetime
+
+class InventoryHistoryResponse(BaseModel):
+    message: str
+    period: dict
+    # Rows on this page; total matching rows only with include_total=true
+    count: int
+    total: Optional[int] = None
+    data: list[InventoryHistoryRow]
+    next_cursor: Optional[str] = None
+
+class StockForecastItem(BaseModel):
+    product_id: uuid.UUID
+    product_name: str
+    available_kg: float
+    min_stock_kg: float
+    # Average daily fulfilment consumption per window, keyed by window length in days
+    avg_daily_kg: dict[str, float]
+    # available / average over the basis window; None when nothing was consumed
+    days_of_cover: Optional[float] = None
+    suggested_reorder_kg: float
+
+class StockForecastResponse(BaseModel):
+    message: str
+    windows: list[int]
+    basis_window: int
+    target_cover_days: int
+    count: int
+    data: list[StockForecastItem]
+
+class StockAlertItem(BaseModel):
+    id: int
+    product_id: uuid.UUID
+    product_name: str
+    status: str
+    previous_status: Optional[str] = None
+    available_kg: float
+    min_stock_kg: float
+    created_at: datetime
+
+class StockAlertsResponse(BaseModel):
+    message: str
+    count: int
+    data: list[StockAlertItem]
+    # Pass back as `since` to fetch only newer alerts
+    next_since: int
+
+class InventoryValuationItem(BaseModel):
+    product_id: uuid.UUID
+    product_name: str
+    is_active: bool
+    stock_kg: float
+    cost_price_per_kg: Optional[float] = None
+    # None when the product has no cost price
+    value: Optional[float] = None
+
+class InventoryValuationResponse(BaseModel):
+    message: str
+    as_of_date: Optional[str] = None
+    timezone: str = "Asia/Kolkata"
+    count: int
+    total_stock_kg: float
+    total_value: float
+    # Products holding stock but missing a cost price (excluded from total_value)
+    missing_cost_products: int
+    data: list[InventoryValuationItem]
+
+class StockTakeLineReport(BaseModel):
+    line: int
+    product_id: Optional[uuid.UUID] = None
+    product_name: Optional[str] = None
+    previous_kg: Optional[float] = None
+    counted_kg: Optional[float] = None
+    delta_kg: Optional[float] = None
+    reserved_kg: Optional[float] = None
+    # ADD / DEDUCT / UNCHANGED, or ERROR with the reason in `error`
+    status: str
+    error: Optional[str] = None
+
+class StockTakeResponse(BaseModel):
+    message: str
+    count: int
+    changed: int
+    data: list[StockTakeLineReport]
+
 # --- Order Models ---
 
 class OrderResponse(BaseModel):
@@ -141,6 +302,8 @@ class OrderItemModel(BaseModel):
     product_id: uuid.UUID
     quantity_kg: Decimal = Field(..., gt=0)
     price_per_kg: Decimal = Field(..., gt=0)
+    # Skip the stock availability check for this product (take the order anyway).
+    allow_backorder: bool = False
 
 class CreateOrderRequest(BaseModel):
     customer_id: uuid.UUID
@@ -205,6 +368,14 @@ class ProfitSummaryResponse(BaseModel):
     realized_orders_month: int
     missing_profit_orders_total: int
 
+class ProfitPeriodTotals(BaseModel):
+    order_count: int
+    product_count: int
+    quantity_sold_kg: float
+    revenue: float
+    profit: float
+    margin_percent: Optional[float] = None
+
 class ProfitProductRow(BaseModel):
     product_id: uuid.UUID
     product_name: str
@@ -212,11 +383,14 @@ class ProfitProductRow(BaseModel):
     revenue: float
     profit: float
     margin_percent: Optional[float] = None
+    last_order_date: Optional[str] = None
 
 class ProfitProductsResponse(BaseModel):
     currency: str = "INR"
     period: dict
+    totals: ProfitPeriodTotals
     items: list[ProfitProductRow]
+    next_cursor: Optional[str] = None
 
 class ProfitOrderRow(BaseModel):
     order_id: uuid.UUID
@@ -225,11 +399,59 @@ class ProfitOrderRow(BaseModel):
     payment_status: str
     revenue: float
     profit: float
+    margin_percent: Optional[float] = None
 
 class ProfitOrdersResponse(BaseModel):
     currency: str = "INR"
     period: dict
+    totals: ProfitPeriodTotals
     orders: list[ProfitOrderRow]
+    next_cursor: Optional[str] = None
+
+class MarginTrendPoint(BaseModel):
+    # First IST day of the bucket
+    period_start: str
+    order_count: int
+    quantity_sold_kg: float
+    revenue: float
+    profit: float
+    margin_percent: Optional[float] = None
+    # Same lines at the catalogue price/cost in effect when each order was placed
+    list_revenue: Optional[float] = None
+    list_margin_percent: Optional[float] = None
+    # revenue / list_revenue; below 100 means sold under list price
+    price_realisation_percent: Optional[float] = None
+
+class MarginTrendResponse(BaseModel):
+    currency: str = "INR"
+    period: dict
+    bucket: str
+    product_id: Optional[uuid.UUID] = None
+    count: int
+    data: list[MarginTrendPoint]
+
+class ReceivablesAgeingItem(BaseModel):
+    customer_id: uuid.UUID
+    customer_name: Optional[str] = None
+    customer_phone_number: Optional[str] = None
+    order_count: int
+    oldest_order_date: str
+    # Outstanding Orders.total by age in IST days since the order date
+    days_0_30: float
+    days_31_60: float
+    days_61_90: float
+    days_over_90: float
+    total: float
+
+class ReceivablesAgeingResponse(BaseModel):
+    message: str
+    currency: str = "INR"
+    as_of_date: str
+    timezone: str = "Asia/Kolkata"
+    # Customers with outstanding orders (data holds the largest `limit` of them)
+    count: int
+    totals: dict
+    data: list[ReceivablesAgeingItem]
 
 # --- Invoice Models ---
 
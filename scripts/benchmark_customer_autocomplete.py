@@ -0,0 +1,41 @@
+import argparse
+import statistics
+import time
+
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from utils.customer_index import CustomerIndex
+
+
+def benchmark_customer_autocomplete(queries: list[str], iterations: int, limit: int):
+    session: Session = SessionLocal()
+
+    try:
+        index = CustomerIndex()
+        started = time.perf_counter()
+        index.build(session)
+        print(f"📦 Index build: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        print(f"\n{'query':<24}{'hits':>6}{'median µs':>12}{'p99 µs':>12}")
+        for query in queries:
+            samples = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                hits = index.search(query, limit=limit)
+                samples.append((time.perf_counter() - started) * 1_000_000)
+            samples.sort()
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f"{query!r:<24}{len(hits):>6}{statistics.median(samples):>12.1f}{p99:>12.1f}")
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time customer autocomplete lookups on the in-process index")
+    parser.add_argument("queries", nargs="*", default=["a", "am", "amit", "amit s", "shah 1", "98", "98765"])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=8)
+    args = parser.parse_args()
+    benchmark_customer_autocomplete(args.queries, args.iterations, args.limit)
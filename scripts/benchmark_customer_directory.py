@@ -0,0 +1,85 @@
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.database_models import Customers
+from routers.customers import get_customers
+from utils.pagination import encode_cursor
+
+BENCH_USER = {"sub": "benchmark", "role": "admin"}
+FIRST = ["Amit", "Priya", "Rahul", "Neha", "Vikram", "Anjali", "Suresh", "Kavita", "Rajesh", "Pooja",
+         "Mahesh", "Sunita", "Harsh", "Meera", "Dinesh", "Komal", "Jignesh", "Hetal", "Bhavesh", "Nisha"]
+LAST = ["Patel", "Shah", "Mehta", "Desai", "Joshi", "Trivedi", "Modi", "Parekh", "Thakkar", "Gandhi"]
+CITIES = ["Ahmedabad", "Surat", "Vadodara", "Rajkot", "Mumbai", "Pune", "Bhavnagar", "Jamnagar"]
+
+
+def _time_ms(fn, iterations: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def _list(session: Session, **params):
+    defaults = {"search": None, "city": None, "fields": None, "limit": 50, "cursor": None, "include_total": False}
+    return get_customers(**{**defaults, **params}, db=session, current_user=BENCH_USER)
+
+
+def benchmark_customer_directory(count: int, iterations: int):
+    session: Session = SessionLocal()
+
+    try:
+        rng = random.Random(11)
+        print(f"🌱 Inserting {count} synthetic customers (rolled back at the end)...")
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "customer_name": f"{rng.choice(FIRST)} {rng.choice(LAST)} {i}",
+                "customer_phone_number": f"9{rng.randrange(10**8, 10**9)}{i % 10}",
+                "customer_city": rng.choice(CITIES),
+                "is_active": True,
+            }
+            for i in range(count)
+        ]
+        for start in range(0, len(rows), 5000):
+            session.execute(insert(Customers), rows[start:start + 5000])
+        session.execute(text("ANALYZE customers"))
+
+        middle = sorted((r["customer_name"].lower(), str(r["id"])) for r in rows)[count // 2]
+        deep_cursor = encode_cursor(list(middle))
+
+        cases = [
+            ("full list (old behaviour)",
+             lambda: session.query(Customers).filter(Customers.is_active == True).all()),
+            ("first page", lambda: _list(session)),
+            ("first page, 2 fields", lambda: _list(session, fields="customer_name,customer_phone_number")),
+            ("page from the middle", lambda: _list(session, cursor=deep_cursor)),
+            ("search name 'mehta 12'", lambda: _list(session, search="mehta 12")),
+            ("search phone prefix '98765'", lambda: _list(session, search="98765")),
+            ("city 'surat'", lambda: _list(session, city="surat")),
+        ]
+
+        print(f"\n{'query':<32}{'median ms':>12}{'max ms':>12}")
+        for label, fn in cases:
+            median, worst = _time_ms(fn, iterations if "old" not in label else max(1, iterations // 10))
+            print(f"{label:<32}{median:>12.2f}{worst:>12.2f}")
+
+    finally:
+        session.rollback()
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the paginated customer directory")
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    benchmark_customer_directory(args.customers, args.iterations)
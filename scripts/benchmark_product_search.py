@@ -0,0 +1,96 @@
+import argparse
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.database_models import Products
+from utils.product_search import search_products
+
+FLAVOURS = ["Methi", "Masala", "Jeera", "Bajra", "Plain", "Garlic", "Pudina", "Palak", "Pani Puri", "Schezwan",
+            "Mix Veg", "Chilli", "Tomato", "Ajwain", "Til", "Jowar", "Ragi", "Oats", "Multigrain", "Manchurian"]
+KINDS = ["Khakhra", "Mathri", "Thepla", "Chakri", "Papad", "Chevdo"]
+
+
+def _time_ms(fn, iterations: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def _plan(session: Session, sql: str, params: dict) -> str:
+    rows = session.execute(text(f"EXPLAIN {sql}"), params).scalars().all()
+    scans = [r.strip() for r in rows if "Scan" in r]
+    return scans[0] if scans else rows[0].strip()
+
+
+def benchmark_product_search(count: int, iterations: int):
+    session: Session = SessionLocal()
+
+    try:
+        rng = random.Random(7)
+        print(f"🌱 Inserting {count} synthetic products (rolled back at the end)...")
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "product_name": f"__bench__ {rng.choice(FLAVOURS)} {rng.choice(KINDS)} {i}",
+                "price_per_kg": Decimal("100"),
+                "min_stock_kg": Decimal("0"),
+                "is_active": True,
+            }
+            for i in range(count)
+        ]
+        for start in range(0, len(rows), 5000):
+            session.execute(insert(Products), rows[start:start + 5000])
+        session.execute(text("ANALYZE products"))
+
+        existing = rows[len(rows) // 2]["product_name"].upper()
+        cases = [
+            ("duplicate check: ilike(name)",
+             lambda: session.query(Products.id).filter(Products.product_name.ilike(existing)).first()),
+            ("duplicate check: lower(name) =",
+             lambda: session.query(Products.id).filter(func.lower(Products.product_name) == existing.lower()).first()),
+            ("ilike '%jeera thepla%'",
+             lambda: session.query(Products.id).filter(Products.product_name.ilike("%jeera thepla%")).limit(10).all()),
+            ("search 'methi'", lambda: search_products(session, "methi", limit=10)),
+            ("search 'jeera thepla'", lambda: search_products(session, "jeera thepla", limit=10)),
+            ("search misspelt 'kakhra'", lambda: search_products(session, "kakhra", limit=10)),
+            ("search misspelt 'manchuriyan'", lambda: search_products(session, "manchuriyan", limit=10)),
+        ]
+
+        print(f"\n{'query':<36}{'median ms':>12}{'max ms':>12}")
+        for label, fn in cases:
+            median, worst = _time_ms(fn, iterations)
+            print(f"{label:<36}{median:>12.2f}{worst:>12.2f}")
+
+        print("\n🔎 Plans")
+        print("  lower(name) = :", _plan(session, "SELECT id FROM products WHERE lower(product_name) = :n",
+                                      {"n": existing.lower()}))
+        print("  ilike '%..%'  :", _plan(session, "SELECT id FROM products WHERE product_name ILIKE :p",
+                                      {"p": "%jeera thepla%"}))
+        print("  fuzzy <%      :", _plan(session, "SELECT id FROM products WHERE :t <% product_name",
+                                      {"t": "kakhra"}))
+
+        print("\n🏷  Top results for 'kakhra':")
+        for product, is_prefix, score in search_products(session, "kakhra", limit=5):
+            print(f"   {product.product_name:<40} prefix={bool(is_prefix)} score={float(score):.3f}")
+
+    finally:
+        session.rollback()
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark product name lookups and trigram search")
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    benchmark_product_search(args.products, args.iterations)
@@ -0,0 +1,73 @@
+import argparse
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.database_models import Products
+from utils.product_snapshot import ProductSnapshot, get_product_records, get_product_snapshot
+
+
+def _time_ms(fn, iterations: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def _orm_lookup(session: Session, product_ids: list) -> dict:
+    # The order path before the snapshot: one catalogue query per write.
+    products = session.query(Products).filter(Products.id.in_(product_ids)).all()
+    return {str(p.id): p for p in products}
+
+
+def benchmark_product_snapshot(iterations: int, items_per_order: int):
+    session: Session = SessionLocal()
+
+    try:
+        product_ids = [row.id for row in session.query(Products.id).all()]
+        if not product_ids:
+            print("❌ No products to benchmark")
+            return
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        snapshot = ProductSnapshot.build(session, "benchmark")
+        build_ms = (time.perf_counter() - started) * 1000
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        record_bytes = sum(sys.getsizeof(r) for r in snapshot.records.values())
+        print(f"📦 Products: {len(snapshot.records)}")
+        print(f"📦 Snapshot memory: {size / 1024:.1f} KiB retained (peak {peak / 1024:.1f} KiB during build)")
+        print(f"📦 Record tuples alone: {record_bytes / 1024:.1f} KiB")
+        print(f"📦 Full build: {build_ms:.1f} ms")
+
+        get_product_snapshot(session)  # warm the shared snapshot
+        sample = [random.sample(product_ids, min(items_per_order, len(product_ids))) for _ in range(iterations)]
+        orm_iter = iter(sample)
+        snap_iter = iter(sample)
+
+        orm_med, orm_max = _time_ms(lambda: _orm_lookup(session, next(orm_iter)), iterations)
+        snap_med, snap_max = _time_ms(lambda: get_product_records(session, next(snap_iter)), iterations)
+
+        print(f"\n{'lookup (' + str(items_per_order) + ' items)':<28}{'median ms':>12}{'max ms':>12}")
+        print(f"{'query Products':<28}{orm_med:>12.3f}{orm_max:>12.3f}")
+        print(f"{'snapshot':<28}{snap_med:>12.3f}{snap_max:>12.3f}")
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare order-path product lookups: DB query vs in-process snapshot")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--items", type=int, default=5, help="distinct products per simulated order")
+    args = parser.parse_args()
+    benchmark_product_snapshot(args.iterations, args.items)
@@ -0,0 +1,91 @@
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from routers.profit import _period_totals, _profit_by_order_sql, _profit_by_product_sql
+from utils.profit_snapshot import ProfitSnapshot, np
+from utils.timezone import ist_date_range_bounds, now_ist
+
+
+def _time_ms(fn, iterations: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def benchmark_profit_snapshot(iterations: int, limit: int):
+    if np is None:
+        print("❌ numpy is not installed; the profit snapshot engine is unavailable")
+        return
+
+    session: Session = SessionLocal()
+
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        snapshot = ProfitSnapshot.build(session)
+        build_ms = (time.perf_counter() - started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"📦 Snapshot rows: {snapshot.row_count}")
+        print(f"📦 Snapshot memory: {snapshot.nbytes / 1024:.1f} KiB "
+              f"(arrays {snapshot.array_bytes / 1024:.1f} KiB, Python objects {snapshot.object_bytes / 1024:.1f} KiB; "
+              f"peak during build {peak / 1024:.1f} KiB)")
+        print(f"📦 Full build: {build_ms:.1f} ms")
+
+        started = time.perf_counter()
+        snapshot.refresh(session)
+        print(f"📦 Incremental refresh (no changes): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        today = now_ist().date()
+        ranges = {
+            "all time": (None, None),
+            "last 365 days": (today - timedelta(days=365), today),
+            "last 30 days": (today - timedelta(days=30), today),
+        }
+
+        print(f"\n{'query':<34}{'sql median/max ms':>22}{'snapshot median/max ms':>26}")
+        for label, (from_date, to_date) in ranges.items():
+            start_utc, end_utc = ist_date_range_bounds(from_date, to_date)
+            cases = {
+                "by product": (
+                    lambda: _profit_by_product_sql(session, start_utc, end_utc, "profit", "desc", None, limit),
+                    lambda: snapshot.product_page(start_utc, end_utc, "profit", "desc", None, limit),
+                ),
+                "by order": (
+                    lambda: _profit_by_order_sql(session, start_utc, end_utc, "date", "desc", None, limit),
+                    lambda: snapshot.order_page(start_utc, end_utc, "date", "desc", None, limit),
+                ),
+                "period totals": (
+                    lambda: _period_totals(session, start_utc, end_utc),
+                    lambda: snapshot.totals(start_utc, end_utc),
+                ),
+            }
+            for name, (sql_fn, snapshot_fn) in cases.items():
+                sql_med, sql_max = _time_ms(sql_fn, iterations)
+                snap_med, snap_max = _time_ms(snapshot_fn, iterations)
+                print(
+                    f"{name + ' / ' + label:<34}"
+                    f"{f'{sql_med:.2f} / {sql_max:.2f}':>22}"
+                    f"{f'{snap_med:.2f} / {snap_max:.2f}':>26}"
+                )
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare profit report latency: SQL vs in-process snapshot")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    benchmark_profit_snapshot(args.iterations, args.limit)
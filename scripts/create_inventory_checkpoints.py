@@ -0,0 +1,25 @@
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from utils.inventory_checkpoints import create_monthly_checkpoints
+
+
+def create_inventory_checkpoints():
+    session: Session = SessionLocal()
+
+    try:
+        print("📒 Closing monthly inventory checkpoints")
+        inserted = create_monthly_checkpoints(session)
+        session.commit()
+        print(f"✅ Checkpoint rows written: {inserted}")
+
+    except Exception:
+        session.rollback()
+        raise
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    create_inventory_checkpoints()
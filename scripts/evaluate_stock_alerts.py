@@ -0,0 +1,22 @@
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from utils.stock_alerts import evaluate_stock_alerts
+
+
+def evaluate_all_stock_alerts():
+    session: Session = SessionLocal()
+
+    try:
+        print("🔎 Evaluating stock alerts for all products")
+        created = evaluate_stock_alerts(session)
+        session.commit()
+        print(f"✅ Recorded {created} stock alerts")
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    # Catch-up run, e.g. after STOCK_ALERTS_ENABLED was off or a worker failed.
+    evaluate_all_stock_alerts()
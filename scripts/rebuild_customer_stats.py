@@ -0,0 +1,95 @@
+import argparse
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.database_models import Customers, CustomerStats
+from utils.customer_stats import derived_customer_stats_query
+
+_METRICS = ("order_count", "lifetime_revenue", "lifetime_profit", "outstanding_amount", "last_order_at")
+
+
+def _values(row) -> tuple:
+    if row is None:
+        return 0, Decimal("0"), Decimal("0"), Decimal("0"), None
+    return (
+        int(row.order_count),
+        Decimal(str(row.lifetime_revenue)),
+        Decimal(str(row.lifetime_profit)),
+        Decimal(str(row.outstanding_amount)),
+        row.last_order_at,
+    )
+
+
+def rebuild_customer_stats(fix: bool):
+    session: Session = SessionLocal()
+
+    try:
+        print("🔎 Verifying customer_stats against orders")
+
+        # Lock stored rows first so no order write can commit between the reads.
+        stored = {
+            row.customer_id: row
+            for row in session.query(CustomerStats).with_for_update().all()
+        }
+        derived = {row.customer_id: row for row in derived_customer_stats_query(session).all()}
+        customer_ids = [c.id for c in session.query(Customers.id).all()]
+
+        mismatches = []
+        for customer_id in customer_ids:
+            expected = _values(derived.get(customer_id))
+            row = stored.get(customer_id)
+            if row is None or _values(row) != expected:
+                mismatches.append((customer_id, None if row is None else _values(row), expected))
+
+        for customer_id, actual, expected in mismatches:
+            if actual is None:
+                print(f"  ❌ {customer_id}: missing row | orders={dict(zip(_METRICS, expected))}")
+                continue
+            diffs = [
+                f"{name}={a} orders={e}"
+                for name, a, e in zip(_METRICS, actual, expected)
+                if a != e
+            ]
+            print(f"  ❌ {customer_id}: " + " | ".join(diffs))
+
+        if not mismatches:
+            print(f"✅ customer_stats is consistent for {len(customer_ids)} customers")
+            return
+
+        if not fix:
+            print(f"⚠️  {len(mismatches)} mismatched customers (re-run with --fix to repair)")
+            return
+
+        now = datetime.now(timezone.utc)
+        stmt = insert(CustomerStats).values([
+            {
+                "customer_id": customer_id,
+                **dict(zip(_METRICS, expected)),
+                "created_at": now,
+                "updated_at": now,
+            }
+            for customer_id, _, expected in mismatches
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CustomerStats.customer_id],
+            set_={**{name: stmt.excluded[name] for name in _METRICS}, "updated_at": now},
+        )
+        session.execute(stmt)
+        session.commit()
+        print(f"✅ Repaired {len(mismatches)} customers")
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Verify (and optionally rebuild) customer_stats from orders"
+    )
+    parser.add_argument("--fix", action="store_true", help="write the derived values into mismatched rows")
+    args = parser.parse_args()
+    rebuild_customer_stats(args.fix)
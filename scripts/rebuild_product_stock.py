@@ -0,0 +1,73 @@
+import argparse
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.database_models import Products, ProductStock
+from utils.inventory_checkpoints import stock_as_of
+from utils.stock import apply_stock_delta, pending_reservations_query
+
+
+def rebuild_product_stock(fix: bool):
+    session: Session = SessionLocal()
+
+    try:
+        print("🔎 Verifying product_stock against inventory_transactions and pending orders")
+
+        # Lock balances first so no ledger/order write can commit between the reads.
+        stored = {
+            row.product_id: row
+            for row in session.query(ProductStock).with_for_update().all()
+        }
+        # Checkpoint + ledger tail; a far-future bound includes every committed row.
+        ledger = stock_as_of(session, datetime.max.replace(tzinfo=timezone.utc))
+        reserved = dict(pending_reservations_query(session).all())
+        product_ids = [p.id for p in session.query(Products.id).all()]
+
+        mismatches = []
+        for product_id in product_ids:
+            expected_on_hand = Decimal(str(ledger.get(product_id, 0)))
+            expected_reserved = Decimal(str(reserved.get(product_id, 0)))
+            row = stored.get(product_id)
+            on_hand = Decimal(str(row.on_hand_kg)) if row is not None else Decimal("0")
+            reserved_kg = Decimal(str(row.reserved_kg)) if row is not None else Decimal("0")
+            if row is None or on_hand != expected_on_hand or reserved_kg != expected_reserved:
+                mismatches.append((product_id, on_hand, expected_on_hand, reserved_kg, expected_reserved))
+
+        for product_id, on_hand, expected_on_hand, reserved_kg, expected_reserved in mismatches:
+            print(
+                f"  ❌ {product_id}: on_hand_kg={on_hand} ledger={expected_on_hand} | "
+                f"reserved_kg={reserved_kg} pending_orders={expected_reserved}"
+            )
+
+        if not mismatches:
+            print(f"✅ product_stock is consistent for {len(product_ids)} products")
+            return
+
+        if not fix:
+            print(f"⚠️  {len(mismatches)} mismatched products (re-run with --fix to repair)")
+            return
+
+        for product_id, on_hand, expected_on_hand, reserved_kg, expected_reserved in mismatches:
+            apply_stock_delta(
+                session,
+                product_id,
+                on_hand_delta=expected_on_hand - on_hand,
+                reserved_delta=expected_reserved - reserved_kg,
+            )
+        session.commit()
+        print(f"✅ Repaired {len(mismatches)} products")
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Verify (and optionally repair) product_stock against the ledger and pending orders"
+    )
+    parser.add_argument("--fix", action="store_true", help="write the derived values into mismatched rows")
+    args = parser.parse_args()
+    rebuild_product_stock(args.fix)
@@ -0,0 +1,119 @@
+import argparse
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select, true, update
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.database_models import OrderItems, Orders
+from utils.price_history import BACKFILL_SOURCE, price_as_of
+
+
+def recompute_order_profit(all_items: bool, fix: bool, after: datetime | None = None, before: datetime | None = None):
+    session: Session = SessionLocal()
+
+    try:
+        scope = "all order items" if all_items else "order items without a cost snapshot"
+        if after is not None:
+            scope += f" ordered from {after.isoformat()}"
+        if before is not None:
+            scope += f" ordered before {before.isoformat()}"
+        print(f"🔎 Re-deriving cost and profit for {scope} from product_price_history")
+
+        in_range = []
+        if after is not None:
+            in_range.append(Orders.created_at >= after)
+        if before is not None:
+            in_range.append(Orders.created_at < before)
+
+        # Cost in effect when each order was placed: one LATERAL as-of lookup per line.
+        history = price_as_of(OrderItems.product_id, Orders.created_at)
+        derived = (
+            select(
+                OrderItems.id.label("item_id"),
+                history.c.cost_price_per_kg.label("cost"),
+                func.round((OrderItems.price_per_kg - history.c.cost_price_per_kg) * OrderItems.quantity_kg, 2)
+                .label("profit"),
+            )
+            .select_from(OrderItems)
+            .join(Orders, Orders.id == OrderItems.order_id)
+            .join(history, true())
+            .where(history.c.cost_price_per_kg.isnot(None), *in_range)
+        )
+        uncosted_line = OrderItems.cost_price_per_kg.is_(None)
+        if all_items:
+            # A backfilled row is only today's cost carried back: good enough to fill a
+            # missing cost, never to replace the one snapshotted when the order was placed.
+            derived = derived.where(or_(uncosted_line, history.c.source != BACKFILL_SOURCE))
+        else:
+            derived = derived.where(uncosted_line)
+        derived = derived.subquery()
+
+        changed = and_(
+            OrderItems.id == derived.c.item_id,
+            or_(
+                OrderItems.cost_price_per_kg.is_distinct_from(derived.c.cost),
+                OrderItems.profit.is_distinct_from(derived.c.profit),
+            ),
+        )
+        pending = session.execute(select(func.count()).select_from(OrderItems).where(changed)).scalar_one()
+
+        if not pending:
+            print("✅ Nothing to recompute")
+        elif not fix:
+            print(f"⚠️  {pending} order items would change (re-run with --fix to write them)")
+        else:
+            # Touch the orders first (the predicate no longer matches once items are
+            # rewritten) so the profit snapshot's updated_at watermark re-reads them.
+            session.execute(
+                update(Orders)
+                .where(Orders.id.in_(select(OrderItems.order_id).where(changed)))
+                .values(updated_at=func.now()),
+                execution_options={"synchronize_session": False},
+            )
+            # Set-based: one UPDATE ... FROM (lateral lookup) for every affected line.
+            session.execute(
+                update(OrderItems)
+                .where(changed)
+                .values(cost_price_per_kg=derived.c.cost, profit=derived.c.profit),
+                execution_options={"synchronize_session": False},
+            )
+            session.commit()
+            print(f"✅ Updated {pending} order items")
+            print("ℹ️  Run scripts/rebuild_customer_stats.py --fix to carry the new profit into customer totals")
+
+        uncosted = session.execute(
+            select(func.count()).select_from(OrderItems).where(OrderItems.cost_price_per_kg.is_(None))
+        ).scalar_one()
+        if uncosted:
+            print(f"ℹ️  {uncosted} order items have no cost (no costed history row at their order time)")
+
+        if all_items:
+            kept = session.execute(
+                select(func.count())
+                .select_from(OrderItems)
+                .join(Orders, Orders.id == OrderItems.order_id)
+                .join(history, true())
+                .where(OrderItems.cost_price_per_kg.isnot(None), history.c.source == BACKFILL_SOURCE, *in_range)
+            ).scalar_one()
+            if kept:
+                print(f"ℹ️  {kept} order items predate the recorded price history and kept their cost snapshot")
+
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recompute order item cost and profit from the product price history"
+    )
+    parser.add_argument("--all", action="store_true", dest="all_items",
+                        help="also re-derive lines that have a cost snapshot, where a recorded (not backfilled) "
+                             "price history row covers the order date")
+    parser.add_argument("--after", type=datetime.fromisoformat,
+                        help="only orders placed at or after this ISO date/time")
+    parser.add_argument("--before", type=datetime.fromisoformat,
+                        help="only orders placed before this ISO date/time")
+    parser.add_argument("--fix", action="store_true", help="write the recomputed values")
+    args = parser.parse_args()
+    recompute_order_profit(args.all_items, args.fix, args.after, args.before)
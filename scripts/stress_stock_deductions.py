@@ -0,0 +1,135 @@
+import argparse
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from database.database import SessionLocal
+from database.database_models import InventoryActions, InventoryTransactions, Products, ProductStock
+from routers.inventory import add_stock
+from schemas.pydantic_models import InventoryTransactionRequest
+from utils.stock import apply_stock_delta, ledger_balance_expr, record_inventory_transaction
+
+STRESS_USER = {"sub": "stress-test", "role": "admin"}
+
+
+def _create_products(count: int, initial_kg: Decimal, reserved_kg: Decimal) -> list:
+    session: Session = SessionLocal()
+    try:
+        products = [
+            Products(
+                product_name=f"__stress__ {uuid.uuid4().hex[:12]}",
+                price_per_kg=Decimal("100"),
+                min_stock_kg=Decimal("0"),
+            )
+            for _ in range(count)
+        ]
+        session.add_all(products)
+        session.flush()
+        for product in products:
+            record_inventory_transaction(session, product.id, InventoryActions.ADD, initial_kg, notes="Stress test seed")
+            # Stand-in for PENDING orders: deductions must never eat into this.
+            apply_stock_delta(session, product.id, reserved_delta=reserved_kg)
+        session.commit()
+        return [product.id for product in products]
+    finally:
+        session.close()
+
+
+def _worker(product_ids: list, operations: int, seed: int, stats: dict, lock: threading.Lock):
+    rng = random.Random(seed)
+    for _ in range(operations):
+        product_id = rng.choice(product_ids)
+        if rng.random() < 0.8:
+            payload = InventoryTransactionRequest(
+                product_id=product_id, action="deduct", quantity_kg=Decimal(rng.randint(1, 5))
+            )
+        else:
+            payload = InventoryTransactionRequest(
+                product_id=product_id, action="adjust", quantity_kg=Decimal(rng.randint(0, 40) + 1)
+            )
+
+        session: Session = SessionLocal()
+        try:
+            add_stock(payload, db=session, current_user=STRESS_USER)
+            outcome = "applied"
+        except HTTPException as e:
+            outcome = "rejected" if e.status_code == 409 else f"error {e.status_code}"
+        finally:
+            session.close()
+
+        with lock:
+            stats[outcome] = stats.get(outcome, 0) + 1
+
+
+def _verify(product_ids: list) -> bool:
+    session: Session = SessionLocal()
+    try:
+        ok = True
+        for product_id in product_ids:
+            stock = session.query(ProductStock).filter(ProductStock.product_id == product_id).one()
+            ledger = session.query(ledger_balance_expr()).filter(InventoryTransactions.product_id == product_id).scalar()
+            on_hand = Decimal(str(stock.on_hand_kg))
+            reserved = Decimal(str(stock.reserved_kg))
+            if on_hand < reserved or on_hand != Decimal(str(ledger)):
+                ok = False
+                print(f"  ❌ {product_id}: on_hand_kg={on_hand} reserved_kg={reserved} ledger={ledger}")
+        return ok
+    finally:
+        session.close()
+
+
+def _cleanup(product_ids: list):
+    session: Session = SessionLocal()
+    try:
+        # Ledger, stock and checkpoint rows go with the product (ON DELETE CASCADE).
+        session.query(Products).filter(Products.id.in_(product_ids)).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+def stress_stock_deductions(threads: int, operations: int, products: int, keep: bool):
+    product_ids = _create_products(products, initial_kg=Decimal("60"), reserved_kg=Decimal("20"))
+    print(f"🔧 {products} scratch product(s), 60 kg on hand, 20 kg reserved each")
+    print(f"🔧 {threads} threads x {operations} deduct/adjust calls")
+
+    try:
+        stats: dict = {}
+        lock = threading.Lock()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [
+                pool.submit(_worker, product_ids, operations, seed, stats, lock)
+                for seed in range(threads)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        print(f"⏱️  {elapsed:.2f}s | " + ", ".join(f"{k}={v}" for k, v in sorted(stats.items())))
+
+        if _verify(product_ids):
+            print("✅ Stock never dropped below reserved and matches the ledger")
+        else:
+            print("❌ Invariant violated under contention")
+    finally:
+        if not keep:
+            _cleanup(product_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Hammer /inventory/transactions from many threads and check stock never goes below reserved"
+    )
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--operations", type=int, default=50, help="calls per thread")
+    parser.add_argument("--products", type=int, default=1, help="1 = maximum contention on a single row")
+    parser.add_argument("--keep", action="store_true", help="leave the scratch products in place")
+    args = parser.parse_args()
+    stress_stock_deductions(args.threads, args.operations, args.products, args.keep)
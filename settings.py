@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from pathlib import Path
 
 from pydantic_settings import BaseSettings
@@ -16,6 +16,16 @@ class Settings(BaseSettings):
     SUPABASE_KEY: Optional[str] = None
     SUPABASE_SERVICE_ROLE_KEY: Optional[str] = None
     SUPABASE_BUCKET: str = "uploads"
+    # Object storage backend: "supabase" or "local" (files under LOCAL_STORAGE_DIR,
+    # served at /files/...; STORAGE_PUBLIC_BASE_URL makes those URLs absolute)
+    STORAGE_BACKEND: Literal["supabase", "local"] = "supabase"
+    LOCAL_STORAGE_DIR: str = "uploads"
+    STORAGE_PUBLIC_BASE_URL: Optional[str] = None
+    # Supabase uploads (pooled httpx client) and the sync upload pool
+    STORAGE_TIMEOUT_SECONDS: float = 30.0
+    STORAGE_UPLOAD_RETRIES: int = 2
+    STORAGE_MAX_CONNECTIONS: int = 10
+    STORAGE_SYNC_UPLOAD_WORKERS: int = 4
     DB_POOL_SIZE: int = 10
     DB_MAX_OVERFLOW: int = 20
     DB_POOL_TIMEOUT: int = 30
@@ -31,6 +41,25 @@ class Settings(BaseSettings):
     PDF_RENDER_TIMEOUT_MS: int = 30000
     PDF_TEMPLATE_VERSION: int = 2
 
+    # In-process columnar profit snapshot (requires numpy; falls back to SQL)
+    ANALYTICS_SNAPSHOT_ENABLED: bool = False
+    ANALYTICS_SNAPSHOT_REFRESH_SECONDS: int = 30
+    ANALYTICS_SNAPSHOT_LAG_SECONDS: int = 120
+
+    # GET /products/ response cache: how long a process trusts its catalogue version
+    # before re-checking the products table for edits made by other processes
+    CATALOGUE_REVALIDATE_SECONDS: int = 15
+
+    # Customer autocomplete index: how often each process pulls customer changes
+    # made by other workers
+    CUSTOMER_INDEX_REFRESH_SECONDS: int = 10
+
+    # Uploaded image processing (Pillow) worker threads
+    IMAGE_PROCESSING_WORKERS: int = 2
+
+    # Background low-stock evaluator (stock_alerts event log)
+    STOCK_ALERTS_ENABLED: bool = True
+
     class Config:
         env_file = BASE_DIR / ".env"
         extra = "forbid"
@@ -0,0 +1,71 @@
+"""
+In-process cache of the serialised product catalogue (GET /products/).
+
+The catalogue version is a fingerprint of the products table (row count and latest
+updated_at), so every process derives the same ETag for the same data. The
+fingerprint is re-read only when this process changed a product (invalidate()) or
+CATALOGUE_REVALIDATE_SECONDS have passed, which picks up edits made by other
+processes. In between, ETag checks and cache hits never touch the database. The
+order write path asks for a revalidated version on every call instead.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database.database_models import Products
+from settings import settings
+
+
+class CatalogueCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self._checked_at = 0.0
+        # role -> (version, serialised body)
+        self._bodies: dict[str, tuple[str, bytes]] = {}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version = None
+            self._bodies.clear()
+
+    def version(self, db: Session, revalidate: bool = False) -> str:
+        """
+        Current catalogue fingerprint. revalidate=True always re-reads it (one aggregate
+        query), for callers that persist product values and cannot act on a stale one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if (not revalidate and self._version is not None
+                    and now - self._checked_at < settings.CATALOGUE_REVALIDATE_SECONDS):
+                return self._version
+
+        count, last_updated = db.query(func.count(Products.id), func.max(Products.updated_at)).one()
+        version = hashlib.sha1(f"{count}:{last_updated.isoformat() if last_updated else ''}".encode()).hexdigest()[:16]
+
+        with self._lock:
+            if version != self._version:
+                self._bodies.clear()
+            self._version = version
+            self._checked_at = now
+        return version
+
+    def get_body(self, role: str, version: str) -> bytes | None:
+        with self._lock:
+            cached = self._bodies.get(role)
+        if cached and cached[0] == version:
+            return cached[1]
+        return None
+
+    def put_body(self, role: str, version: str, body: bytes) -> None:
+        with self._lock:
+            if self._version == version:
+                self._bodies[role] = (version, body)
+
+
+catalogue_cache = CatalogueCache()
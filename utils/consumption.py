@@ -0,0 +1,96 @@
+"""
+In-process cache of daily fulfilment consumption per product, for stock-cover forecasts.
+
+Holds SUM(quantity_kg) of fulfilment DEDUCT rows (inventory_transactions.order_id set)
+per (IST day, product) for the last MAX_WINDOW_DAYS days. The first call loads the whole
+horizon; later calls re-read only the IST days from the previous refresh onwards (minus
+a short lag for transactions that were still in flight) and replace those buckets, so
+a request costs one small indexed range query.
+"""
+from __future__ import annotations
+
+import threading
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import cast, Date, func
+from sqlalchemy.orm import Session
+
+from database.database_models import InventoryActions, InventoryTransactions
+from utils.timezone import IST, ist_day_bounds
+
+MAX_WINDOW_DAYS = 365
+
+# A ledger row can commit slightly after its created_at; re-read this far back.
+_REFRESH_LAG = timedelta(minutes=5)
+
+
+class ConsumptionCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._daily: dict[date, dict] = {}
+        self._watermark: datetime | None = None
+
+    def _load_days_from(self, db: Session, first_day: date) -> None:
+        start_utc, _ = ist_day_bounds(first_day)
+        ist_day = cast(func.timezone("Asia/Kolkata", InventoryTransactions.created_at), Date)
+        rows = (
+            db.query(
+                ist_day.label("day"),
+                InventoryTransactions.product_id,
+                func.sum(InventoryTransactions.quantity_kg).label("kg"),
+            )
+            .filter(
+                InventoryTransactions.created_at >= start_utc,
+                InventoryTransactions.action == InventoryActions.DEDUCT,
+                InventoryTransactions.order_id.isnot(None),
+            )
+            .group_by(ist_day, InventoryTransactions.product_id)
+            .all()
+        )
+
+        for day in [d for d in self._daily if d >= first_day]:
+            del self._daily[day]
+        for row in rows:
+            self._daily.setdefault(row.day, {})[row.product_id] = Decimal(str(row.kg))
+
+    def refresh(self, db: Session, now_utc: datetime | None = None) -> None:
+        now_utc = now_utc or datetime.now(timezone.utc)
+        today = now_utc.astimezone(IST).date()
+        horizon_start = today - timedelta(days=MAX_WINDOW_DAYS - 1)
+
+        with self._lock:
+            if self._watermark is None:
+                first_day = horizon_start
+            else:
+                first_day = max(horizon_start, (self._watermark - _REFRESH_LAG).astimezone(IST).date())
+            self._load_days_from(db, first_day)
+            for day in [d for d in self._daily if d < horizon_start]:
+                del self._daily[day]
+            self._watermark = now_utc
+
+    def window_totals(self, windows: list[int], today: date) -> dict:
+        """
+        {product_id: [total kg over the last w IST days (today included) for w in windows]},
+        built in one pass over the cached buckets.
+        """
+        cutoffs = [today - timedelta(days=w - 1) for w in windows]
+        totals: dict = {}
+        with self._lock:
+            for day, per_product in self._daily.items():
+                hits = [i for i, cutoff in enumerate(cutoffs) if cutoff <= day <= today]
+                if not hits:
+                    continue
+                for product_id, kg in per_product.items():
+                    row = totals.setdefault(product_id, [Decimal("0")] * len(windows))
+                    for i in hits:
+                        row[i] += kg
+        return totals
+
+
+_cache = ConsumptionCache()
+
+
+def get_consumption(db: Session) -> ConsumptionCache:
+    _cache.refresh(db)
+    return _cache
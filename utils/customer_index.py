@@ -0,0 +1,264 @@
+"""
+In-process prefix index over active customers, for order-entry autocomplete.
+
+Three sorted key lists, searched with bisect:
+  - full lowercased names   ("amit shah" matches "amit s")
+  - name tokens             ("shah" matches "sh")
+  - phone digits            (full number and its last 10 digits, so "98765" and
+                             "9198765" both match +91 98765 43210)
+A lookup is a few binary searches plus a walk over at most `limit` matches per list
+(multi-word queries walk the tokens of their most selective word and filter), so its
+cost does not grow with the number of customers.
+
+The index is built at startup (or on first use) and kept current two ways:
+  - create/edit/delete in this process call upsert()/remove() after commit;
+  - every CUSTOMER_INDEX_REFRESH_SECONDS a background refresh re-reads customers
+    updated since the last refresh (minus a lag for in-flight commits), which picks up
+    writes made by other workers. Soft deletes bump updated_at, so they arrive the same
+    way. Searches never wait for a refresh.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from core.logger import get_logger
+from database.database_models import Customers
+from settings import settings
+
+logger = get_logger(__name__)
+
+# A customer row can commit slightly after its updated_at; re-read this far back.
+_REFRESH_LAG = timedelta(minutes=2)
+# Upper bound on token keys inspected per lookup when extra query words must also match.
+_MAX_TOKEN_SCAN = 2000
+
+_NON_DIGITS = re.compile(r"\D")
+_SPACES = re.compile(r"\s+")
+# At least one digit: "+" or "-" alone must not become an empty (match-all) prefix.
+_PHONE_QUERY = re.compile(r"^\+?[\s-]*\d[\d\s-]*$")
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="customer-index")
+
+
+class CustomerEntry(NamedTuple):
+    id: str
+    customer_name: str
+    customer_phone_number: str
+    customer_city: str | None
+
+
+def _normalise(text: str) -> str:
+    return _SPACES.sub(" ", text.strip().lower())
+
+
+def _phone_keys(phone: str) -> set[str]:
+    digits = _NON_DIGITS.sub("", phone)
+    keys = {digits}
+    if len(digits) > 10:
+        keys.add(digits[-10:])
+    keys.discard("")
+    return keys
+
+
+class CustomerIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, CustomerEntry] = {}
+        # Sorted (key, customer id) tuples
+        self._names: list[tuple[str, str]] = []
+        self._tokens: list[tuple[str, str]] = []
+        self._phones: list[tuple[str, str]] = []
+        self._watermark: datetime | None = None
+        self._refreshed_at = 0.0
+        self._refreshing = False
+        self._ready = threading.Event()
+
+    # --- maintenance (callers hold self._lock) ---
+
+    def _keys(self, entry: CustomerEntry):
+        name = _normalise(entry.customer_name)
+        return (
+            [(name, entry.id)],
+            [(token, entry.id) for token in set(name.split(" "))],
+            [(key, entry.id) for key in _phone_keys(entry.customer_phone_number)],
+        )
+
+    def _remove_locked(self, customer_id: str) -> None:
+        entry = self._entries.pop(customer_id, None)
+        if entry is None:
+            return
+        for target, keys in zip((self._names, self._tokens, self._phones), self._keys(entry)):
+            for key in keys:
+                i = bisect_left(target, key)
+                if i < len(target) and target[i] == key:
+                    del target[i]
+
+    def _upsert_locked(self, entry: CustomerEntry) -> None:
+        self._remove_locked(entry.id)
+        self._entries[entry.id] = entry
+        for target, keys in zip((self._names, self._tokens, self._phones), self._keys(entry)):
+            for key in keys:
+                insort(target, key)
+
+    @staticmethod
+    def _entry(row) -> CustomerEntry:
+        return CustomerEntry(str(row.id), row.customer_name, row.customer_phone_number, row.customer_city)
+
+    # --- public API ---
+
+    def build(self, db: Session) -> None:
+        started = time.perf_counter()
+        rows = db.query(
+            Customers.id, Customers.customer_name, Customers.customer_phone_number,
+            Customers.customer_city, Customers.updated_at,
+        ).filter(Customers.is_active == True).all()
+
+        entries = {}
+        names, tokens, phones = [], [], []
+        for row in rows:
+            entry = self._entry(row)
+            entries[entry.id] = entry
+            for target, keys in zip((names, tokens, phones), self._keys(entry)):
+                target.extend(keys)
+        names.sort()
+        tokens.sort()
+        phones.sort()
+        # Inactive rows count too: a deactivation is the latest change the index has seen.
+        watermark = db.query(Customers.updated_at).order_by(Customers.updated_at.desc()).limit(1).scalar()
+
+        with self._lock:
+            self._entries, self._names, self._tokens, self._phones = entries, names, tokens, phones
+            self._watermark = watermark
+            self._refreshed_at = time.monotonic()
+        self._ready.set()
+        logger.info(
+            f"Customer index built | customers={len(entries)} | "
+            f"duration_ms={(time.perf_counter() - started) * 1000:.0f}"
+        )
+
+    def refresh(self, db: Session) -> int:
+        """Applies customers changed since the last refresh. Returns the number applied."""
+        with self._lock:
+            watermark = self._watermark
+        if watermark is None:
+            self.build(db)
+            return len(self._entries)
+
+        rows = db.query(
+            Customers.id, Customers.customer_name, Customers.customer_phone_number,
+            Customers.customer_city, Customers.is_active, Customers.updated_at,
+        ).filter(Customers.updated_at >= watermark - _REFRESH_LAG).all()
+
+        with self._lock:
+            for row in rows:
+                if row.is_active:
+                    self._upsert_locked(self._entry(row))
+                else:
+                    self._remove_locked(str(row.id))
+                if row.updated_at > self._watermark:
+                    self._watermark = row.updated_at
+            self._refreshed_at = time.monotonic()
+        return len(rows)
+
+    def upsert(self, customer: Customers) -> None:
+        """Call after committing a create/edit in this process."""
+        if not self._ready.is_set():
+            return
+        with self._lock:
+            if customer.is_active:
+                self._upsert_locked(self._entry(customer))
+            else:
+                self._remove_locked(str(customer.id))
+
+    def remove(self, customer_id) -> None:
+        if not self._ready.is_set():
+            return
+        with self._lock:
+            self._remove_locked(str(customer_id))
+
+    def warm(self, bind) -> None:
+        """Builds the index in the background (application startup)."""
+        self._refreshing = True
+        _executor.submit(self._run_in_background, bind, self.build)
+
+    def _run_in_background(self, bind, action) -> None:
+        db = Session(bind=bind)
+        try:
+            action(db)
+        except Exception:
+            logger.error("Customer index refresh failed", exc_info=True)
+        finally:
+            self._refreshing = False
+            db.close()
+
+    def ensure_current(self, db: Session) -> None:
+        """Builds on first use; afterwards schedules a background refresh when one is due."""
+        if not self._ready.is_set():
+            if self._refreshing:
+                # Startup build still running; fall back to building here if it stalls.
+                self._ready.wait(timeout=10)
+            if not self._ready.is_set():
+                self.build(db)
+            return
+
+        if time.monotonic() - self._refreshed_at >= settings.CUSTOMER_INDEX_REFRESH_SECONDS and not self._refreshing:
+            self._refreshing = True
+            _executor.submit(self._run_in_background, db.get_bind(), self.refresh)
+
+    @staticmethod
+    def _range_size(keys: list[tuple[str, str]], prefix: str) -> int:
+        return bisect_left(keys, (prefix + "\uffff",)) - bisect_left(keys, (prefix,))
+
+    @staticmethod
+    def _walk(keys: list[tuple[str, str]], prefix: str):
+        i = bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            yield keys[i][1]
+            i += 1
+
+    def search(self, query: str, limit: int = 8) -> list[tuple[CustomerEntry, str]]:
+        """Top `limit` (entry, match) pairs; match is "phone", "name" or "token"."""
+        q = _normalise(query)
+        if not q:
+            return []
+
+        found: dict[str, str] = {}
+        with self._lock:
+            if _PHONE_QUERY.match(q):
+                for customer_id in self._walk(self._phones, _NON_DIGITS.sub("", q)):
+                    found.setdefault(customer_id, "phone")
+                    if len(found) >= limit:
+                        break
+            else:
+                # Whole-name prefix first: already in name order.
+                for customer_id in self._walk(self._names, q):
+                    found.setdefault(customer_id, "name")
+                    if len(found) >= limit:
+                        break
+
+                # Then any word of the name; every query word must prefix some name word.
+                words = q.split(" ")
+                lead = min(words, key=lambda word: self._range_size(self._tokens, word))
+                scanned = 0
+                for customer_id in self._walk(self._tokens, lead):
+                    if len(found) >= limit or scanned >= _MAX_TOKEN_SCAN:
+                        break
+                    scanned += 1
+                    if customer_id in found:
+                        continue
+                    name_words = _normalise(self._entries[customer_id].customer_name).split(" ")
+                    if all(any(w.startswith(word) for w in name_words) for word in words):
+                        found[customer_id] = "token"
+
+            return [(self._entries[customer_id], match) for customer_id, match in found.items()]
+
+
+customer_index = CustomerIndex()
@@ -0,0 +1,181 @@
+"""
+Lifetime order totals per customer (customer_stats), kept in step with orders.
+
+Definitions follow the dashboard and profit reports:
+  order_count         orders that are not cancelled
+  lifetime_revenue    Orders.total of FULFILLED orders
+  lifetime_profit     item profit of FULFILLED orders
+  outstanding_amount  Orders.total of FULFILLED orders that are not PAID (a PARTIAL order
+                      counts in full: part payments are not recorded)
+  last_order_at       newest created_at among orders that are not cancelled
+
+Order write paths describe the order before and after the change with order_stats()
+and pass both to apply_order_stats_change(). The difference is added to the customer's
+row with an atomic upsert in the caller's transaction, the same way product_stock
+follows the ledger, so the totals commit or roll back with the order.
+scripts/rebuild_customer_stats.py verifies the table against orders and repairs drift.
+"""
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import NamedTuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database.database_models import CustomerStats, OrderItems, Orders, OrderStatus, PaymentStatus
+
+_ZERO = Decimal("0")
+
+
+class OrderStats(NamedTuple):
+    """One order's contribution to its customer's totals."""
+    customer_id: uuid.UUID
+    created_at: datetime | None
+    order_count: int
+    revenue: Decimal
+    profit: Decimal
+    outstanding: Decimal
+
+
+def order_profit(db: Session, order_id) -> Decimal:
+    """Sum of the order's item profit (lines without a cost count as zero)."""
+    profit = db.query(func.coalesce(func.sum(OrderItems.profit), 0)).filter(OrderItems.order_id == order_id).scalar()
+    return Decimal(str(profit))
+
+
+def order_stats(order: Orders, profit: Decimal) -> OrderStats:
+    counted = order.order_status != OrderStatus.CANCELLED
+    fulfilled = order.order_status == OrderStatus.FULFILLED
+    total = Decimal(str(order.total))
+    return OrderStats(
+        customer_id=uuid.UUID(str(order.customer_id)),
+        created_at=order.created_at,
+        order_count=1 if counted else 0,
+        revenue=total if fulfilled else _ZERO,
+        profit=Decimal(str(profit)) if fulfilled else _ZERO,
+        outstanding=total if fulfilled and order.payment_status != PaymentStatus.PAID else _ZERO,
+    )
+
+
+def _last_order_subquery(customer_id):
+    return (
+        select(func.max(Orders.created_at))
+        .where(Orders.customer_id == customer_id, Orders.order_status != OrderStatus.CANCELLED)
+        .scalar_subquery()
+    )
+
+
+def _apply_delta(db: Session, customer_id, order_count: int, revenue: Decimal, profit: Decimal,
+                 outstanding: Decimal, last_order_at: datetime | None, recompute_last_order: bool) -> None:
+    now = datetime.now(timezone.utc)
+    stmt = insert(CustomerStats).values(
+        customer_id=customer_id,
+        order_count=order_count,
+        lifetime_revenue=revenue,
+        lifetime_profit=profit,
+        outstanding_amount=outstanding,
+        last_order_at=last_order_at,
+        created_at=now,
+        updated_at=now,
+    )
+    if recompute_last_order:
+        # The customer's newest order was removed or cancelled: take the next newest.
+        last_order = _last_order_subquery(customer_id)
+    else:
+        # GREATEST ignores NULLs, so a change that adds no order keeps the stored value.
+        last_order = func.greatest(CustomerStats.last_order_at, stmt.excluded.last_order_at)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CustomerStats.customer_id],
+        set_={
+            "order_count": CustomerStats.order_count + stmt.excluded.order_count,
+            "lifetime_revenue": CustomerStats.lifetime_revenue + stmt.excluded.lifetime_revenue,
+            "lifetime_profit": CustomerStats.lifetime_profit + stmt.excluded.lifetime_profit,
+            "outstanding_amount": CustomerStats.outstanding_amount + stmt.excluded.outstanding_amount,
+            "last_order_at": last_order,
+            "updated_at": now,
+        },
+    )
+    db.execute(stmt)
+
+
+def apply_order_stats_change(db: Session, before: OrderStats | None, after: OrderStats | None) -> None:
+    """
+    Moves customer_stats by the difference between an order's contribution before and
+    after a write (None for an order that did not exist / no longer exists). Handles a
+    change of customer. Call after the order itself has been changed; caller commits.
+    """
+    deltas: dict = {}
+    for stats, sign in ((before, -1), (after, 1)):
+        if stats is None:
+            continue
+        count, revenue, profit, outstanding = deltas.get(stats.customer_id, (0, _ZERO, _ZERO, _ZERO))
+        deltas[stats.customer_id] = (
+            count + sign * stats.order_count,
+            revenue + sign * stats.revenue,
+            profit + sign * stats.profit,
+            outstanding + sign * stats.outstanding,
+        )
+
+    added_to = after.customer_id if after is not None and after.order_count else None
+    removed_from = before.customer_id if before is not None and before.order_count else None
+    if removed_from == added_to:
+        # Counted for the same customer before and after: last_order_at is unaffected.
+        added_to = removed_from = None
+    if removed_from is not None:
+        # The last_order_at recompute reads orders; make this transaction's change visible to it.
+        db.flush()
+
+    # Stable order, as with stock rows, so concurrent writes cannot deadlock.
+    for customer_id in sorted(deltas, key=str):
+        count, revenue, profit, outstanding = deltas[customer_id]
+        unchanged = not count and not revenue and not profit and not outstanding
+        if unchanged and customer_id not in (added_to, removed_from):
+            continue
+        _apply_delta(
+            db, customer_id, count, revenue, profit, outstanding,
+            last_order_at=after.created_at if customer_id == added_to else None,
+            recompute_last_order=customer_id == removed_from,
+        )
+
+
+def init_customer_stats(db: Session, customer_id) -> None:
+    """Creates an all-zero row for a new customer so the directory can sort on it."""
+    now = datetime.now(timezone.utc)
+    db.execute(
+        insert(CustomerStats)
+        .values(customer_id=customer_id, order_count=0, lifetime_revenue=0, lifetime_profit=0,
+                outstanding_amount=0, created_at=now, updated_at=now)
+        .on_conflict_do_nothing(index_elements=[CustomerStats.customer_id])
+    )
+
+
+def derived_customer_stats_query(db: Session):
+    """
+    The values customer_stats must hold, aggregated from orders:
+    (customer_id, order_count, lifetime_revenue, lifetime_profit, outstanding_amount, last_order_at).
+    Customers without orders are absent (their row must be all zero).
+    """
+    order_profit_subq = (
+        db.query(OrderItems.order_id.label("order_id"), func.sum(OrderItems.profit).label("profit"))
+        .group_by(OrderItems.order_id)
+        .subquery()
+    )
+    counted = Orders.order_status != OrderStatus.CANCELLED
+    fulfilled = Orders.order_status == OrderStatus.FULFILLED
+    unpaid = fulfilled & (Orders.payment_status != PaymentStatus.PAID)
+    return (
+        db.query(
+            Orders.customer_id.label("customer_id"),
+            func.coalesce(func.sum(case((counted, 1), else_=0)), 0).label("order_count"),
+            func.coalesce(func.sum(case((fulfilled, Orders.total), else_=0)), 0).label("lifetime_revenue"),
+            func.coalesce(func.sum(case((fulfilled, order_profit_subq.c.profit), else_=0)), 0).label("lifetime_profit"),
+            func.coalesce(func.sum(case((unpaid, Orders.total), else_=0)), 0).label("outstanding_amount"),
+            func.max(case((counted, Orders.created_at))).label("last_order_at"),
+        )
+        .outerjoin(order_profit_subq, order_profit_subq.c.order_id == Orders.id)
+        .group_by(Orders.customer_id)
+    )
@@ -0,0 +1,139 @@
+"""
+Ingest pipeline for uploaded images (product photos, profile pictures, UPI QR codes).
+
+Each upload is decoded once with Pillow, rotated according to its EXIF orientation,
+capped at MAX_DIMENSION and re-encoded as WebP in several sizes. Re-encoding drops
+EXIF/GPS and other metadata. Variants are stored side by side as
+<folder>/<uuid>/<variant>.webp and returned as {variant: public URL}; "full" is the
+capped main image.
+
+Decoding and encoding are CPU-bound, so they run on a small dedicated pool
+(IMAGE_PROCESSING_WORKERS). That keeps them off the event loop for async routes and
+bounds concurrent work for sync routes. Variants are then uploaded to the configured
+storage backend (utils.storage): concurrently and awaited on the event loop for async
+routes, through its bounded blocking pool for sync routes.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from core.logger import get_logger
+from settings import settings
+from utils.storage import storage
+
+logger = get_logger(__name__)
+
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+MAX_SOURCE_PIXELS = 50_000_000
+MAX_DIMENSION = 1600
+THUMBNAIL_SIZES = {"medium": 640, "small": 320, "thumb": 128}
+WEBP_QUALITY = 80
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PROCESSING_WORKERS, thread_name_prefix="images")
+
+
+def _encode_webp(img: Image.Image, lossless: bool) -> bytes:
+    buffer = io.BytesIO()
+    # No exif/icc/xmp arguments: the output carries no metadata.
+    img.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4, lossless=lossless)
+    return buffer.getvalue()
+
+
+def process_image(data: bytes, lossless: bool = False, thumbnails: bool = True) -> dict[str, bytes]:
+    """
+    Returns {"full": ..., "medium": ..., "small": ..., "thumb": ...} WebP bytes
+    (only "full" without thumbnails). Use lossless for images that must stay
+    pixel-exact, such as QR codes.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            if source.width * source.height > MAX_SOURCE_PIXELS:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image dimensions are too large")
+            # Decoding at a reduced scale is much cheaper for large JPEGs.
+            source.draft("RGB", (MAX_DIMENSION, MAX_DIMENSION))
+            img = ImageOps.exif_transpose(source)
+            img.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or corrupt image file")
+
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    img = img.convert("RGBA" if has_alpha else "RGB")
+
+    img.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS)
+    variants = {"full": _encode_webp(img, lossless)}
+
+    if not thumbnails:
+        return variants
+
+    current = img
+    for name, size in THUMBNAIL_SIZES.items():  # largest first, each from the previous
+        current = current.copy()
+        current.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[name] = _encode_webp(current, lossless)
+    return variants
+
+
+def _variant_path(base: str, name: str) -> str:
+    return f"{base}/{name}.webp"
+
+
+def _new_base(folder: str) -> str:
+    return f"{folder}/{uuid.uuid4()}" if folder else str(uuid.uuid4())
+
+
+def _log_ingested(folder: str, data: bytes, variants: dict[str, bytes]) -> None:
+    logger.info(
+        f"Image ingested | folder={folder} | source_bytes={len(data)} | "
+        f"full_bytes={len(variants['full'])} | variants={len(variants)}"
+    )
+
+
+def _read_upload(upload: UploadFile) -> bytes:
+    data = upload.file.read(MAX_UPLOAD_BYTES + 1)
+    upload.file.seek(0)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image must be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+        )
+    return data
+
+
+def ingest_image(upload: UploadFile, folder: str = "", lossless: bool = False,
+                 thumbnails: bool = True) -> dict[str, str]:
+    """Processes and stores an upload; for sync routes (already off the event loop)."""
+    data = _read_upload(upload)
+    variants = _executor.submit(process_image, data, lossless, thumbnails).result()
+    base = _new_base(folder)
+    urls = {
+        name: storage.upload_sync(_variant_path(base, name), content, "image/webp")
+        for name, content in variants.items()
+    }
+    _log_ingested(folder, data, variants)
+    return urls
+
+
+async def ingest_image_async(upload: UploadFile, folder: str = "", lossless: bool = False,
+                             thumbnails: bool = True) -> dict[str, str]:
+    """Processes and stores an upload without blocking the event loop."""
+    data = await upload.read(MAX_UPLOAD_BYTES + 1)
+    await upload.seek(0)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image must be at most {MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+        )
+    variants = await asyncio.wrap_future(_executor.submit(process_image, data, lossless, thumbnails))
+    base = _new_base(folder)
+    names = list(variants)
+    uploaded = await asyncio.gather(*(
+        storage.upload(_variant_path(base, name), variants[name], "image/webp") for name in names
+    ))
+    _log_ingested(folder, data, variants)
+    return dict(zip(names, uploaded))
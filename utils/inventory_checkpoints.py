@@ -0,0 +1,227 @@
+"""
+Monthly closing balances per product (inventory_checkpoints), so balances as of a date
+and running balances in the ledger history start from the nearest checkpoint instead of
+the first ledger row.
+
+Checkpoints close each settled IST month. schedule_checkpoints() is called from the
+ledger reads (history, valuation) and closes any missing month on a background thread,
+so no cron is needed; scripts/create_inventory_checkpoints.py does the same on demand
+(initial backfill, or deployments without traffic around month end).
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import and_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.logger import get_logger
+from database.database_models import InventoryCheckpoints, InventoryTransactions, Products
+from utils.stock import ledger_balance_expr, ledger_delta_expr
+from utils.timezone import IST, ist_month_starts_between
+
+logger = get_logger(__name__)
+
+# Only close periods that ended at least this long ago, so no in-flight transaction
+# can still commit a ledger row stamped before the boundary.
+CHECKPOINT_SETTLE = timedelta(hours=1)
+
+_BEGINNING = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoints")
+_schedule_lock = threading.Lock()
+# Latest month boundary known to be checkpointed, and whether a closing run is queued.
+_closed_through: datetime | None = None
+_running = False
+
+
+def _latest_checkpoints_subq(db: Session, as_of_utc: datetime):
+    latest = (
+        db.query(
+            InventoryCheckpoints.product_id.label("product_id"),
+            func.max(InventoryCheckpoints.period_end).label("period_end"),
+        )
+        .filter(InventoryCheckpoints.period_end <= as_of_utc)
+        .group_by(InventoryCheckpoints.product_id)
+        .subquery()
+    )
+    return (
+        db.query(
+            InventoryCheckpoints.product_id.label("product_id"),
+            InventoryCheckpoints.period_end.label("period_end"),
+            InventoryCheckpoints.balance_kg.label("balance_kg"),
+        )
+        .join(
+            latest,
+            and_(
+                latest.c.product_id == InventoryCheckpoints.product_id,
+                latest.c.period_end == InventoryCheckpoints.period_end,
+            ),
+        )
+        .subquery()
+    )
+
+
+def stock_as_of_query(db: Session, as_of_utc: datetime):
+    """
+    Per-product on-hand stock for ledger rows created before as_of_utc, as
+    (product_id, stock) rows: the latest checkpoint at or before as_of plus the ledger
+    tail after it. Products with no checkpoint fall back to their full ledger.
+    """
+    cp = _latest_checkpoints_subq(db, as_of_utc)
+    tail_start = func.coalesce(cp.c.period_end, _BEGINNING)
+    return (
+        db.query(
+            Products.id.label("product_id"),
+            (func.coalesce(cp.c.balance_kg, 0) + ledger_balance_expr()).label("stock"),
+        )
+        .outerjoin(cp, cp.c.product_id == Products.id)
+        .outerjoin(
+            InventoryTransactions,
+            and_(
+                InventoryTransactions.product_id == Products.id,
+                InventoryTransactions.created_at >= tail_start,
+                InventoryTransactions.created_at < as_of_utc,
+            ),
+        )
+        .group_by(Products.id, cp.c.balance_kg)
+    )
+
+
+def ledger_history_subquery(
+    db: Session,
+    start_utc: datetime | None,
+    end_utc: datetime | None,
+    product_ids=None,
+):
+    """
+    Ledger rows created before end_utc with a running balance_kg (on-hand after the row).
+
+    The running SUM() window starts at each product's latest checkpoint at or before
+    start_utc and adds the checkpoint balance, so only the rows since that checkpoint are
+    scanned. Pass the bounds (and products) of the rows actually needed, e.g. one page.
+    Only the upper bound is applied here; rows between the checkpoint and start_utc feed
+    the window and the caller filters them out afterwards.
+    """
+    cp = _latest_checkpoints_subq(db, start_utc or _BEGINNING)
+    delta = ledger_delta_expr()
+    running = func.sum(delta).over(
+        partition_by=InventoryTransactions.product_id,
+        order_by=(InventoryTransactions.created_at, InventoryTransactions.id),
+    )
+
+    q = (
+        db.query(
+            InventoryTransactions.id.label("id"),
+            InventoryTransactions.product_id.label("product_id"),
+            InventoryTransactions.action.label("action"),
+            InventoryTransactions.quantity_kg.label("quantity_kg"),
+            delta.label("delta_kg"),
+            InventoryTransactions.notes.label("notes"),
+            InventoryTransactions.created_at.label("created_at"),
+            (func.coalesce(cp.c.balance_kg, 0) + running).label("balance_kg"),
+        )
+        .outerjoin(cp, cp.c.product_id == InventoryTransactions.product_id)
+        .filter(InventoryTransactions.created_at >= func.coalesce(cp.c.period_end, _BEGINNING))
+    )
+    if end_utc is not None:
+        q = q.filter(InventoryTransactions.created_at < end_utc)
+    if product_ids is not None:
+        q = q.filter(InventoryTransactions.product_id.in_(list(product_ids)))
+    return q.subquery()
+
+
+def stock_as_of(db: Session, as_of_utc: datetime) -> dict:
+    return {row.product_id: Decimal(str(row.stock)) for row in stock_as_of_query(db, as_of_utc).all()}
+
+
+def create_monthly_checkpoints(db: Session, now_utc: datetime | None = None) -> int:
+    """
+    Writes closing balances for every settled IST month boundary not yet checkpointed.
+    Each month is derived from the previous checkpoint plus that month's ledger rows,
+    so the ledger is scanned once overall. Returns the number of rows inserted; caller commits.
+    """
+    now_utc = now_utc or datetime.now(timezone.utc)
+    settled = now_utc - CHECKPOINT_SETTLE
+
+    last_end = db.query(func.max(InventoryCheckpoints.period_end)).scalar()
+    if last_end is None:
+        first_row = db.query(func.min(InventoryTransactions.created_at)).scalar()
+        if first_row is None:
+            return 0
+        # Boundaries strictly after the first ledger row.
+        start = first_row
+    else:
+        start = last_end
+
+    inserted = 0
+    for period_end in ist_month_starts_between(start, settled):
+        balances = stock_as_of(db, period_end)
+        if not balances:
+            continue
+        stmt = insert(InventoryCheckpoints).values([
+            {
+                "product_id": product_id,
+                "period_end": period_end,
+                "balance_kg": balance,
+                "created_at": now_utc,
+                "updated_at": now_utc,
+            }
+            for product_id, balance in balances.items()
+        ])
+        stmt = stmt.on_conflict_do_nothing(index_elements=["product_id", "period_end"])
+        result = db.execute(stmt)
+        inserted += result.rowcount or 0
+        logger.info(f"Inventory checkpoint written | period_end={period_end.isoformat()} | products={len(balances)}")
+
+    return inserted
+
+
+def _latest_settled_boundary(now_utc: datetime) -> datetime:
+    settled_ist = (now_utc - CHECKPOINT_SETTLE).astimezone(IST)
+    return datetime(settled_ist.year, settled_ist.month, 1, tzinfo=IST).astimezone(timezone.utc)
+
+
+def _close_in_background(bind, boundary: datetime) -> None:
+    global _closed_through, _running
+    db = Session(bind=bind)
+    try:
+        inserted = create_monthly_checkpoints(db)
+        db.commit()
+        _closed_through = boundary
+        if inserted:
+            logger.info(f"Inventory checkpoints closed in background | rows={inserted}")
+    except Exception:
+        db.rollback()
+        logger.error("Inventory checkpoint closing failed", exc_info=True)
+    finally:
+        _running = False
+        db.close()
+
+
+def schedule_checkpoints(db: Session) -> None:
+    """
+    Queues create_monthly_checkpoints on a background thread when the latest settled IST
+    month has no checkpoint yet. One cheap MAX() per process per month otherwise.
+    """
+    global _closed_through, _running
+    boundary = _latest_settled_boundary(datetime.now(timezone.utc))
+    if _closed_through is not None and _closed_through >= boundary:
+        return
+
+    with _schedule_lock:
+        if _running:
+            return
+        last_end = db.query(func.max(InventoryCheckpoints.period_end)).scalar()
+        if last_end is not None:
+            if last_end.tzinfo is None:
+                last_end = last_end.replace(tzinfo=timezone.utc)
+            if last_end >= boundary:
+                _closed_through = boundary
+                return
+        _running = True
+    _executor.submit(_close_in_background, db.get_bind(), boundary)
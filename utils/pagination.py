@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values: list[Any]) -> str:
+    """
+    Encodes the keyset position of the last returned row into an opaque, URL-safe cursor.
+    Values must already be JSON-serialisable (stringify Decimals, datetimes and UUIDs first).
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None, size: int) -> list[Any] | None:
+    """
+    Decodes a cursor produced by encode_cursor. Returns None when no cursor is given.
+    Raises 400 if the cursor is malformed or was produced for a different sort.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values
+
+
+def keyset_page(q, sort_col, id_col, order: str, after: tuple | None, limit: int, cursor_values):
+    """
+    Applies (sort_col, id_col) keyset pagination to a query and returns (rows, next_cursor).
+
+    `after` is the parsed (sort value, id) of the previous page's last row, or None.
+    `cursor_values(row)` returns the JSON-serialisable [sort value, id] for the next cursor.
+    The id column breaks ties so the ordering is total and pages never overlap.
+    """
+    if after is not None:
+        if order == "desc":
+            q = q.filter(tuple_(sort_col, id_col) < tuple_(*after))
+        else:
+            q = q.filter(tuple_(sort_col, id_col) > tuple_(*after))
+
+    if order == "desc":
+        q = q.order_by(sort_col.desc(), id_col.desc())
+    else:
+        q = q.order_by(sort_col.asc(), id_col.asc())
+
+    rows = q.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(cursor_values(rows[-1]))
+    return rows, next_cursor
@@ -0,0 +1,79 @@
+"""
+Product price/cost history.
+
+Every write that sets Products.price_per_kg or cost_price_per_kg appends a
+product_price_history row; the row's values hold from effective_from until the next
+row for the product. price_as_of() builds a LATERAL subquery that picks, per outer
+row, the latest history row at or before a timestamp, so one query can price many
+products (or many order lines) at their own points in time using
+ix_product_price_history_product_effective.
+"""
+from __future__ import annotations
+
+from decimal import Decimal
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from database.database_models import ProductPriceHistory
+
+# Rows the history migration seeded from the then-current prices. They stand in for
+# unknown older prices, so they must not replace a cost snapshot taken at order time.
+BACKFILL_SOURCE = "backfill"
+
+
+def record_price_change(
+    db: Session,
+    product_id,
+    price_per_kg: Decimal,
+    cost_price_per_kg: Decimal | None,
+    source: str,
+    changed_by: str | None = None,
+) -> None:
+    """Caller commits, in the same transaction as the product write."""
+    db.add(ProductPriceHistory(
+        product_id=product_id,
+        price_per_kg=price_per_kg,
+        cost_price_per_kg=cost_price_per_kg,
+        source=source,
+        changed_by=changed_by,
+    ))
+
+
+def record_price_changes(db: Session, rows: list[tuple], source: str, changed_by: str | None = None) -> None:
+    """rows: (product_id, price_per_kg, cost_price_per_kg). One multi-row insert; caller commits."""
+    if not rows:
+        return
+    db.execute(insert(ProductPriceHistory).values([
+        {
+            "product_id": product_id,
+            "price_per_kg": price,
+            "cost_price_per_kg": cost,
+            "source": source,
+            "changed_by": changed_by,
+        }
+        for product_id, price, cost in rows
+    ]))
+
+
+def price_as_of(product_id_col, at_col, name: str = "price_as_of"):
+    """
+    LATERAL (price_per_kg, cost_price_per_kg, effective_from, source) in effect for product_id_col
+    at at_col. Join with .outerjoin(lateral, true()); columns are NULL before the first row.
+    """
+    return (
+        select(
+            ProductPriceHistory.price_per_kg,
+            ProductPriceHistory.cost_price_per_kg,
+            ProductPriceHistory.effective_from,
+            ProductPriceHistory.source,
+        )
+        .where(
+            ProductPriceHistory.product_id == product_id_col,
+            ProductPriceHistory.effective_from <= at_col,
+        )
+        .order_by(ProductPriceHistory.effective_from.desc(), ProductPriceHistory.id.desc())
+        .limit(1)
+        .lateral(name)
+    )
+
@@ -0,0 +1,54 @@
+"""
+Product name search backed by pg_trgm.
+
+Matches are names containing the term (ILIKE) or fuzzily close to it (word similarity
+above pg_trgm.word_similarity_threshold, 0.6 by default), so a misspelt "kakhra" still
+finds "Methi Khakhra". Both predicates are served by ix_products_name_trgm, a GIN
+trigram index. Ranking: names starting with the term first, then by word similarity,
+then alphabetically.
+"""
+from __future__ import annotations
+
+from sqlalchemy import case, func, literal, or_
+from sqlalchemy.orm import Session
+
+from database.database_models import Products
+
+MAX_SEARCH_LIMIT = 50
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_products(db: Session, term: str, limit: int = 10, include_inactive: bool = False) -> list:
+    """Top `limit` rows of (Products, is_prefix, score) for the search term."""
+    term = term.strip()
+    pattern = escape_like(term)
+    name = Products.product_name
+
+    is_prefix = name.ilike(f"{pattern}%", escape="\\")
+    score = func.word_similarity(literal(term), name)
+
+    q = db.query(
+        Products,
+        is_prefix.label("is_prefix"),
+        score.label("score"),
+    ).filter(
+        or_(
+            name.ilike(f"%{pattern}%", escape="\\"),
+            literal(term).op("<%")(name),
+        )
+    )
+    if not include_inactive:
+        q = q.filter(Products.is_active == True)
+
+    return (
+        q.order_by(
+            case((is_prefix, 0), else_=1),
+            score.desc(),
+            func.lower(name),
+        )
+        .limit(min(limit, MAX_SEARCH_LIMIT))
+        .all()
+    )
@@ -0,0 +1,96 @@
+"""
+Immutable in-process snapshot of product pricing for the order write path.
+
+Maps product id to a ProductRecord (a NamedTuple: no per-instance dict, read-only).
+The snapshot is tied to the catalogue version from utils.catalogue_cache. Order lines
+store the cost and rely on is_active, so get_product_records() re-reads the version on
+every call (one count/max(updated_at) query) rather than trusting the periodic
+revalidation: an edit made in any process rebuilds the snapshot before the next order
+is priced. Ids not in the snapshot, such as a product created by another process since
+the last rebuild, are read from the database directly.
+"""
+from __future__ import annotations
+
+import threading
+import uuid
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from database.database_models import Products
+from utils.catalogue_cache import catalogue_cache
+
+
+class ProductRecord(NamedTuple):
+    # Field names match Products so records and ORM rows are interchangeable for readers.
+    id: uuid.UUID
+    product_name: str
+    price_per_kg: Decimal
+    cost_price_per_kg: Optional[Decimal]
+    is_active: bool
+
+
+_COLUMNS = (
+    Products.id,
+    Products.product_name,
+    Products.price_per_kg,
+    Products.cost_price_per_kg,
+    Products.is_active,
+)
+
+
+class ProductSnapshot:
+    __slots__ = ("version", "records")
+
+    def __init__(self, version: str, records: Mapping[uuid.UUID, ProductRecord]):
+        self.version = version
+        self.records = records
+
+    @classmethod
+    def build(cls, db: Session, version: str) -> "ProductSnapshot":
+        records = {row.id: ProductRecord(*row) for row in db.query(*_COLUMNS).all()}
+        return cls(version, MappingProxyType(records))
+
+
+_lock = threading.Lock()
+_snapshot: ProductSnapshot | None = None
+
+
+def get_product_snapshot(db: Session, revalidate: bool = False) -> ProductSnapshot:
+    global _snapshot
+    version = catalogue_cache.version(db, revalidate=revalidate)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = ProductSnapshot.build(db, version)
+        return _snapshot
+
+
+def get_product_records(db: Session, product_ids) -> dict[str, ProductRecord]:
+    """
+    {str(id): ProductRecord} for the given ids; unknown ids are simply absent.
+    The catalogue version is always re-checked, so the records are current.
+    """
+    records = get_product_snapshot(db, revalidate=True).records
+    found = {}
+    missing = []
+    for product_id in set(product_ids):
+        record = records.get(product_id)
+        if record is None:
+            missing.append(product_id)
+        else:
+            found[str(product_id)] = record
+
+    if missing:
+        rows = db.query(*_COLUMNS).filter(Products.id.in_(missing)).all()
+        for row in rows:
+            found[str(row.id)] = ProductRecord(*row)
+        if rows:
+            # Created after the version was read: rebuild on the next call.
+            catalogue_cache.invalidate()
+    return found
@@ -0,0 +1,538 @@
+"""
+Optional in-process columnar snapshot of FULFILLED order items for the profit reports.
+
+Enabled with ANALYTICS_SNAPSHOT_ENABLED and requires numpy; when either is missing the
+profit endpoints keep aggregating in SQL. The snapshot holds one row per order item
+(order date, order/product/customer index, kg, revenue, profit) in numpy arrays, with
+money and kg stored as integer hundredths so sums match Numeric(…, 2) exactly.
+
+Refresh is incremental from Orders.updated_at: orders touched since the watermark are
+re-read and, if their updated_at moved, their rows replaced. Replaced rows stay in the
+arrays (marked not alive) until they exceed COMPACT_DEAD_FRACTION of all orders, when the
+arrays are rewritten with live orders only. Every write to an order or its items must
+move Orders.updated_at (the API does; scripts/recompute_order_profit.py sets it for the
+orders whose items it rewrites). The only change the watermark cannot see is a
+deletion; that is caught by comparing the fulfilled order count and the sum of their
+created_at seconds, and triggers a full rebuild.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.logger import get_logger
+from database.database_models import OrderItems, Orders, OrderStatus, PaymentStatus, Products
+from settings import settings
+from utils.pagination import decode_cursor, encode_cursor
+from utils.timezone import IST
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover - optional dependency
+    np = None
+
+logger = get_logger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_PAYMENT_STATUSES = list(PaymentStatus)
+_PAID = _PAYMENT_STATUSES.index(PaymentStatus.PAID)
+
+_ITEM_DTYPES = {
+    "ts": "int64",
+    "order_idx": "int32",
+    "product_idx": "int32",
+    "customer_idx": "int32",
+    "kg": "int64",
+    "revenue": "int64",
+    "profit": "int64",
+}
+
+_ORDER_DTYPES = {
+    "ts": "int64",
+    "payment": "int8",
+    "has_profit": "bool",
+    "alive": "bool",
+    "updated": "int64",
+    "id_hi": "uint64",
+    "id_lo": "uint64",
+}
+
+_LOW_64 = (1 << 64) - 1
+# Rewrite the arrays once this share of order slots belongs to replaced orders.
+COMPACT_DEAD_FRACTION = 0.2
+
+
+def _to_micros(value: datetime | None) -> int | None:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+def _hundredths(value) -> int:
+    return int((Decimal(str(value)) * 100).to_integral_value())
+
+
+def _as_money(hundredths: int) -> float:
+    return round(hundredths / 100, 2)
+
+
+class _Interner:
+    """Maps UUIDs to dense int indexes (shared across snapshot generations)."""
+
+    __slots__ = ("ids", "index")
+
+    def __init__(self, ids: list | None = None):
+        self.ids = list(ids or [])
+        self.index = {v: i for i, v in enumerate(self.ids)}
+
+    def get(self, value) -> int:
+        idx = self.index.get(value)
+        if idx is None:
+            idx = len(self.ids)
+            self.ids.append(value)
+            self.index[value] = idx
+        return idx
+
+    def copy(self) -> "_Interner":
+        return _Interner(self.ids)
+
+
+class ProfitSnapshot:
+    """Immutable columnar view of fulfilled order items. refresh() returns a new instance."""
+
+    def __init__(
+        self,
+        items: dict,
+        orders: dict,
+        order_ids: list,
+        order_numbers: list,
+        live_orders: dict,
+        products: _Interner,
+        customers: _Interner,
+        product_names: dict,
+        watermark: datetime | None,
+    ):
+        self.items = items
+        self.orders = orders
+        self.order_ids = order_ids
+        self.order_numbers = order_numbers
+        self.live_orders = live_orders
+        self.products = products
+        self.customers = customers
+        self.product_names = product_names
+        self.watermark = watermark
+        self.checked_at = time.monotonic()
+
+    # --- Construction -------------------------------------------------
+
+    @classmethod
+    def build(cls, db: Session) -> "ProfitSnapshot":
+        empty_items = {k: np.empty(0, dtype=t) for k, t in _ITEM_DTYPES.items()}
+        empty_orders = {k: np.empty(0, dtype=t) for k, t in _ORDER_DTYPES.items()}
+        base = cls(empty_items, empty_orders, [], [], {}, _Interner(), _Interner(), {}, None)
+        return base._apply(db, since=None)
+
+    def refresh(self, db: Session) -> "ProfitSnapshot":
+        since = None
+        if self.watermark is not None:
+            since = self.watermark - timedelta(seconds=settings.ANALYTICS_SNAPSHOT_LAG_SECONDS)
+        updated = self._apply(db, since=since)
+
+        # A deletion plus a newly fulfilled order leaves the count unchanged; the
+        # created_at sum catches that unless both fall in the same second.
+        fulfilled, created_seconds = (
+            db.query(
+                func.count(Orders.id),
+                func.coalesce(func.sum(func.floor(func.extract("epoch", Orders.created_at))), 0),
+            )
+            .filter(Orders.order_status == OrderStatus.FULFILLED)
+            .one()
+        )
+        if fulfilled != len(updated.live_orders) or int(created_seconds) != updated.created_seconds():
+            logger.info(
+                f"Profit snapshot out of sync (deleted orders?) | snapshot={len(updated.live_orders)} | db={fulfilled}"
+            )
+            return ProfitSnapshot.build(db)
+        return updated
+
+    def created_seconds(self) -> int:
+        """Sum of live orders' created_at in whole epoch seconds (see refresh)."""
+        ts = self.orders["ts"][self.orders["alive"]]
+        return int((ts // 1_000_000).sum())
+
+    def _apply(self, db: Session, since: datetime | None) -> "ProfitSnapshot":
+        q = (
+            db.query(
+                Orders.id,
+                Orders.order_number,
+                Orders.customer_id,
+                Orders.created_at,
+                Orders.updated_at,
+                Orders.payment_status,
+                OrderItems.product_id,
+                OrderItems.quantity_kg,
+                OrderItems.line_total,
+                OrderItems.profit,
+            )
+            .outerjoin(OrderItems, OrderItems.order_id == Orders.id)
+            .filter(Orders.order_status == OrderStatus.FULFILLED)
+        )
+        if since is not None:
+            q = q.filter(Orders.updated_at > since)
+        rows = q.all()
+
+        products = self.products.copy()
+        customers = self.customers.copy()
+        order_ids = list(self.order_ids)
+        order_numbers = list(self.order_numbers)
+        live_orders = dict(self.live_orders)
+
+        new_orders = {k: [] for k in _ORDER_DTYPES}
+        new_items = {k: [] for k in _ITEM_DTYPES}
+        touched: dict = {}
+        unchanged: set = set()
+        replaced: list[int] = []
+        watermark = self.watermark
+
+        for r in rows:
+            if r.id in unchanged:
+                continue
+            order_idx = touched.get(r.id)
+            if order_idx is None:
+                previous = live_orders.get(r.id)
+                updated_micros = _to_micros(r.updated_at)
+                if previous is not None:
+                    # Re-read only because of the lag window: keep the rows we have.
+                    if self.orders["updated"][previous] == updated_micros:
+                        unchanged.add(r.id)
+                        continue
+                    replaced.append(previous)
+                order_idx = len(order_ids)
+                order_ids.append(r.id)
+                order_numbers.append(r.order_number)
+                live_orders[r.id] = order_idx
+                touched[r.id] = order_idx
+                new_orders["ts"].append(_to_micros(r.created_at))
+                new_orders["payment"].append(_PAYMENT_STATUSES.index(r.payment_status))
+                new_orders["has_profit"].append(False)
+                new_orders["alive"].append(True)
+                new_orders["updated"].append(updated_micros)
+                new_orders["id_hi"].append(r.id.int >> 64)
+                new_orders["id_lo"].append(r.id.int & _LOW_64)
+                if watermark is None or (r.updated_at and r.updated_at > watermark):
+                    watermark = r.updated_at
+
+            if r.product_id is None or r.profit is None:
+                continue
+
+            new_orders["has_profit"][order_idx - len(self.order_ids)] = True
+            new_items["ts"].append(_to_micros(r.created_at))
+            new_items["order_idx"].append(order_idx)
+            new_items["product_idx"].append(products.get(r.product_id))
+            new_items["customer_idx"].append(customers.get(r.customer_id))
+            new_items["kg"].append(_hundredths(r.quantity_kg))
+            new_items["revenue"].append(_hundredths(r.line_total))
+            new_items["profit"].append(_hundredths(r.profit))
+
+        orders = {
+            k: np.concatenate([self.orders[k], np.asarray(new_orders[k], dtype=t)])
+            for k, t in _ORDER_DTYPES.items()
+        }
+        items = self.items
+        if replaced:
+            dead = np.asarray(replaced, dtype="int32")
+            orders["alive"][dead] = False
+            keep = ~np.isin(items["order_idx"], dead)
+            items = {k: v[keep] for k, v in items.items()}
+        items = {
+            k: np.concatenate([items[k], np.asarray(new_items[k], dtype=t)])
+            for k, t in _ITEM_DTYPES.items()
+        }
+
+        product_names = {p.id: p.product_name for p in db.query(Products.id, Products.product_name).all()}
+
+        dead = len(order_ids) - len(live_orders)
+        if dead and dead > COMPACT_DEAD_FRACTION * len(order_ids):
+            orders, items, order_ids, order_numbers, live_orders = _compact(orders, items, order_ids, order_numbers)
+
+        return ProfitSnapshot(
+            items, orders, order_ids, order_numbers, live_orders,
+            products, customers, product_names, watermark,
+        )
+
+    @property
+    def array_bytes(self) -> int:
+        """numpy column buffers only."""
+        return sum(a.nbytes for a in self.items.values()) + sum(a.nbytes for a in self.orders.values())
+
+    @property
+    def object_bytes(self) -> int:
+        """
+        Python-side state: order id/number lists, the live order map, both interners and
+        product names, containers plus entries (each object counted once; a UUID
+        includes its int).
+        """
+        seen: set[int] = set()
+
+        def size(obj) -> int:
+            if id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            total = sys.getsizeof(obj)
+            if isinstance(obj, uuid.UUID):
+                total += sys.getsizeof(obj.int)
+            elif isinstance(obj, dict):
+                total += sum(size(k) + size(v) for k, v in obj.items())
+            elif isinstance(obj, list):
+                total += sum(size(v) for v in obj)
+            return total
+
+        return sum(size(obj) for obj in (
+            self.order_ids, self.order_numbers, self.live_orders,
+            self.products.ids, self.products.index, self.customers.ids, self.customers.index,
+            self.product_names,
+        ))
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate resident size: column arrays plus Python-side state."""
+        return self.array_bytes + self.object_bytes
+
+    @property
+    def row_count(self) -> int:
+        return int(self.items["ts"].shape[0])
+
+    # --- Queries ------------------------------------------------------
+
+    def _item_mask(self, start_utc: datetime | None, end_utc: datetime | None, paid_only: bool = False):
+        ts = self.items["ts"]
+        mask = np.ones(ts.shape[0], dtype=bool)
+        if start_utc is not None:
+            mask &= ts >= _to_micros(start_utc)
+        if end_utc is not None:
+            mask &= ts < _to_micros(end_utc)
+        if paid_only:
+            mask &= self.orders["payment"][self.items["order_idx"]] == _PAID
+        return mask
+
+    def _order_mask(self, start_utc: datetime | None, end_utc: datetime | None, paid_only: bool = False):
+        mask = self.orders["alive"].copy()
+        ts = self.orders["ts"]
+        if start_utc is not None:
+            mask &= ts >= _to_micros(start_utc)
+        if end_utc is not None:
+            mask &= ts < _to_micros(end_utc)
+        if paid_only:
+            mask &= self.orders["payment"] == _PAID
+        return mask
+
+    def profit_between(self, start_utc: datetime | None, end_utc: datetime | None, paid_only: bool) -> float:
+        mask = self._item_mask(start_utc, end_utc, paid_only)
+        return _as_money(int(self.items["profit"][mask].sum()))
+
+    def orders_between(self, start_utc: datetime | None, end_utc: datetime | None, paid_only: bool) -> int:
+        return int(self._order_mask(start_utc, end_utc, paid_only).sum())
+
+    def missing_profit_orders(self) -> int:
+        return int((self.orders["alive"] & ~self.orders["has_profit"]).sum())
+
+    def totals(self, start_utc: datetime | None, end_utc: datetime | None) -> dict:
+        mask = self._item_mask(start_utc, end_utc)
+        revenue = int(self.items["revenue"][mask].sum())
+        profit = int(self.items["profit"][mask].sum())
+        return {
+            "order_count": int(np.unique(self.items["order_idx"][mask]).shape[0]),
+            "product_count": int(np.unique(self.items["product_idx"][mask]).shape[0]),
+            "quantity_sold_kg": _as_money(int(self.items["kg"][mask].sum())),
+            "revenue": _as_money(revenue),
+            "profit": _as_money(profit),
+            "margin_percent": round(profit / revenue * 100, 2) if revenue > 0 else None,
+        }
+
+    def _grouped(self, key: str, mask, size: int) -> dict:
+        idx = self.items[key][mask]
+        present = np.bincount(idx, minlength=size) > 0
+        sums = {
+            col: np.bincount(idx, weights=self.items[col][mask], minlength=size).astype("int64")
+            for col in ("kg", "revenue", "profit")
+        }
+        last_ts = np.full(size, np.iinfo("int64").min, dtype="int64")
+        np.maximum.at(last_ts, idx, self.items["ts"][mask])
+        return {"present": np.flatnonzero(present), "last_ts": last_ts, **sums}
+
+    def _select_page(self, g: dict, date_values, id_hi, id_lo, sort_by: str, order: str, cursor: str | None, limit: int):
+        """
+        Vectorised equivalent of the SQL (sort value, id) keyset: filters, orders and cuts the
+        grouped rows with numpy and returns (group indexes for this page, next_cursor).
+        """
+        idx = g["present"]
+        revenue = g["revenue"][idx]
+        profit = g["profit"][idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            margin = np.where(revenue > 0, np.round(profit * 100 / np.maximum(revenue, 1), 6), 0.0)
+        values = {
+            "profit": profit,
+            "revenue": revenue,
+            "margin": margin,
+            "date": date_values[idx],
+        }[sort_by]
+        hi = id_hi[idx]
+        lo = id_lo[idx]
+
+        after = decode_cursor(cursor, 2)
+        if after is not None:
+            try:
+                if sort_by == "date":
+                    cursor_value = _to_micros(datetime.fromisoformat(after[0]))
+                elif sort_by == "margin":
+                    cursor_value = float(after[0])
+                else:
+                    cursor_value = _hundredths(after[0])
+                cursor_id = uuid.UUID(after[1]).int
+            except (TypeError, ValueError, ArithmeticError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            c_hi, c_lo = np.uint64(cursor_id >> 64), np.uint64(cursor_id & _LOW_64)
+            if order == "desc":
+                keep = (values < cursor_value) | (
+                    (values == cursor_value) & ((hi < c_hi) | ((hi == c_hi) & (lo < c_lo)))
+                )
+            else:
+                keep = (values > cursor_value) | (
+                    (values == cursor_value) & ((hi > c_hi) | ((hi == c_hi) & (lo > c_lo)))
+                )
+            idx, values, hi, lo = idx[keep], values[keep], hi[keep], lo[keep]
+
+        ordering = np.lexsort((lo, hi, values))
+        if order == "desc":
+            ordering = ordering[::-1]
+        ordering = ordering[: limit + 1]
+
+        next_cursor = None
+        if ordering.shape[0] > limit:
+            ordering = ordering[:limit]
+            last = ordering[-1]
+            if sort_by == "date":
+                last_value = _from_micros(values[last]).isoformat()
+            elif sort_by == "margin":
+                last_value = str(float(values[last]))
+            else:
+                last_value = str(Decimal(int(values[last])) / 100)
+            last_id = uuid.UUID(int=(int(hi[last]) << 64) | int(lo[last]))
+            next_cursor = encode_cursor([last_value, str(last_id)])
+        return idx[ordering], next_cursor
+
+    def product_page(self, start_utc, end_utc, sort_by: str, order: str, cursor: str | None, limit: int):
+        size = len(self.products.ids)
+        g = self._grouped("product_idx", self._item_mask(start_utc, end_utc), size)
+        id_hi, id_lo = _uuid_keys(self.products.ids)
+        page, next_cursor = self._select_page(g, g["last_ts"], id_hi, id_lo, sort_by, order, cursor, limit)
+
+        rows = []
+        for i in page:
+            revenue = int(g["revenue"][i])
+            profit = int(g["profit"][i])
+            product_id = self.products.ids[i]
+            rows.append({
+                "product_id": product_id,
+                "product_name": self.product_names.get(product_id, ""),
+                "quantity_sold_kg": _as_money(int(g["kg"][i])),
+                "revenue": _as_money(revenue),
+                "profit": _as_money(profit),
+                "margin_percent": round(profit / revenue * 100, 2) if revenue > 0 else None,
+                "last_order_date": _from_micros(g["last_ts"][i]).astimezone(IST).strftime("%Y-%m-%d"),
+            })
+        return rows, next_cursor
+
+    def order_page(self, start_utc, end_utc, sort_by: str, order: str, cursor: str | None, limit: int):
+        size = len(self.order_ids)
+        g = self._grouped("order_idx", self._item_mask(start_utc, end_utc), size)
+        page, next_cursor = self._select_page(
+            g, self.orders["ts"], self.orders["id_hi"], self.orders["id_lo"], sort_by, order, cursor, limit
+        )
+
+        rows = []
+        for i in page:
+            revenue = int(g["revenue"][i])
+            profit = int(g["profit"][i])
+            rows.append({
+                "order_id": self.order_ids[i],
+                "order_number": self.order_numbers[i],
+                "order_date": _from_micros(self.orders["ts"][i]).astimezone(IST).strftime("%Y-%m-%d"),
+                "payment_status": _PAYMENT_STATUSES[self.orders["payment"][i]].name,
+                "revenue": _as_money(revenue),
+                "profit": _as_money(profit),
+                "margin_percent": round(profit / revenue * 100, 2) if revenue > 0 else None,
+            })
+        return rows, next_cursor
+
+
+def _compact(orders: dict, items: dict, order_ids: list, order_numbers: list) -> tuple:
+    """Drops replaced orders and renumbers order_idx; items of replaced orders are already gone."""
+    keep = np.flatnonzero(orders["alive"])
+    remap = np.full(len(order_ids), -1, dtype="int32")
+    remap[keep] = np.arange(keep.shape[0], dtype="int32")
+    orders = {k: v[keep] for k, v in orders.items()}
+    items = {**items, "order_idx": remap[items["order_idx"]]}
+    order_ids = [order_ids[i] for i in keep]
+    order_numbers = [order_numbers[i] for i in keep]
+    live_orders = {order_id: i for i, order_id in enumerate(order_ids)}
+    return orders, items, order_ids, order_numbers, live_orders
+
+
+def _uuid_keys(ids: list) -> tuple:
+    """Splits UUIDs into (high, low) uint64 arrays; lexicographic order matches Postgres uuid order."""
+    hi = np.fromiter((u.int >> 64 for u in ids), dtype="uint64", count=len(ids))
+    lo = np.fromiter((u.int & _LOW_64 for u in ids), dtype="uint64", count=len(ids))
+    return hi, lo
+
+
+_lock = threading.Lock()
+_snapshot: ProfitSnapshot | None = None
+
+
+def snapshot_available() -> bool:
+    return bool(settings.ANALYTICS_SNAPSHOT_ENABLED) and np is not None
+
+
+def get_snapshot(db: Session) -> ProfitSnapshot | None:
+    """
+    Returns a snapshot no older than ANALYTICS_SNAPSHOT_REFRESH_SECONDS,
+    or None when the engine is disabled or numpy is not installed.
+    """
+    global _snapshot
+    if not snapshot_available():
+        return None
+
+    current = _snapshot
+    if current is not None and time.monotonic() - current.checked_at < settings.ANALYTICS_SNAPSHOT_REFRESH_SECONDS:
+        return current
+
+    with _lock:
+        current = _snapshot
+        if current is not None and time.monotonic() - current.checked_at < settings.ANALYTICS_SNAPSHOT_REFRESH_SECONDS:
+            return current
+        try:
+            started = time.perf_counter()
+            _snapshot = ProfitSnapshot.build(db) if current is None else current.refresh(db)
+            logger.info(
+                f"Profit snapshot refreshed | rows={_snapshot.row_count} | array_bytes={_snapshot.array_bytes} "
+                f"| ms={(time.perf_counter() - started) * 1000:.1f}"
+            )
+        except Exception:
+            logger.error("Profit snapshot refresh failed, falling back to SQL", exc_info=True)
+            return None
+    return _snapshot
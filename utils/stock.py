@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from database.database_models import InventoryActions, InventoryTransactions, OrderItems, Orders, OrderStatus, ProductStock
+from utils.stock_alerts import mark_stock_touched
+
+
+def ledger_delta_expr():
+    """Signed on-hand movement of one ledger row: +ADD, -DEDUCT, 0 for ADJUST."""
+    return case(
+        (InventoryTransactions.action == InventoryActions.ADD, InventoryTransactions.quantity_kg),
+        (InventoryTransactions.action == InventoryActions.DEDUCT, -InventoryTransactions.quantity_kg),
+        else_=0,
+    )
+
+
+def ledger_balance_expr():
+    """SUM(ADD) - SUM(DEDUCT) over InventoryTransactions; ADJUST rows never move stock."""
+    return func.coalesce(func.sum(ledger_delta_expr()), 0)
+
+
+def ledger_delta(action: InventoryActions, quantity: Decimal) -> Decimal:
+    if action == InventoryActions.ADD:
+        return quantity
+    if action == InventoryActions.DEDUCT:
+        return -quantity
+    return Decimal("0")
+
+
+def apply_stock_delta(db: Session, product_id, on_hand_delta: Decimal = Decimal("0"), reserved_delta: Decimal = Decimal("0")) -> None:
+    """
+    Atomically adds the given deltas to the product_stock row (created on first use).
+    Runs in the caller's transaction so the balance commits or rolls back with the ledger.
+    """
+    now = datetime.now(timezone.utc)
+    stmt = insert(ProductStock).values(
+        product_id=product_id,
+        on_hand_kg=on_hand_delta,
+        reserved_kg=reserved_delta,
+        created_at=now,
+        updated_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProductStock.product_id],
+        set_={
+            "on_hand_kg": ProductStock.on_hand_kg + stmt.excluded.on_hand_kg,
+            "reserved_kg": ProductStock.reserved_kg + stmt.excluded.reserved_kg,
+            "updated_at": now,
+        },
+    )
+    db.execute(stmt)
+    mark_stock_touched(db, [product_id])
+
+
+def record_inventory_transaction(
+    db: Session,
+    product_id,
+    action: InventoryActions,
+    quantity: Decimal,
+    notes: str | None = None,
+    order_id=None,
+) -> InventoryTransactions:
+    """Adds a ledger row and moves product_stock.on_hand_kg by the same amount. Caller commits."""
+    transaction = InventoryTransactions(
+        product_id=product_id,
+        action=action,
+        quantity_kg=quantity,
+        notes=notes,
+        order_id=order_id,
+    )
+    db.add(transaction)
+    apply_stock_delta(db, product_id, on_hand_delta=ledger_delta(action, quantity))
+    return transaction
+
+
+def record_inventory_batch(db: Session, entries: list, notes: str | None = None) -> int:
+    """
+    Bulk form of record_inventory_transaction for callers that already hold the rows'
+    locks (see lock_stock_rows). `entries` are (product_id, action, quantity, new_on_hand_kg).
+    Writes every ledger row in one multi-row INSERT and the new balances in one
+    executemany UPDATE. Caller commits. Returns the number of ledger rows written.
+    """
+    if not entries:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    db.execute(
+        insert(InventoryTransactions).values([
+            {
+                "id": uuid.uuid4(),
+                "product_id": product_id,
+                "action": action,
+                "quantity_kg": quantity,
+                "notes": notes,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for product_id, action, quantity, _ in entries
+        ])
+    )
+    db.execute(
+        update(ProductStock),
+        [
+            {"product_id": product_id, "on_hand_kg": new_on_hand, "updated_at": now}
+            for product_id, _, _, new_on_hand in entries
+        ],
+    )
+    mark_stock_touched(db, [product_id for product_id, _, _, _ in entries])
+    return len(entries)
+
+
+def lock_stock_rows(db: Session, product_ids) -> dict:
+    """
+    Locks the product_stock rows of the given products (SELECT ... FOR UPDATE) and returns
+    {product_id: (on_hand_kg, reserved_kg)} as read under the lock.
+
+    Missing rows are created first so there is always a row to lock. Rows are locked in
+    product_id order, the same order adjust_reservations writes in, so two transactions
+    touching overlapping products queue instead of deadlocking. Writers on other products
+    are not blocked. Locks are held until the caller commits or rolls back.
+    """
+    ids = sorted(set(product_ids), key=str)
+    if not ids:
+        return {}
+
+    now = datetime.now(timezone.utc)
+    db.execute(
+        insert(ProductStock)
+        .values([
+            {"product_id": product_id, "on_hand_kg": 0, "reserved_kg": 0, "created_at": now, "updated_at": now}
+            for product_id in ids
+        ])
+        .on_conflict_do_nothing(index_elements=[ProductStock.product_id])
+    )
+
+    rows = (
+        db.query(ProductStock.product_id, ProductStock.on_hand_kg, ProductStock.reserved_kg)
+        .filter(ProductStock.product_id.in_(ids))
+        .order_by(ProductStock.product_id)
+        .with_for_update()
+        .all()
+    )
+    return {
+        r.product_id: (Decimal(str(r.on_hand_kg)), Decimal(str(r.reserved_kg)))
+        for r in rows
+    }
+
+
+def reservation_deltas(items, sign: int = 1) -> dict:
+    """Sums item quantities per product (items need product_id and quantity_kg)."""
+    deltas: dict = {}
+    for item in items:
+        qty = Decimal(str(item.quantity_kg)) * sign
+        deltas[item.product_id] = deltas.get(item.product_id, Decimal("0")) + qty
+    return deltas
+
+
+def adjust_reservations(db: Session, deltas: dict) -> None:
+    """
+    Moves product_stock.reserved_kg by the given per-product deltas in the caller's transaction.
+    Products are touched in a stable order so concurrent order writes cannot deadlock.
+    """
+    for product_id in sorted(deltas, key=str):
+        delta = deltas[product_id]
+        if delta != 0:
+            apply_stock_delta(db, product_id, reserved_delta=delta)
+
+
+def pending_reservations_query(db: Session):
+    """Derived reservations (the value reserved_kg must equal): pending order items per product."""
+    return (
+        db.query(OrderItems.product_id, func.coalesce(func.sum(OrderItems.quantity_kg), 0))
+        .join(Orders, Orders.id == OrderItems.order_id)
+        .filter(Orders.order_status == OrderStatus.PENDING)
+        .group_by(OrderItems.product_id)
+    )
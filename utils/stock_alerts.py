@@ -0,0 +1,114 @@
+"""
+Background low-stock evaluator.
+
+Stock writers call mark_stock_touched() with the products they changed; the ids ride
+on the session until commit. After a successful commit they are handed to a single
+background worker, which re-reads only those products' product_stock rows, compares
+the stock status with the last one recorded (product_stock.alert_status) and writes a
+stock_alerts row for every crossing. A rollback discards the ids.
+
+Clients poll GET /inventory/alerts?since=<last id> instead of the inventory listing.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.logger import get_logger
+from database.database_models import Products, ProductStock, StockAlerts
+from settings import settings
+
+logger = get_logger(__name__)
+
+_TOUCHED_KEY = "stock_alerts_touched"
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stock-alerts")
+
+
+def stock_status(available: Decimal, min_stock: Decimal) -> str:
+    """Same classification as the inventory listing."""
+    if available <= 0:
+        return "OUT_OF_STOCK"
+    if available <= min_stock:
+        return "LOW_STOCK"
+    return "OK"
+
+
+def mark_stock_touched(db: Session, product_ids) -> None:
+    if settings.STOCK_ALERTS_ENABLED:
+        db.info.setdefault(_TOUCHED_KEY, set()).update(product_ids)
+
+
+def evaluate_stock_alerts(db: Session, product_ids=None) -> int:
+    """
+    Records a stock_alerts row for each product whose status differs from its
+    alert_status, then stores the new status. All products when product_ids is None.
+    A product never evaluated before only gets an alert if it is not OK.
+    Caller commits. Returns the number of alerts written.
+    """
+    q = (
+        db.query(
+            ProductStock.product_id,
+            ProductStock.on_hand_kg,
+            ProductStock.reserved_kg,
+            ProductStock.alert_status,
+            Products.min_stock_kg,
+        )
+        .join(Products, Products.id == ProductStock.product_id)
+        .order_by(ProductStock.product_id)
+        # Serialise with other evaluators so a crossing is recorded exactly once.
+        .with_for_update(of=ProductStock)
+    )
+    if product_ids is not None:
+        q = q.filter(ProductStock.product_id.in_(list(product_ids)))
+
+    created = 0
+    for r in q.all():
+        available = Decimal(str(r.on_hand_kg)) - Decimal(str(r.reserved_kg))
+        min_stock = Decimal(str(r.min_stock_kg))
+        current = stock_status(available, min_stock)
+        if current == r.alert_status:
+            continue
+
+        if r.alert_status is not None or current != "OK":
+            db.add(StockAlerts(
+                product_id=r.product_id,
+                status=current,
+                previous_status=r.alert_status,
+                available_kg=available,
+                min_stock_kg=min_stock,
+            ))
+            created += 1
+        db.query(ProductStock).filter(ProductStock.product_id == r.product_id).update(
+            {"alert_status": current}, synchronize_session=False
+        )
+    return created
+
+
+def _evaluate_in_background(bind, product_ids: list) -> None:
+    db = Session(bind=bind)
+    try:
+        created = evaluate_stock_alerts(db, product_ids)
+        db.commit()
+        if created:
+            logger.info(f"Stock alerts recorded | count={created}")
+    except Exception:
+        db.rollback()
+        logger.error(f"Stock alert evaluation failed | products={len(product_ids)}", exc_info=True)
+    finally:
+        db.close()
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_touched(session: Session) -> None:
+    product_ids = session.info.pop(_TOUCHED_KEY, None)
+    if product_ids:
+        _executor.submit(_evaluate_in_background, session.get_bind(), sorted(product_ids, key=str))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_touched(session: Session) -> None:
+    session.info.pop(_TOUCHED_KEY, None)
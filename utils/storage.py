@@ -1,105 +1,307 @@
-import uuid
+"""
+Object storage for uploaded images and generated invoices.
+
+STORAGE_BACKEND picks the implementation:
+  - "supabase": Supabase Storage over a pooled httpx client (public bucket URLs).
+  - "local":    files under LOCAL_STORAGE_DIR, served by GET /files/{path} (routers/files.py)
+                with FileResponse (sendfile where the server supports it, Range requests).
+
+Callers use the module-level `storage` object; paths are bucket-relative
+("products/<uuid>/full.webp", "invoices/INV-0001.pdf").
+"""
+import asyncio
 import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import AsyncIterator
+
+import httpx
 from fastapi import UploadFile, HTTPException
-from supabase import create_client, Client
-from settings import settings
 
-# Initialize Supabase client
-supabase_url = settings.SUPABASE_URL
-supabase_key = settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_KEY
-supabase_bucket = settings.SUPABASE_BUCKET
+from core.logger import get_logger
+from settings import BASE_DIR, settings
+
+logger = get_logger(__name__)
 
-if supabase_url and supabase_key:
-    supabase: Client = create_client(supabase_url, supabase_key)
-else:
-    supabase = None
+UPLOAD_CHUNK_BYTES = 256 * 1024
+_RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
 
-def upload_image_to_supabase(file: UploadFile, folder: str = "") -> str:
+
+class StorageBackend(ABC):
     """
-    Uploads an image file to Supabase Storage and returns the public URL.
+    upload() is awaited from async routes; upload_sync() is for sync code and runs on a
+    small bounded pool (STORAGE_SYNC_UPLOAD_WORKERS) so storage latency cannot tie up
+    the whole request threadpool.
     """
-    if not supabase:
-        raise HTTPException(
-            status_code=500, 
-            detail="Supabase configuration is missing (SUPABASE_URL, SUPABASE_KEY)"
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.STORAGE_SYNC_UPLOAD_WORKERS, thread_name_prefix="storage"
         )
 
-    try:
-        # Create unique filename
-        ext = os.path.splitext(file.filename)[1]
-        filename = f"{uuid.uuid4()}{ext}"
-        
-        # Determine full path in bucket
-        path = f"{folder}/{filename}" if folder else filename
-        
-        # Read file content
-        file_content = file.file.read()
-        
-        # Upload to Supabase Storage (service role key recommended for server-side uploads)
-        response = supabase.storage.from_(supabase_bucket).upload(
-            path=path,
-            file=file_content,
-            file_options={"content-type": file.content_type}
+    @abstractmethod
+    def public_url(self, path: str) -> str:
+        ...
+
+    @abstractmethod
+    async def upload(self, path: str, content: bytes | UploadFile, content_type: str,
+                     upsert: bool = False) -> str:
+        """Stores bytes or an UploadFile and returns the public URL."""
+
+    @abstractmethod
+    def _upload_blocking(self, path: str, content: bytes, content_type: str, upsert: bool) -> str:
+        ...
+
+    @abstractmethod
+    def read(self, path: str) -> bytes | None:
+        """Object contents, or None if it does not exist."""
+
+    def upload_sync(self, path: str, content: bytes, content_type: str, upsert: bool = False) -> str:
+        """Blocking upload for sync code paths; at most STORAGE_SYNC_UPLOAD_WORKERS at once."""
+        return self._executor.submit(self._upload_blocking, path, content, content_type, upsert).result()
+
+    async def aclose(self) -> None:
+        pass
+
+
+class SupabaseStorage(StorageBackend):
+    """
+    Direct HTTP client for the Supabase Storage object API.
+
+    One pooled keep-alive connection set per process (httpx), per-call timeouts and
+    retries with exponential backoff on transport errors and retryable statuses.
+    UploadFiles are streamed in chunks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.url = settings.SUPABASE_URL
+        self.key = settings.SUPABASE_SERVICE_ROLE_KEY or settings.SUPABASE_KEY
+        self.bucket = settings.SUPABASE_BUCKET
+        self._async_client: httpx.AsyncClient | None = None
+        self._sync_client: httpx.Client | None = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.key)
+
+    def _client_options(self) -> dict:
+        return {
+            "base_url": f"{self.url.rstrip('/')}/storage/v1",
+            "headers": {"Authorization": f"Bearer {self.key}", "apikey": self.key},
+            "timeout": httpx.Timeout(settings.STORAGE_TIMEOUT_SECONDS, connect=5.0),
+            "limits": httpx.Limits(
+                max_connections=settings.STORAGE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.STORAGE_MAX_CONNECTIONS,
+            ),
+        }
+
+    def _ensure_configured(self) -> None:
+        if not self.configured:
+            raise HTTPException(
+                status_code=500,
+                detail="Supabase configuration is missing (SUPABASE_URL, SUPABASE_KEY)"
+            )
+
+    def _get_sync_client(self) -> httpx.Client:
+        if self._sync_client is None:
+            self._sync_client = httpx.Client(**self._client_options())
+        return self._sync_client
+
+    def public_url(self, path: str) -> str:
+        return f"{self.url.rstrip('/')}/storage/v1/object/public/{self.bucket}/{path}"
+
+    @staticmethod
+    def _headers(content_type: str, size: int | None, upsert: bool) -> dict:
+        headers = {"content-type": content_type, "cache-control": "max-age=31536000"}
+        if size is not None:
+            headers["content-length"] = str(size)
+        if upsert:
+            headers["x-upsert"] = "true"
+        return headers
+
+    @staticmethod
+    def _check(response: httpx.Response, attempt: int) -> bool:
+        """True when the upload landed. Raises for non-retryable failures."""
+        if response.is_success:
+            return True
+        # Paths are unique, so a conflict on a retry means an earlier attempt succeeded
+        # and only its response was lost.
+        if response.status_code in (400, 409) and attempt > 0 and "exists" in response.text.lower():
+            return True
+        if response.status_code in _RETRY_STATUSES:
+            return False
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to upload file: storage returned {response.status_code}: {response.text[:200]}"
         )
-        # supabase-py may return a dict-like error response
-        if isinstance(response, dict) and response.get("error"):
-            raise Exception(f"Supabase upload error: {response}")
-        if hasattr(response, "error") and response.error:
-            raise Exception(f"Supabase upload error: {response.error}")
-            
-        # Get Public URL
-        public_url = supabase.storage.from_(supabase_bucket).get_public_url(path)
-        return public_url
-        
-    except Exception as e:
-        print(f"Error during Supabase upload: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to upload image: {str(e)}")
-    finally:
-        # Important: Reset file pointer or close it if needed (FastAPI handles closing)
-        file.file.seek(0)
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return 0.5 * (2 ** attempt)
+
+    async def upload(self, path: str, content: bytes | UploadFile, content_type: str,
+                     upsert: bool = False) -> str:
+        self._ensure_configured()
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(**self._client_options())
+
+        if isinstance(content, (bytes, bytearray)):
+            size = len(content)
+        else:
+            size = content.size
+
+        last_error = None
+        for attempt in range(settings.STORAGE_UPLOAD_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt - 1))
+            if isinstance(content, (bytes, bytearray)):
+                body = content
+            else:
+                await content.seek(0)
+                body = _iter_upload(content)
+            try:
+                response = await self._async_client.post(
+                    f"/object/{self.bucket}/{path}", content=body,
+                    headers=self._headers(content_type, size, upsert),
+                )
+                if self._check(response, attempt):
+                    return self.public_url(path)
+                last_error = f"status {response.status_code}"
+            except httpx.TransportError as e:
+                last_error = repr(e)
+            logger.warning(f"Storage upload retry | path={path} | attempt={attempt + 1} | error={last_error}")
+
+        logger.error(f"Storage upload failed | path={path} | error={last_error}")
+        raise HTTPException(status_code=500, detail=f"Failed to upload file: {last_error}")
+
+    def _upload_blocking(self, path: str, content: bytes, content_type: str, upsert: bool) -> str:
+        self._ensure_configured()
+        client = self._get_sync_client()
+
+        last_error = None
+        for attempt in range(settings.STORAGE_UPLOAD_RETRIES + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1))
+            try:
+                response = client.post(
+                    f"/object/{self.bucket}/{path}", content=content,
+                    headers=self._headers(content_type, len(content), upsert),
+                )
+                if self._check(response, attempt):
+                    return self.public_url(path)
+                last_error = f"status {response.status_code}"
+            except httpx.TransportError as e:
+                last_error = repr(e)
+            logger.warning(f"Storage upload retry | path={path} | attempt={attempt + 1} | error={last_error}")
+
+        logger.error(f"Storage upload failed | path={path} | error={last_error}")
+        raise HTTPException(status_code=500, detail=f"Failed to upload file: {last_error}")
+
+    def read(self, path: str) -> bytes | None:
+        if not self.configured:
+            return None
+        try:
+            response = self._get_sync_client().get(f"/object/{self.bucket}/{path}")
+        except httpx.TransportError as e:
+            logger.warning(f"Storage read failed | path={path} | error={e!r}")
+            return None
+        return response.content if response.is_success else None
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+class LocalStorage(StorageBackend):
+    """
+    Files under LOCAL_STORAGE_DIR (relative paths are resolved against the project root).
+    Writes go to a temp file in the target directory and are renamed into place, so
+    readers never see a partial file.
+    """
+
+    def __init__(self):
+        super().__init__()
+        root = Path(settings.LOCAL_STORAGE_DIR)
+        self.root = (root if root.is_absolute() else BASE_DIR / root).resolve()
+
+    def resolve(self, path: str) -> Path | None:
+        """Absolute path for a bucket-relative path, or None if it escapes the root."""
+        relative = PurePosixPath(path)
+        if relative.is_absolute() or ".." in relative.parts:
+            return None
+        full = (self.root / relative).resolve()
+        return full if full.is_relative_to(self.root) else None
+
+    def public_url(self, path: str) -> str:
+        base = (settings.STORAGE_PUBLIC_BASE_URL or "").rstrip("/")
+        return f"{base}/files/{path}"
+
+    def _write(self, path: str, content: bytes, upsert: bool) -> str:
+        target = self.resolve(path)
+        if target is None:
+            raise HTTPException(status_code=400, detail="Invalid storage path")
+        if target.exists() and not upsert:
+            raise HTTPException(status_code=500, detail=f"Failed to upload file: {path} already exists")
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return self.public_url(path)
+
+    async def upload(self, path: str, content: bytes | UploadFile, content_type: str,
+                     upsert: bool = False) -> str:
+        if not isinstance(content, (bytes, bytearray)):
+            await content.seek(0)
+            content = await content.read()
+        return await asyncio.to_thread(self._write, path, content, upsert)
+
+    def _upload_blocking(self, path: str, content: bytes, content_type: str, upsert: bool) -> str:
+        return self._write(path, content, upsert)
+
+    def read(self, path: str) -> bytes | None:
+        target = self.resolve(path)
+        if target is None or not target.is_file():
+            return None
+        return target.read_bytes()
+
+
+async def _iter_upload(upload: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+
+def _create_backend() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage()
+    return SupabaseStorage()
+
+
+storage = _create_backend()
+
 
 def upload_pdf_bytes(pdf_content: bytes, filename: str, folder: str = "invoices") -> str:
     """
-    Uploads PDF bytes to Supabase Storage and returns the public URL.
+    Stores PDF bytes (overwriting an existing copy) and returns the public URL.
     """
-    if not supabase:
-        raise Exception("Supabase configuration is missing")
-
-    path = f"{folder}/{filename}"
-    
-    try:
-        response = supabase.storage.from_(supabase_bucket).upload(
-            path=path,
-            file=pdf_content,
-            file_options={"content-type": "application/pdf"}
-        )
-        # Check for errors in response
-        if isinstance(response, dict) and response.get("error"):
-            raise Exception(f"Supabase upload error: {response}")
-            
-        public_url = supabase.storage.from_(supabase_bucket).get_public_url(path)
-        return public_url
-    except Exception as e:
-        # If it's already uploaded, we might get a 409, we just return the public URL
-        if "already exists" in str(e).lower():
-            return supabase.storage.from_(supabase_bucket).get_public_url(path)
-        raise e
-
-def check_invoice_exists(filename: str, folder: str = "invoices") -> str:
+    return storage.upload_sync(f"{folder}/{filename}", pdf_content, "application/pdf", upsert=True)
+
+
+def read_invoice(filename: str, folder: str = "invoices") -> bytes | None:
     """
-    Checks if an invoice exists and returns the URL, otherwise None.
+    Returns a previously stored invoice PDF, or None.
     """
-    if not supabase:
-        return None
-    
-    path = f"{folder}/{filename}"
-    try:
-        # Supabase list doesn't have a direct "exists", we can try to get public URL 
-        # but that doesn't verify existence. 
-        # Using list() to check
-        res = supabase.storage.from_(supabase_bucket).list(folder, {"search": filename})
-        if res and any(f['name'] == filename for f in res):
-            return supabase.storage.from_(supabase_bucket).get_public_url(path)
-    except:
-        pass
-    return None
+    return storage.read(f"{folder}/{filename}")
@@ -43,3 +43,17 @@ def ist_date_range_bounds(from_date: date | None, to_date: date | None) -> tuple
         _, end_utc = ist_day_bounds(to_date)
     return start_utc, end_utc
 
+
+def ist_month_starts_between(start_utc: datetime, end_utc: datetime) -> list[datetime]:
+    """
+    Returns every IST month start (as UTC) in (start_utc, end_utc], oldest first.
+    """
+    start_ist = start_utc.astimezone(IST)
+    year, month = start_ist.year, start_ist.month
+    bounds = []
+    while True:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        boundary = datetime(year, month, 1, tzinfo=IST).astimezone(timezone.utc)
+        if boundary > end_utc:
+            return bounds
+        bounds.append(boundary)